@@ -1,3 +1,14 @@
 from django.contrib import admin
+from .models import AgentExecution, AgentFeedback
 
-# Register your models here.
+@admin.register(AgentExecution)
+class AgentExecutionAdmin(admin.ModelAdmin):
+    list_display = ['execution_id', 'agent_type', 'user', 'success', 'cached', 'duration_ms', 'created_at']
+    list_filter = ['agent_type', 'success', 'cached', 'created_at']
+    search_fields = ['execution_id', 'user__email']
+
+@admin.register(AgentFeedback)
+class AgentFeedbackAdmin(admin.ModelAdmin):
+    list_display = ['execution', 'agent_type', 'user', 'rating', 'created_at']
+    list_filter = ['agent_type', 'rating', 'created_at']
+    search_fields = ['user__email', 'feedback']
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-17 17:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgentExecution',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('execution_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('agent_type', models.CharField(max_length=50)),
+                ('course_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('success', models.BooleanField(default=True)),
+                ('cached', models.BooleanField(default=False)),
+                ('duration_ms', models.PositiveIntegerField(default=0)),
+                ('error', models.CharField(blank=True, max_length=500)),
+                ('created_at', models.DateTimeField()),
+                ('user', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='agent_executions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'agent_executions',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AgentFeedback',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('agent_type', models.CharField(max_length=50)),
+                ('rating', models.PositiveSmallIntegerField()),
+                ('feedback', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('execution', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='feedback', to='ai_features.agentexecution', to_field='execution_id')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='agent_feedback', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'agent_feedback',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='agentexecution',
+            index=models.Index(fields=['agent_type', 'created_at'], name='agent_execu_agent_t_564248_idx'),
+        ),
+    ]
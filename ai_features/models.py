@@ -1,3 +1,53 @@
 from django.db import models
+from django.contrib.auth import get_user_model
+import uuid
 
-# Create your models here.
+User = get_user_model()
+
+class AgentExecution(models.Model):
+    """Compact record of one AI agent run (written in batches by the FastAPI service)"""
+    execution_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    agent_type = models.CharField(max_length=50)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_constraint=False,  # user_id comes from the AI service request as-is
+        related_name='agent_executions'
+    )
+    course_id = models.PositiveIntegerField(blank=True, null=True)
+    
+    success = models.BooleanField(default=True)
+    cached = models.BooleanField(default=False)
+    duration_ms = models.PositiveIntegerField(default=0)
+    error = models.CharField(max_length=500, blank=True)
+    
+    created_at = models.DateTimeField()
+    
+    class Meta:
+        db_table = 'agent_executions'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['agent_type', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.agent_type} - {self.execution_id}"
+
+class AgentFeedback(models.Model):
+    execution = models.ForeignKey(
+        AgentExecution,
+        to_field='execution_id',
+        db_constraint=False,  # Feedback may arrive before the run's batch is flushed
+        on_delete=models.DO_NOTHING,
+        related_name='feedback'
+    )
+    agent_type = models.CharField(max_length=50)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='agent_feedback')
+    rating = models.PositiveSmallIntegerField()
+    feedback = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'agent_feedback'
@@ -0,0 +1,234 @@
+"""
+Presence-driven session attendance
+Live session sockets and the join/leave endpoints keep each attendee's
+last-seen time in a per-session Redis sorted set. Attendees not seen for
+ATTENDANCE_IDLE_SECONDS are reaped as having left when they were last seen.
+Joins and leaves are buffered in per-session hashes and written to
+SessionAttendance in bulk by the flush_session_attendance task, so neither
+heartbeats nor a mass disconnect turn into one write per student.
+Presence only counts while the session is live. Its status is cached in Redis,
+set when the session starts or ends and re-read from the database when missing.
+"""
+import logging
+import time
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from channels.db import database_sync_to_async
+from django.db import transaction
+from tutoring_platform.redis_client import get_async_redis, get_redis
+from .models import LiveSession, SessionAttendance
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_SESSIONS_KEY = 'attendance:presence:sessions'
+PENDING_SESSIONS_KEY = 'attendance:pending:sessions'
+PRESENCE_KEY = 'attendance:presence:{}'
+STINTS_KEY = 'attendance:stints:{}'
+JOINS_KEY = 'attendance:joins:{}'
+LEAVES_KEY = 'attendance:leaves:{}'
+STATUS_KEY = 'attendance:status:{}'
+
+# Marks an attendee of a live session as seen; the first sighting of a stint is
+# buffered as a join. Returns 1 if recorded, 0 if the session is not live and -1
+# if its status is not cached.
+#   KEYS: presence zset, stints hash, joins hash, presence sessions, pending sessions, status
+#   ARGV: student id, now, session id
+PRESENT_SCRIPT = """
+local status = redis.call('GET', KEYS[6])
+if not status then
+    return -1
+end
+if status ~= 'live' then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+if redis.call('HSETNX', KEYS[2], ARGV[1], ARGV[2]) == 1 then
+    redis.call('HSET', KEYS[3], ARGV[1], ARGV[2])
+    redis.call('SADD', KEYS[5], ARGV[3])
+end
+redis.call('SADD', KEYS[4], ARGV[3])
+return 1
+"""
+STATUS_UNKNOWN = -1
+
+# Ends the stints of attendees last seen at or before the cutoff, buffering a
+# leave at their last-seen time, plus optionally one attendee leaving now.
+# Returns the number of stints ended.
+#   KEYS: presence zset, stints hash, leaves hash, presence sessions, pending sessions
+#   ARGV: cutoff, session id, [student id, leave time]
+REAP_SCRIPT = """
+local left = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'WITHSCORES')
+if ARGV[3] and redis.call('ZSCORE', KEYS[1], ARGV[3]) then
+    table.insert(left, ARGV[3])
+    table.insert(left, ARGV[4])
+end
+for i = 1, #left, 2 do
+    redis.call('ZREM', KEYS[1], left[i])
+    redis.call('HDEL', KEYS[2], left[i])
+    redis.call('HSET', KEYS[3], left[i], left[i + 1])
+end
+if #left > 0 then
+    redis.call('SADD', KEYS[5], ARGV[2])
+end
+if redis.call('ZCARD', KEYS[1]) == 0 then
+    redis.call('SREM', KEYS[4], ARGV[2])
+end
+return #left / 2
+"""
+
+def _present_args(session_id, student_id, now):
+    keys = [
+        PRESENCE_KEY.format(session_id), STINTS_KEY.format(session_id), JOINS_KEY.format(session_id),
+        PRESENCE_SESSIONS_KEY, PENDING_SESSIONS_KEY, STATUS_KEY.format(session_id)
+    ]
+    return (PRESENT_SCRIPT, len(keys), *keys, student_id, now, str(session_id))
+
+def _status_entry(session_id, status):
+    # Unknown sessions are cached too, so their heartbeats are not looked up every time
+    return STATUS_KEY.format(session_id), status or 'missing'
+
+def set_session_status(session_id, status, client=None, only_if_missing=False):
+    """Cache a session's status for the presence script.
+    
+    Statuses read from the database are cached only if missing, so one read
+    just before the session ends cannot overwrite the 'ended' set by it.
+    """
+    (client or get_redis()).set(
+        *_status_entry(session_id, status), ex=settings.ATTENDANCE_IDLE_SECONDS, nx=only_if_missing
+    )
+
+def _load_session_status(session_id):
+    return LiveSession.objects.filter(id=session_id).values_list('status', flat=True).first()
+
+def record_presence(session_id, student_id):
+    """Mark an attendee as seen now; returns False if the session is not live"""
+    client = get_redis()
+    recorded = client.eval(*_present_args(session_id, student_id, time.time()))
+    if recorded == STATUS_UNKNOWN:
+        set_session_status(session_id, _load_session_status(session_id), client, only_if_missing=True)
+        recorded = client.eval(*_present_args(session_id, student_id, time.time()))
+    return recorded == 1
+
+async def arecord_presence(session_id, student_id):
+    client = get_async_redis()
+    recorded = await client.eval(*_present_args(session_id, student_id, time.time()))
+    if recorded == STATUS_UNKNOWN:
+        status = await database_sync_to_async(_load_session_status)(session_id)
+        await client.set(*_status_entry(session_id, status), ex=settings.ATTENDANCE_IDLE_SECONDS, nx=True)
+        recorded = await client.eval(*_present_args(session_id, student_id, time.time()))
+    return recorded == 1
+
+async def atouch_presence(session_id, student_id):
+    """Update an attendee's last-seen time without starting a new stint"""
+    await get_async_redis().zadd(PRESENCE_KEY.format(session_id), {student_id: time.time()}, xx=True)
+
+def _reap(client, session_id, cutoff, *leaving):
+    keys = [
+        PRESENCE_KEY.format(session_id), STINTS_KEY.format(session_id), LEAVES_KEY.format(session_id),
+        PRESENCE_SESSIONS_KEY, PENDING_SESSIONS_KEY
+    ]
+    return client.eval(REAP_SCRIPT, len(keys), *keys, cutoff, str(session_id), *leaving)
+
+def record_leave(session_id, student_id):
+    """End an attendee's stint now; returns False if they were not present"""
+    return bool(_reap(get_redis(), session_id, '-inf', student_id, time.time()))
+
+def _to_datetimes(stamps):
+    return {
+        int(student_id): datetime.fromtimestamp(float(stamp), tz=dt_timezone.utc)
+        for student_id, stamp in stamps.items()
+    }
+
+def _take(client, session_id):
+    keys = [JOINS_KEY.format(session_id), LEAVES_KEY.format(session_id)]
+    pipe = client.pipeline()
+    for key in keys:
+        pipe.hgetall(key)
+    pipe.delete(*keys)
+    joins, leaves, _ = pipe.execute()
+    return _to_datetimes(joins), _to_datetimes(leaves)
+
+def _restore(client, session_id, joins, leaves):
+    pipe = client.pipeline()
+    for key, stamps in ((JOINS_KEY, joins), (LEAVES_KEY, leaves)):
+        for student_id, stamp in stamps.items():
+            # Anything recorded since the take is newer and wins
+            pipe.hsetnx(key.format(session_id), student_id, stamp.timestamp())
+    pipe.sadd(PENDING_SESSIONS_KEY, str(session_id))
+    pipe.execute()
+
+def apply_attendance(session_id, joins, leaves):
+    """Write buffered joins and leaves, {student_id: datetime}, of one session; returns the number closed"""
+    attendances = SessionAttendance.objects.filter(session_id=session_id)
+    # A leave from before a buffered rejoin closes the previous stint before the next one opens
+    earlier_leaves = {
+        student_id: left_at for student_id, left_at in leaves.items()
+        if student_id in joins and left_at <= joins[student_id]
+    }
+    later_leaves = {
+        student_id: left_at for student_id, left_at in leaves.items()
+        if student_id not in earlier_leaves
+    }
+
+    with transaction.atomic():
+        closed = attendances.close_each(earlier_leaves)
+
+        if joins:
+            rows = {row.student_id: row for row in attendances.filter(student_id__in=joins).only('id', 'student_id')}
+            for student_id, row in rows.items():
+                row.joined_at = joins[student_id]
+                row.left_at = None
+                row.is_present = True
+            SessionAttendance.objects.bulk_update(rows.values(), ['joined_at', 'left_at', 'is_present'], batch_size=500)
+            SessionAttendance.objects.bulk_create(
+                [
+                    SessionAttendance(session_id=session_id, student_id=student_id, joined_at=joined_at, is_present=True)
+                    for student_id, joined_at in joins.items() if student_id not in rows
+                ],
+                batch_size=500,
+                ignore_conflicts=True
+            )
+
+        return closed + attendances.close_each(later_leaves)
+
+def flush_session_attendance(session_id):
+    """Write the buffered joins and leaves of one session; returns the number of attendances closed"""
+    client = get_redis()
+    joins, leaves = _take(client, session_id)
+    try:
+        return apply_attendance(session_id, joins, leaves)
+    except Exception:
+        _restore(client, session_id, joins, leaves)
+        raise
+
+def end_session_attendance(session_id):
+    """End every stint in the session at its last-seen time and write everything buffered"""
+    client = get_redis()
+    # Heartbeats from sockets still open no longer start new stints
+    set_session_status(session_id, 'ended', client)
+    _reap(client, session_id, '+inf')
+    return flush_session_attendance(session_id)
+
+def flush_attendance():
+    """Reap idle attendees and write buffered joins and leaves; returns the number of attendances closed"""
+    client = get_redis()
+    cutoff = time.time() - settings.ATTENDANCE_IDLE_SECONDS
+    for session_id in client.smembers(PRESENCE_SESSIONS_KEY):
+        _reap(client, session_id, cutoff)
+
+    closed = 0
+    while True:
+        session_ids = client.spop(PENDING_SESSIONS_KEY, settings.ATTENDANCE_FLUSH_BATCH)
+        if not session_ids:
+            break
+        for index, session_id in enumerate(session_ids):
+            try:
+                closed += flush_session_attendance(session_id)
+            except Exception:
+                # Sessions popped but not yet flushed stay pending for the next run
+                client.sadd(PENDING_SESSIONS_KEY, *session_ids[index:])
+                raise
+
+    if closed:
+        logger.info('Closed %d session attendances', closed)
+    return closed
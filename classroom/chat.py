@@ -0,0 +1,190 @@
+"""
+Live session chat storage
+Messages are numbered and appended to a capped per-session Redis list, which
+serves recent history, then broadcast and saved afterwards with one
+bulk_create per flush, every CHAT_FLUSH_MS or as soon as
+CHAT_FLUSH_MAX_MESSAGES are waiting
+"""
+import asyncio
+import atexit
+import json
+import logging
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DataError, IntegrityError, transaction
+from django.db.models import Max
+
+from tutoring_platform.redis_client import get_redis
+from .models import ChatMessage, LiveSession
+from .streams import append_numbered
+
+logger = logging.getLogger(__name__)
+
+RECENT_KEY = 'chat:recent:{}'
+SEQ_KEY = 'chat:seq:{}'
+
+
+async def append_recent(session_id, message):
+    """Add a message dict to the session's recent list; returns its sequence number"""
+    args = (
+        RECENT_KEY.format(session_id), SEQ_KEY.format(session_id), message,
+        settings.CHAT_HISTORY_RING_SIZE, settings.CHAT_HISTORY_TTL_SECONDS
+    )
+    seq = await append_numbered(*args, seed='')
+    if seq is None:
+        # The counter expired or Redis lost it: carry on after the highest seq already used
+        seq = await append_numbered(*args, seed=await database_sync_to_async(last_seq)(session_id))
+    return seq
+
+
+def last_seq(session_id):
+    """Highest seq of the session's messages, saved or still buffered, 0 if none"""
+    saved = ChatMessage.objects.filter(session_id=session_id).aggregate(seq=Max('seq'))['seq'] or 0
+    buffered = [message.seq or 0 for message in chat_buffer.pending if str(message.session_id) == str(session_id)]
+    return max([saved, *buffered])
+
+
+def recent_messages(session_id):
+    """The session's most recent messages, oldest first"""
+    return [json.loads(entry) for entry in get_redis().lrange(RECENT_KEY.format(session_id), 0, -1)]
+
+
+# Errors caused by one row's data rather than the database being unreachable;
+# ValueError is what psycopg2 raises for NUL bytes in a string
+ROW_ERRORS = (DataError, IntegrityError, ValueError)
+
+
+class ChatWriteBuffer:
+    """Per-process buffer of unsaved ChatMessage rows.
+
+    A flush that fails because of the database puts its messages back for the
+    next one. A batch rejected because of its rows is retried row by row, and
+    a message that still fails after CHAT_SAVE_MAX_ATTEMPTS flushes is
+    dropped. At most CHAT_BUFFER_MAX_MESSAGES are held; beyond that the oldest
+    are dropped. Whatever is still buffered when the process exits is written
+    by an atexit hook.
+    """
+
+    def __init__(self):
+        self.flush_seconds = settings.CHAT_FLUSH_MS / 1000
+        self.max_messages = settings.CHAT_FLUSH_MAX_MESSAGES
+        self.max_pending = settings.CHAT_BUFFER_MAX_MESSAGES
+        self.max_attempts = settings.CHAT_SAVE_MAX_ATTEMPTS
+
+        self.pending = []
+
+        self._task = None
+        self._wakeup = None
+
+    def add(self, session_id, sender_id, content, timestamp, seq=None):
+        # PostgreSQL text cannot hold NUL
+        self.pending.append(ChatMessage(
+            session_id=session_id,
+            sender_id=sender_id,
+            content=content.replace('\x00', ''),
+            timestamp=timestamp,
+            seq=seq
+        ))
+        self._trim()
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+        if len(self.pending) >= self.max_messages:
+            self._wakeup.set()
+
+    async def _run(self):
+        while self.pending:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Chat flush failed')
+
+    def _trim(self):
+        overflow = len(self.pending) - self.max_pending
+        if overflow > 0:
+            del self.pending[:overflow]
+            logger.error('Chat buffer full, dropped the %d oldest unsaved messages', overflow)
+
+    def _retry_later(self, failed):
+        """Put back messages whose rows were rejected, dropping those out of attempts"""
+        retry = []
+        for message in failed:
+            message._save_attempts = getattr(message, '_save_attempts', 0) + 1
+            if message._save_attempts < self.max_attempts:
+                retry.append(message)
+            else:
+                logger.error(
+                    'Dropping chat message %s of session %s after %d failed saves',
+                    message.seq, message.session_id, message._save_attempts
+                )
+        self.pending[:0] = retry
+        self._trim()
+
+    async def flush(self):
+        messages, self.pending = self.pending, []
+        if not messages:
+            return
+        try:
+            failed = await database_sync_to_async(self._save)(messages)
+        except Exception:
+            self.pending[:0] = messages
+            self._trim()
+            raise
+        self._retry_later(failed)
+
+    def flush_sync(self):
+        messages, self.pending = self.pending, []
+        if messages:
+            try:
+                failed = self._save(messages)
+            except Exception:
+                logger.exception('Lost %d chat messages at shutdown', len(messages))
+                return
+            if failed:
+                logger.error('Lost %d unsaveable chat messages at shutdown', len(failed))
+
+    @staticmethod
+    def _save(messages):
+        """Insert messages; returns those whose rows were rejected"""
+        # Messages for sessions or senders deleted since they were sent are dropped
+        session_ids = set(LiveSession.objects.filter(
+            id__in={message.session_id for message in messages}
+        ).values_list('id', flat=True))
+        sender_ids = set(get_user_model().objects.filter(
+            id__in={message.sender_id for message in messages}
+        ).values_list('id', flat=True))
+        messages = [
+            message for message in messages
+            if message.session_id in session_ids and message.sender_id in sender_ids
+        ]
+        try:
+            with transaction.atomic():
+                ChatMessage.objects.bulk_create(messages, batch_size=500)
+            return []
+        except ROW_ERRORS:
+            logger.warning('Chat batch of %d messages rejected, saving them one by one', len(messages), exc_info=True)
+
+        failed = []
+        for message in messages:
+            # Ids assigned by a rolled back batch are not real
+            message.pk = None
+            try:
+                with transaction.atomic():
+                    ChatMessage.objects.bulk_create([message])
+            except ROW_ERRORS:
+                logger.warning('Chat message %s of session %s rejected', message.seq, message.session_id, exc_info=True)
+                failed.append(message)
+        return failed
+
+chat_buffer = ChatWriteBuffer()
+atexit.register(chat_buffer.flush_sync)
@@ -1,16 +1,42 @@
-import json
-from channels.generic.websocket import AsyncWebsocketConsumer
+import time
+import uuid
+from urllib.parse import parse_qs
 from channels.db import database_sync_to_async
-from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.db.models import Q
 from django.utils import timezone
-from .models import LiveSession, Chat
-
-User = get_user_model()
-
-class ChatConsumer(AsyncWebsocketConsumer):
+from rest_framework import serializers
+from .attendance import arecord_presence, atouch_presence
+from .chat import append_recent, chat_buffer
+from .models import LiveSession
+from .protocol import MessageConsumer
+from .serializers import LiveSessionSerializer
+from .streams import append_event, current_seq, events_since
+from .whiteboard import whiteboard_batcher
+
+# Same timestamp format as the chat history API
+timestamp_field = serializers.DateTimeField()
+
+
+@database_sync_to_async
+def get_session_id(room_name):
+    """The id of the live session named by a route's room name, if it exists"""
+    try:
+        session_id = uuid.UUID(room_name)
+    except ValueError:
+        return None
+    return LiveSession.objects.filter(id=session_id).values_list('id', flat=True).first()
+
+
+class ChatConsumer(MessageConsumer):
     async def connect(self):
         self.room_name = self.scope['url_route']['kwargs']['room_name']
         self.room_group_name = f'chat_{self.room_name}'
+        
+        # Resolved once so receive() never waits on the database
+        user = self.scope.get('user')
+        self.sender = user if user is not None and user.is_authenticated else None
+        self.session_id = await get_session_id(self.room_name)
 
         await self.channel_layer.group_add(
             self.room_group_name,
@@ -24,64 +50,104 @@ class ChatConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
 
-    async def receive(self, text_data):
-        text_data_json = json.loads(text_data)
-        message = text_data_json['message']
-        username = text_data_json['username']
+    async def receive_json(self, content):
+        message = content['message']
+        username = self.sender.username if self.sender else content['username']
+        timestamp = timezone.now()
+        event = {
+            'message': message,
+            'username': username,
+            'timestamp': timestamp_field.to_representation(timestamp)
+        }
         
-        # Save message to database
-        await self.save_message(username, message)
+        # Only authenticated senders in real sessions are kept: numbered, added to the
+        # recent history and saved in bulk shortly after the broadcast
+        persist = bool(self.sender and self.session_id)
+        if persist:
+            event['seq'] = await append_recent(self.session_id, event)
         
         # Send message to room group
         await self.channel_layer.group_send(
             self.room_group_name,
-            {
-                'type': 'chat_message',
-                'message': message,
-                'username': username,
-                'timestamp': str(timezone.now())
-            }
+            {'type': 'chat_message', **event}
         )
+        
+        if persist:
+            chat_buffer.add(self.session_id, self.sender.id, message, timestamp, seq=event['seq'])
 
     async def chat_message(self, event):
-        await self.send(text_data=json.dumps({
-            'message': event['message'],
-            'username': event['username'],
-            'timestamp': event['timestamp']
-        }))
-    
-    @database_sync_to_async
-    def save_message(self, username, message):
-        try:
-            user = User.objects.get(username=username)
-            session = LiveSession.objects.get(id=self.room_name)
-            Chat.objects.create(
-                session=session,
-                user=user,
-                message=message
-            )
-        except (User.DoesNotExist, LiveSession.DoesNotExist):
-            pass
-
-class LiveSessionConsumer(AsyncWebsocketConsumer):
+        await self.send_json({
+            key: value for key, value in event.items() if key != 'type'
+        })
+
+class LiveSessionConsumer(MessageConsumer):
+    """Relays session events, numbered with ``seq``.
+
+    Clients reconnecting with ``?last_seq=N`` get the events after N; when
+    those are no longer buffered, or on a first connect, they get a
+    ``session_snapshot`` carrying the seq it is current as of.
+
+    The socket also drives attendance: clients send ``{"type": "heartbeat"}``
+    every ATTENDANCE_HEARTBEAT_SECONDS and anyone silent for longer than
+    ATTENDANCE_IDLE_SECONDS is reaped as having left when last seen.
+    """
+
     async def connect(self):
         self.session_id = self.scope['url_route']['kwargs']['session_id']
         self.session_group_name = f'live_session_{self.session_id}'
+        # Events up to here were already sent by the replay or covered by the snapshot
+        self.last_seq = None
+        # Set only for users who may attend, whose presence counts towards attendance
+        self.attended_session_id = await self.get_attended_session_id()
+        self.last_heartbeat = 0
 
         await self.channel_layer.group_add(
             self.session_group_name,
             self.channel_name
         )
         await self.accept()
+        await self.heartbeat()
+
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        try:
+            last_seq = int(query['last_seq'][0])
+        except (KeyError, ValueError):
+            last_seq = None
+
+        missed = None
+        if last_seq is not None:
+            missed = await events_since(self.session_group_name, last_seq)
+        if missed is None:
+            self.last_seq = await current_seq(self.session_group_name)
+            await self.send_json({
+                'type': 'session_snapshot',
+                'seq': self.last_seq,
+                'session': await self.get_snapshot()
+            })
+            return
+
+        for event in missed:
+            await self.send_json(event)
+        self.last_seq = missed[-1]['seq'] if missed else last_seq
 
     async def disconnect(self, close_code):
+        # Last seen now; the stint ends unless the client reconnects within the idle timeout
+        if self.attended_session_id is not None:
+            await atouch_presence(self.attended_session_id, self.scope['user'].id)
         await self.channel_layer.group_discard(
             self.session_group_name,
             self.channel_name
         )
 
-    async def receive(self, text_data):
-        data = json.loads(text_data)
+    async def receive_json(self, data):
+        await self.heartbeat()
+        
+        if isinstance(data, dict) and data.get('type') == 'heartbeat':
+            return
+        
+        if isinstance(data, dict):
+            data.pop('seq', None)
+            data = {'seq': await append_event(self.session_group_name, data), **data}
         
         # Broadcast to all participants in the session
         await self.channel_layer.group_send(
@@ -93,36 +159,83 @@ class LiveSessionConsumer(AsyncWebsocketConsumer):
         )
 
     async def session_update(self, event):
-        await self.send(text_data=json.dumps(event['data']))
+        data = event['data']
+        seq = data.get('seq') if isinstance(data, dict) else None
+        if seq is not None and self.last_seq is not None and seq <= self.last_seq:
+            return
+        await self.send_json(data)
+
+    async def heartbeat(self):
+        """Refresh presence; throttled to half the heartbeat interval so on-time heartbeats always count"""
+        now = time.monotonic()
+        if self.attended_session_id is None or now - self.last_heartbeat < settings.ATTENDANCE_HEARTBEAT_SECONDS / 2:
+            return
+        self.last_heartbeat = now
+        await arecord_presence(self.attended_session_id, self.scope['user'].id)
 
-class WhiteboardConsumer(AsyncWebsocketConsumer):
+    @database_sync_to_async
+    def get_attended_session_id(self):
+        """The session's id if the user hosts it or is enrolled in its course"""
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            return None
+        try:
+            session_id = uuid.UUID(self.session_id)
+        except ValueError:
+            return None
+        return LiveSession.objects.filter(id=session_id).filter(
+            Q(tutor=user) | Q(course__enrollments__student=user)
+        ).values_list('id', flat=True).first()
+
+    @database_sync_to_async
+    def get_snapshot(self):
+        try:
+            session_id = uuid.UUID(self.session_id)
+        except ValueError:
+            return None
+        session = LiveSession.objects.select_related('course', 'tutor').filter(id=session_id).first()
+        return LiveSessionSerializer(session).data if session else None
+
+class WhiteboardConsumer(MessageConsumer):
     async def connect(self):
-        self.session_id = self.scope['url_route']['kwargs']['session_id']
-        self.whiteboard_group_name = f'whiteboard_{self.session_id}'
+        self.room_name = self.scope['url_route']['kwargs']['session_id']
+        self.whiteboard_group_name = f'whiteboard_{self.room_name}'
+        # Boards of sessions that don't exist could never be saved
+        self.session_id = await get_session_id(self.room_name)
+        if self.session_id is None:
+            await self.close()
+            return
 
         await self.channel_layer.group_add(
             self.whiteboard_group_name,
             self.channel_name
         )
+        whiteboard_batcher.join(self.whiteboard_group_name, self.session_id)
         await self.accept()
 
+        # Late joiners get the current board as one snapshot
+        await self.send_json({
+            'type': 'whiteboard_snapshot',
+            'content': await whiteboard_batcher.get_snapshot(self.whiteboard_group_name, self.session_id)
+        })
+
     async def disconnect(self, close_code):
+        if self.session_id is None:
+            return
+        whiteboard_batcher.leave(self.whiteboard_group_name)
         await self.channel_layer.group_discard(
             self.whiteboard_group_name,
             self.channel_name
         )
 
-    async def receive(self, text_data):
-        data = json.loads(text_data)
-        
-        # Broadcast whiteboard updates to all participants
-        await self.channel_layer.group_send(
-            self.whiteboard_group_name,
-            {
-                'type': 'whiteboard_update',
-                'data': data
-            }
-        )
-
-    async def whiteboard_update(self, event):
-        await self.send(text_data=json.dumps(event['data']))
\ No newline at end of file
+    async def receive_json(self, data):
+        # Coalesced and broadcast to all participants as one batch per tick
+        whiteboard_batcher.add(self.whiteboard_group_name, data)
+
+    async def whiteboard_batch(self, event):
+        # Another process may have cleared the board since this one last saved
+        whiteboard_batcher.observe_epoch(self.whiteboard_group_name, event.get('epoch'))
+        await self.send_json({
+            'type': 'whiteboard_batch',
+            'updates': event['updates']
+        })
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 17:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classroom', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='livesession',
+            index=models.Index(fields=['course', 'scheduled_at', 'id'], name='live_sessions_course_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='livesession',
+            index=models.Index(fields=['tutor', 'scheduled_at', 'id'], name='live_sessions_tutor_idx'),
+        ),
+    ]
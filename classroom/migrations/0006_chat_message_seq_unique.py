@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-17 18:14
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def clear_duplicate_seqs(apps, schema_editor):
+    # A seq counter that expired and restarted could number two messages alike;
+    # the first one saved keeps the seq
+    ChatMessage = apps.get_model('classroom', 'ChatMessage')
+    duplicates = (
+        ChatMessage.objects.filter(seq__isnull=False).order_by()
+        .values('session_id', 'seq').annotate(count=Count('pk'), first=Min('pk')).filter(count__gt=1)
+    )
+    for duplicate in duplicates.iterator():
+        ChatMessage.objects.filter(session_id=duplicate['session_id'], seq=duplicate['seq']).exclude(
+            pk=duplicate['first']
+        ).update(seq=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classroom', '0005_chat_message_seq_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_duplicate_seqs, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='chatmessage',
+            name='chat_messages_seq_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='chatmessage',
+            constraint=models.UniqueConstraint(fields=('session', 'seq'), name='chat_messages_session_seq_uniq'),
+        ),
+    ]
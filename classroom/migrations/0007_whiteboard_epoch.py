@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 18:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classroom', '0006_chat_message_seq_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='whiteboard',
+            name='epoch',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.db import models
+from django.db.models import Case, DateTimeField, DurationField, ExpressionWrapper, F, IntegerField, Value, When
+from django.db.models.functions import Cast, Coalesce, Extract, Floor, Greatest
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from courses.models import Course
 import uuid
 
@@ -41,9 +44,60 @@ class LiveSession(models.Model):
     class Meta:
         db_table = 'live_sessions'
         ordering = ['scheduled_at']
+        indexes = [
+            # Schedule listings: keyset pagination per course and per tutor
+            models.Index(fields=['course', 'scheduled_at', 'id'], name='live_sessions_course_idx'),
+            models.Index(fields=['tutor', 'scheduled_at', 'id'], name='live_sessions_tutor_idx'),
+        ]
     
     def __str__(self):
         return f"{self.course.title} - {self.title}"
+    
+    @property
+    def is_active(self):
+        return self.status == 'live'
+    
+    @property
+    def meeting_url(self):
+        return self.zoom_join_url
+
+def attended_minutes(left_at):
+    """SQL adding the whole minutes between joined_at and the left_at expression to duration_minutes.
+    
+    Durations accumulate, so an attendee who drops out and rejoins keeps the minutes of earlier stints.
+    """
+    elapsed = ExpressionWrapper(left_at - F('joined_at'), output_field=DurationField())
+    return F('duration_minutes') + Coalesce(
+        Greatest(Cast(Floor(Extract(elapsed, 'epoch') / 60), IntegerField()), Value(0)),
+        Value(0)
+    )
+
+class SessionAttendanceQuerySet(models.QuerySet):
+    def close(self, left_at):
+        """Close the open attendances with one UPDATE; returns the number closed"""
+        left_at = Value(left_at, output_field=DateTimeField())
+        return self.filter(left_at__isnull=True).update(
+            left_at=left_at,
+            duration_minutes=attended_minutes(left_at),
+            is_present=False
+        )
+    
+    def close_each(self, left_at_by_student):
+        """Close open attendances of several students, each at their own time, with one UPDATE"""
+        if not left_at_by_student:
+            return 0
+        left_at = Case(
+            *[
+                When(student_id=student_id, then=Value(left_at, output_field=DateTimeField()))
+                for student_id, left_at in left_at_by_student.items()
+            ],
+            output_field=DateTimeField()
+        )
+        return self.filter(left_at__isnull=True, student_id__in=left_at_by_student).update(
+            left_at=left_at,
+            duration_minutes=attended_minutes(left_at),
+            is_present=False
+        )
 
 class SessionAttendance(models.Model):
     session = models.ForeignKey(LiveSession, on_delete=models.CASCADE, related_name='attendances')
@@ -54,6 +108,8 @@ class SessionAttendance(models.Model):
     duration_minutes = models.PositiveIntegerField(default=0)
     is_present = models.BooleanField(default=False)
     
+    objects = SessionAttendanceQuerySet.as_manager()
+    
     class Meta:
         db_table = 'session_attendance'
         unique_together = ['session', 'student']
@@ -61,6 +117,8 @@ class SessionAttendance(models.Model):
 class Whiteboard(models.Model):
     session = models.OneToOneField(LiveSession, on_delete=models.CASCADE, related_name='whiteboard')
     content = models.JSONField(default=dict)
+    # Bumped by every clear; changes drawn before a clear carry an older epoch and are not merged
+    epoch = models.PositiveIntegerField(default=0)
     last_updated_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -85,11 +143,22 @@ class ChatMessage(models.Model):
     is_private = models.BooleanField(default=False)
     recipient = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='private_messages')
     
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the message is sent; rows are written later in bulk
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
+    # Per-session sequence number from Redis, used by clients to resume after a reconnect
+    seq = models.PositiveBigIntegerField(blank=True, null=True, editable=False)
     
     class Meta:
         db_table = 'chat_messages'
         ordering = ['timestamp']
+        indexes = [
+            # History backfill pages
+            models.Index(fields=['session', 'timestamp', 'id'], name='chat_messages_session_idx'),
+        ]
+        constraints = [
+            # Also the index for since_seq resumes
+            models.UniqueConstraint(fields=['session', 'seq'], name='chat_messages_session_seq_uniq'),
+        ]
 
 class Poll(models.Model):
     session = models.ForeignKey(LiveSession, on_delete=models.CASCADE, related_name='polls')
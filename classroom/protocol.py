@@ -0,0 +1,40 @@
+"""
+Wire formats for the classroom sockets
+Clients offering the ``msgpack`` WebSocket subprotocol exchange MessagePack
+binary frames; everyone else keeps JSON text frames
+"""
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; without it only JSON is offered
+    msgpack = None
+
+MSGPACK_SUBPROTOCOL = 'msgpack'
+
+
+class MessageConsumer(AsyncJsonWebsocketConsumer):
+    """JSON consumer that speaks MessagePack to clients that negotiate it.
+
+    Subclasses implement receive_json() and reply with send_json() as usual.
+    Incoming frames are decoded by their kind, so JSON text from a binary
+    client is still understood.
+    """
+
+    binary = False
+
+    async def accept(self, subprotocol=None):
+        self.binary = msgpack is not None and MSGPACK_SUBPROTOCOL in self.scope.get('subprotocols', [])
+        await super().accept(MSGPACK_SUBPROTOCOL if self.binary else subprotocol)
+
+    async def receive(self, text_data=None, bytes_data=None, **kwargs):
+        if bytes_data is not None and msgpack is not None:
+            await self.receive_json(msgpack.unpackb(bytes_data), **kwargs)
+            return
+        await super().receive(text_data=text_data, bytes_data=bytes_data, **kwargs)
+
+    async def send_json(self, content, close=False):
+        if self.binary:
+            await self.send(bytes_data=msgpack.packb(content), close=close)
+            return
+        await super().send_json(content, close=close)
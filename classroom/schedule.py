@@ -0,0 +1,39 @@
+"""
+Per-user cached session schedules
+Entries remember the version scopes they were built from; creating, starting
+or ending a session bumps its course and tutor scopes, and enrollment changes
+bump the student's scope, so stale entries are never served.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from courses.cache import bump_versions, get_versions
+
+SCHEDULE_KEY = 'schedule:{}:{}'
+
+def course_scope(course_id):
+    return f'sessions:course:{course_id}'
+
+def tutor_scope(tutor_id):
+    return f'sessions:tutor:{tutor_id}'
+
+def student_scope(student_id):
+    return f'sessions:student:{student_id}'
+
+def get_schedule(user, request_key):
+    entry = cache.get(SCHEDULE_KEY.format(user.id, request_key))
+    if entry is None or get_versions(entry['scopes']) != entry['versions']:
+        return None
+    return entry['data']
+
+def set_schedule(user, request_key, scopes, data):
+    cache.set(
+        SCHEDULE_KEY.format(user.id, request_key),
+        {'scopes': scopes, 'versions': get_versions(scopes), 'data': data},
+        timeout=settings.SCHEDULE_CACHE_TIMEOUT
+    )
+
+def invalidate_session(session):
+    bump_versions(course_scope(session.course_id), tutor_scope(session.tutor_id))
+
+def invalidate_student(student_id):
+    bump_versions(student_scope(student_id))
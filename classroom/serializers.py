@@ -0,0 +1,35 @@
+from rest_framework import serializers
+from .models import ChatMessage, LiveSession
+
+class LiveSessionSerializer(serializers.ModelSerializer):
+    """Schedule entry; expects course and tutor to be select_related"""
+    course = serializers.CharField(source='course.title', read_only=True)
+    tutor = serializers.SerializerMethodField()
+    is_active = serializers.BooleanField(read_only=True)
+    meeting_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = LiveSession
+        fields = [
+            'id', 'title', 'course', 'tutor', 'scheduled_at', 'duration_minutes',
+            'status', 'is_active', 'max_participants', 'meeting_url', 'description'
+        ]
+    
+    def get_tutor(self, obj):
+        return f"{obj.tutor.first_name} {obj.tutor.last_name}"
+    
+    def get_meeting_url(self, obj):
+        return obj.meeting_url if obj.is_active else None
+
+class LiveSessionDetailSerializer(LiveSessionSerializer):
+    def get_meeting_url(self, obj):
+        return obj.meeting_url
+
+class ChatMessageSerializer(serializers.ModelSerializer):
+    """Same shape as the chat_message events and the recent-history entries in Redis"""
+    message = serializers.CharField(source='content')
+    username = serializers.CharField(source='sender.username')
+    
+    class Meta:
+        model = ChatMessage
+        fields = ['seq', 'message', 'username', 'timestamp']
@@ -0,0 +1,15 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from courses.models import Enrollment
+from .models import LiveSession
+from .schedule import invalidate_session, invalidate_student
+
+@receiver([post_save, post_delete], sender=LiveSession)
+def invalidate_session_schedules(sender, instance, **kwargs):
+    # Covers create, start and end; bump after commit so a rebuild sees the new row
+    transaction.on_commit(lambda: invalidate_session(instance))
+
+@receiver([post_save, post_delete], sender=Enrollment)
+def invalidate_student_schedule(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_student(instance.student_id))
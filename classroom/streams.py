@@ -0,0 +1,70 @@
+"""
+Numbered event streams in Redis
+Each stream has a sequence counter and a capped list of its latest events, so
+clients that reconnect with the last seq they saw get only what they missed
+"""
+import json
+
+from django.conf import settings
+
+from tutoring_platform.redis_client import get_async_redis
+
+REPLAY_KEY = 'stream:replay:{}'
+SEQ_KEY = 'stream:seq:{}'
+
+# Numbers an event (a JSON object) and appends it to the list in one round trip,
+# so list order is always seq order. With a seed, a missing counter starts from it;
+# an empty seed returns nil instead so the caller can look one up.
+#   KEYS: list, sequence counter
+#   ARGV: encoded event, list size, key TTL, [seed]
+APPEND_SCRIPT = """
+if ARGV[4] and redis.call('EXISTS', KEYS[2]) == 0 then
+    if ARGV[4] == '' then
+        return false
+    end
+    redis.call('SET', KEYS[2], ARGV[4])
+end
+local seq = redis.call('INCR', KEYS[2])
+local rest = string.sub(ARGV[1], 2)
+if rest ~= '}' then
+    rest = ',' .. rest
+end
+redis.call('RPUSH', KEYS[1], '{"seq":' .. seq .. rest)
+redis.call('LTRIM', KEYS[1], -tonumber(ARGV[2]), -1)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return seq
+"""
+
+
+async def append_numbered(list_key, seq_key, event, size, ttl, seed=None):
+    """Number an event dict and keep it in the list; returns its seq.
+
+    seed is the seq to continue from if the counter is missing; pass '' to get
+    None back in that case instead.
+    """
+    args = (json.dumps(event), size, ttl) if seed is None else (json.dumps(event), size, ttl, seed)
+    return await get_async_redis().eval(APPEND_SCRIPT, 2, list_key, seq_key, *args)
+
+
+async def append_event(stream, event):
+    return await append_numbered(
+        REPLAY_KEY.format(stream), SEQ_KEY.format(stream), event,
+        settings.LIVE_SESSION_REPLAY_SIZE, settings.LIVE_SESSION_REPLAY_TTL_SECONDS
+    )
+
+
+async def current_seq(stream):
+    """Seq of the stream's latest event, 0 if it has none"""
+    return int(await get_async_redis().get(SEQ_KEY.format(stream)) or 0)
+
+
+async def events_since(stream, last_seq):
+    """Buffered events after last_seq, oldest first, or None if some were already dropped"""
+    events = [json.loads(entry) for entry in await get_async_redis().lrange(REPLAY_KEY.format(stream), 0, -1)]
+    if not events:
+        return [] if last_seq == await current_seq(stream) else None
+    # A last_seq beyond the newest event means the stream expired and started over
+    if events[0]['seq'] > last_seq + 1 or last_seq > events[-1]['seq']:
+        return None
+    return [event for event in events if event['seq'] > last_seq]
@@ -0,0 +1,8 @@
+from celery import shared_task
+from .attendance import flush_attendance
+
+
+@shared_task
+def flush_session_attendance():
+    """Reap idle attendees and write buffered joins and leaves to SessionAttendance"""
+    return flush_attendance()
@@ -1,3 +1,335 @@
-from django.test import TestCase
+import time
+import uuid
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.db import IntegrityError, OperationalError, connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from courses.models import Course, Enrollment
+from users.models import User
+from . import attendance
+from .chat import ChatWriteBuffer, append_recent
+from .models import ChatMessage, LiveSession, SessionAttendance, Whiteboard
+from .routing import websocket_urlpatterns
+from .whiteboard import WhiteboardBatcher
+
+try:
+    import fakeredis
+except ImportError:  # Redis-backed tests need fakeredis (and lupa for scripts)
+    fakeredis = None
+
+
+def make_user(username, user_type='student'):
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com', password='password', user_type=user_type
+    )
+
+
+def make_session(tutor, **fields):
+    course = Course.objects.create(
+        tutor=tutor, title='Course', slug=f'course-{uuid.uuid4().hex[:8]}', description='Description',
+        short_description='Short', difficulty='beginner', duration_weeks=4, status='published'
+    )
+    return LiveSession.objects.create(course=course, tutor=tutor, title='Session', scheduled_at=timezone.now(), **fields)
+
+
+class WhiteboardTests(TestCase):
+    def test_unknown_session_is_rejected(self):
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), f'/ws/whiteboard/{uuid.uuid4().hex}/'
+        )
+        connected, _ = async_to_sync(communicator.connect)()
+        self.assertFalse(connected)
+
+    def test_unsaveable_board_is_dropped(self):
+        batcher = WhiteboardBatcher()
+        batcher.session_ids['whiteboard_x'] = uuid.uuid4()
+        batcher.add('whiteboard_x', {'element_id': 'a', 'points': [[1, 2]]})
+
+        with mock.patch.object(WhiteboardBatcher, '_save_snapshot', side_effect=IntegrityError), \
+                self.assertLogs('classroom.whiteboard', 'ERROR'):
+            async_to_sync(batcher.persist_snapshots)()
+
+        self.assertNotIn('whiteboard_x', batcher.session_ids)
+        self.assertNotIn('whiteboard_x', batcher.dirty)
+
+    def test_failed_save_is_retried(self):
+        batcher = WhiteboardBatcher()
+        batcher.session_ids['whiteboard_x'] = uuid.uuid4()
+        batcher.add('whiteboard_x', {'element_id': 'a', 'points': [[1, 2]]})
+
+        with mock.patch.object(WhiteboardBatcher, '_save_snapshot', side_effect=ConnectionError), \
+                self.assertLogs('classroom.whiteboard', 'ERROR'):
+            async_to_sync(batcher.persist_snapshots)()
+
+        self.assertEqual(batcher.dirty['whiteboard_x'], {'a'})
+
+    def test_clear_is_not_undone_by_another_process(self):
+        session = make_session(make_user('tutor', 'tutor'))
+        Whiteboard.objects.create(session=session, content={'old': {'element_id': 'old'}})
+        clearing, drawing = WhiteboardBatcher(), WhiteboardBatcher()
+        for batcher in (clearing, drawing):
+            batcher.session_ids['whiteboard_x'] = session.id
+            batcher.members['whiteboard_x'] = 1
+            async_to_sync(batcher.get_snapshot)('whiteboard_x', session.id)
+
+        drawing.add('whiteboard_x', {'element_id': 'a', 'points': [[1, 2]]})
+        clearing.add('whiteboard_x', {'action': 'clear'})
+        async_to_sync(clearing.flush)()
+        whiteboard = Whiteboard.objects.get(session=session)
+        self.assertEqual((whiteboard.content, whiteboard.epoch), ({}, 1))
+
+        async_to_sync(drawing.persist_snapshots)()
+        whiteboard.refresh_from_db()
+        self.assertEqual((whiteboard.content, whiteboard.epoch), ({}, 1))
+        self.assertEqual(drawing.epochs['whiteboard_x'], 1)
+        self.assertNotIn('whiteboard_x', drawing.elements)
+
+        drawing.add('whiteboard_x', {'element_id': 'b', 'points': [[3, 4]]})
+        async_to_sync(drawing.persist_snapshots)()
+        whiteboard.refresh_from_db()
+        self.assertEqual(list(whiteboard.content), ['b'])
+
+    def test_newer_epoch_drops_unsaved_elements(self):
+        batcher = WhiteboardBatcher()
+        batcher.epochs['whiteboard_x'] = 0
+        batcher.add('whiteboard_x', {'element_id': 'a', 'points': [[1, 2]]})
+
+        batcher.observe_epoch('whiteboard_x', 0)
+        self.assertEqual(batcher.dirty['whiteboard_x'], {'a'})
+        batcher.observe_epoch('whiteboard_x', 1)
+        self.assertNotIn('whiteboard_x', batcher.dirty)
+        self.assertNotIn('whiteboard_x', batcher.pending)
+
+
+@override_settings(CHAT_BUFFER_MAX_MESSAGES=3, CHAT_SAVE_MAX_ATTEMPTS=2)
+class ChatWriteBufferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tutor = make_user('tutor', 'tutor')
+        cls.session = make_session(cls.tutor)
+
+    def setUp(self):
+        self.buffer = ChatWriteBuffer()
+
+    def flush(self, *messages):
+        async def add_and_flush():
+            for seq, (sender_id, content) in enumerate(messages, 1):
+                self.buffer.add(self.session.id, sender_id, content, timezone.now(), seq=seq)
+            self.buffer._task.cancel()
+            await self.buffer.flush()
+        async_to_sync(add_and_flush)()
+
+    def saved(self):
+        return list(ChatMessage.objects.order_by('seq').values_list('content', flat=True))
+
+    def test_flush_saves_messages(self):
+        self.flush((self.tutor.id, 'hello'), (self.tutor.id, 'there'))
+        self.assertEqual(self.saved(), ['hello', 'there'])
+        self.assertEqual(self.buffer.pending, [])
+
+    def test_nul_bytes_are_stripped(self):
+        self.flush((self.tutor.id, 'nul\x00byte'))
+        self.assertEqual(self.saved(), ['nulbyte'])
+
+    def test_messages_from_deleted_senders_are_dropped(self):
+        self.flush((self.tutor.id, 'kept'), (self.tutor.id + 1000, 'orphan'))
+        self.assertEqual(self.saved(), ['kept'])
+
+    def test_rejected_row_is_retried_then_dropped(self):
+        bulk_create = ChatMessage.objects.bulk_create
+
+        def reject_bad(messages, **kwargs):
+            if any(message.content == 'bad' for message in messages):
+                raise IntegrityError
+            return bulk_create(messages, **kwargs)
+
+        with mock.patch.object(ChatMessage.objects, 'bulk_create', side_effect=reject_bad), \
+                self.assertLogs('classroom.chat', 'WARNING'):
+            self.flush((self.tutor.id, 'good'), (self.tutor.id, 'bad'))
+            self.assertEqual(self.saved(), ['good'])
+            self.assertEqual([message.content for message in self.buffer.pending], ['bad'])
+
+            with self.assertLogs('classroom.chat', 'ERROR') as logs:
+                self.flush()
+        self.assertIn('after 2 failed saves', logs.output[-1])
+        self.assertEqual(self.buffer.pending, [])
+        self.assertEqual(self.saved(), ['good'])
+
+    def test_database_outage_keeps_every_message(self):
+        with mock.patch.object(ChatWriteBuffer, '_save', side_effect=OperationalError), \
+                self.assertRaises(OperationalError):
+            self.flush((self.tutor.id, 'one'), (self.tutor.id, 'two'))
+        self.assertEqual([message.content for message in self.buffer.pending], ['one', 'two'])
+        self.assertFalse(hasattr(self.buffer.pending[0], '_save_attempts'))
+
+    def test_buffer_is_capped(self):
+        with self.assertLogs('classroom.chat', 'ERROR'):
+            self.flush(*[(self.tutor.id, str(i)) for i in range(5)])
+        self.assertEqual(self.saved(), ['2', '3', '4'])
+
+
+@skipUnless(fakeredis, 'needs fakeredis')
+@override_settings(CHAT_HISTORY_RING_SIZE=3)
+class ChatHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tutor = make_user('tutor', 'tutor')
+        cls.session = make_session(cls.tutor)
+
+    def setUp(self):
+        server = fakeredis.FakeServer()
+        self.redis = fakeredis.FakeRedis(server=server, decode_responses=True)
+        for target, client in (
+            ('classroom.chat.get_redis', lambda: self.redis),
+            ('classroom.streams.get_async_redis', lambda: fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)),
+        ):
+            patcher = mock.patch(target, client)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(self.tutor)
+
+    def send(self, count, saved):
+        """Send count messages, of which the first saved are already in the database"""
+        for index in range(count):
+            content = f'message {index}'
+            timestamp = timezone.now()
+            seq = async_to_sync(append_recent)(self.session.id, {
+                'message': content, 'username': self.tutor.username, 'timestamp': timestamp.isoformat()
+            })
+            if index < saved:
+                ChatMessage.objects.create(
+                    session=self.session, sender=self.tutor, content=content, timestamp=timestamp, seq=seq
+                )
+
+    def since(self, since_seq):
+        response = self.client.get(reverse('classroom:session_chat', args=[self.session.id]), {'since_seq': since_seq})
+        self.assertEqual(response.status_code, 200)
+        return [message['seq'] for message in response.data['results']]
+
+    def test_gap_within_recent_messages(self):
+        self.send(6, saved=6)
+        self.assertEqual(self.since(3), [4, 5, 6])
+
+    def test_gap_reaching_the_database(self):
+        # 4..6 are recent, 5 and 6 not saved yet
+        self.send(6, saved=4)
+        self.assertEqual(self.since(1), [2, 3, 4, 5, 6])
+
+    def test_nothing_missed(self):
+        self.send(2, saved=2)
+        self.assertEqual(self.since(2), [])
+
+    def test_invalid_since_seq(self):
+        response = self.client.get(reverse('classroom:session_chat', args=[self.session.id]), {'since_seq': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_lost_counter_continues_from_saved_messages(self):
+        self.send(4, saved=4)
+        self.redis.flushall()
+        self.send(1, saved=1)
+        self.assertEqual(list(ChatMessage.objects.order_by('seq').values_list('seq', flat=True)), [1, 2, 3, 4, 5])
+
+
+@skipUnless(fakeredis, 'needs fakeredis')
+class AttendanceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tutor = make_user('tutor', 'tutor')
+        cls.student = make_user('student')
+        cls.session = make_session(cls.tutor, status='live')
+        Enrollment.objects.create(student=cls.student, course=cls.session.course, status='active')
+
+    def setUp(self):
+        server = fakeredis.FakeServer()
+        self.redis = fakeredis.FakeRedis(server=server, decode_responses=True)
+        for target, client in (
+            ('classroom.attendance.get_redis', lambda: self.redis),
+            ('classroom.attendance.get_async_redis', lambda: fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)),
+        ):
+            patcher = mock.patch(target, client)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = APIClient()
+
+    def buffered(self, key):
+        return {int(student_id) for student_id in self.redis.hkeys(key.format(self.session.id))}
+
+    def test_join_is_written_in_bulk(self):
+        self.client.force_authenticate(self.student)
+        response = self.client.post(reverse('classroom:join_session', args=[self.session.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(SessionAttendance.objects.exists())
+
+        attendance.flush_session_attendance(self.session.id)
+        row = SessionAttendance.objects.get(session=self.session, student=self.student)
+        self.assertTrue(row.is_present)
+        self.assertIsNone(row.left_at)
+
+    def test_heartbeats_only_count_while_live(self):
+        scheduled = make_session(self.tutor)
+        self.assertFalse(attendance.record_presence(scheduled.id, self.student.id))
+
+        self.client.force_authenticate(self.tutor)
+        self.client.post(reverse('classroom:start_session', args=[scheduled.id]))
+        self.assertTrue(async_to_sync(attendance.arecord_presence)(scheduled.id, self.student.id))
+
+    def test_status_is_read_once_when_not_cached(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(attendance.record_presence(self.session.id, self.student.id))
+            self.assertTrue(attendance.record_presence(self.session.id, self.tutor.id))
+
+    def test_leave_is_buffered_once(self):
+        attendance.record_presence(self.session.id, self.student.id)
+        self.assertTrue(attendance.record_leave(self.session.id, self.student.id))
+        self.assertFalse(attendance.record_leave(self.session.id, self.student.id))
+        self.assertEqual(self.buffered(attendance.LEAVES_KEY), {self.student.id})
+
+    def test_idle_attendees_leave_when_last_seen(self):
+        attendance.record_presence(self.session.id, self.student.id)
+        last_seen = time.time() - 3600
+        self.redis.zadd(attendance.PRESENCE_KEY.format(self.session.id), {self.student.id: last_seen})
+
+        with mock.patch.object(attendance, 'apply_attendance', return_value=1) as apply:
+            attendance.flush_attendance()
+        session_id, joins, leaves = apply.call_args.args
+        self.assertEqual(str(session_id), str(self.session.id))
+        self.assertEqual(set(joins), {self.student.id})
+        self.assertAlmostEqual(leaves[self.student.id].timestamp(), last_seen, places=3)
+
+    def test_heartbeats_after_the_end_are_ignored(self):
+        attendance.record_presence(self.session.id, self.student.id)
+        with mock.patch.object(attendance, 'apply_attendance', return_value=1) as apply:
+            attendance.end_session_attendance(self.session.id)
+        self.assertEqual(set(apply.call_args.args[2]), {self.student.id})
+
+        # A socket left open keeps heartbeating, and a stale status read cannot reopen the session
+        self.assertFalse(attendance.record_presence(self.session.id, self.student.id))
+        attendance.set_session_status(self.session.id, 'live', only_if_missing=True)
+        self.assertFalse(async_to_sync(attendance.arecord_presence)(self.session.id, self.student.id))
+        self.assertEqual(self.buffered(attendance.JOINS_KEY), set())
+
+    @skipUnless(connection.vendor == 'postgresql', 'attended minutes are computed with PostgreSQL intervals')
+    def test_closing_clears_presence(self):
+        joined_at = timezone.now() - timedelta(minutes=30)
+        other = make_user('other')
+        SessionAttendance.objects.bulk_create([
+            SessionAttendance(session=self.session, student=student, joined_at=joined_at, is_present=True)
+            for student in (self.student, other)
+        ])
+        attendances = SessionAttendance.objects.filter(session=self.session)
+        self.assertEqual(attendances.close_each({self.student.id: joined_at + timedelta(minutes=10)}), 1)
+        self.assertEqual(attendances.close(joined_at + timedelta(minutes=20)), 1)
+
+        self.assertEqual(
+            sorted(attendances.values_list('duration_minutes', 'is_present')),
+            [(10, False), (20, False)]
+        )
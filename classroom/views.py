@@ -3,62 +3,99 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django.utils import timezone
 from django.db.models import Q
+from .attendance import end_session_attendance, record_leave, record_presence, set_session_status
+from .chat import recent_messages
 from .models import LiveSession, Assignment, Submission, ChatMessage, Poll, SessionAttendance
-from courses.models import Course
+from .schedule import course_scope, get_schedule, set_schedule, student_scope, tutor_scope
+from .serializers import ChatMessageSerializer, LiveSessionDetailSerializer, LiveSessionSerializer
+from courses.models import Course, Enrollment
 from django.shortcuts import get_object_or_404
+from tutoring_platform.pagination import ChatKeysetPagination, ScheduleKeysetPagination
+from datetime import timedelta
 import uuid
 
+UPCOMING_DAYS = 14
+MAX_UPCOMING_DAYS = 90
+# Scheduled sessions stay listed for a while after their start time in case the tutor is late
+UPCOMING_GRACE = timedelta(hours=1)
+
+def enrolled_course_ids(user):
+    """Courses whose sessions a student may see, as a subquery"""
+    return Enrollment.objects.filter(student=user).values('course_id')
+
+def session_access_error(user, session):
+    """Error response if the user may not see the session, else None"""
+    if user.user_type == 'tutor' and session.tutor_id != user.id:
+        return Response({'error': 'Permission denied'}, status=403)
+    if user.user_type == 'student':
+        if not Enrollment.objects.filter(student=user, course_id=session.course_id).exists():
+            return Response({'error': 'Not enrolled in this course'}, status=403)
+    return None
+
 class LiveSessionListView(generics.ListAPIView):
+    """Sessions the user hosts (tutors) or can attend (students).
+    
+    ``?upcoming=true`` limits the list to live sessions and those scheduled
+    within the next ``days`` (default 14), soonest first.
+    """
+    serializer_class = LiveSessionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ScheduleKeysetPagination
     
-    def list(self, request):
-        user = request.user
+    def is_upcoming(self):
+        return self.request.query_params.get('upcoming', '').lower() in ('1', 'true', 'yes')
+    
+    def get_queryset(self):
+        user = self.request.user
         
         if user.user_type == 'tutor':
-            # Tutors see sessions they're hosting
-            sessions = LiveSession.objects.filter(tutor=user).order_by('-scheduled_at')
+            sessions = LiveSession.objects.filter(tutor=user)
         else:
-            # Students see sessions for enrolled courses
-            enrolled_courses = request.user.enrollments.values_list('course_id', flat=True)
-            sessions = LiveSession.objects.filter(
-                course_id__in=enrolled_courses
-            ).order_by('-scheduled_at')
+            sessions = LiveSession.objects.filter(course_id__in=enrolled_course_ids(user))
         
-        session_data = []
-        for session in sessions:
-            session_data.append({
-                'id': session.id,
-                'title': session.title,
-                'course': session.course.title,
-                'tutor': f"{session.tutor.first_name} {session.tutor.last_name}",
-                'scheduled_at': session.scheduled_at,
-                'duration_minutes': session.duration_minutes,
-                'is_active': session.is_active,
-                'max_participants': session.max_participants,
-                'meeting_url': session.meeting_url if session.is_active else None,
-                'description': session.description
-            })
+        if self.is_upcoming():
+            try:
+                days = min(int(self.request.query_params.get('days', UPCOMING_DAYS)), MAX_UPCOMING_DAYS)
+            except ValueError:
+                days = UPCOMING_DAYS
+            now = timezone.now()
+            sessions = sessions.filter(
+                Q(status='live') | Q(status='scheduled', scheduled_at__gte=now - UPCOMING_GRACE),
+                scheduled_at__lt=now + timedelta(days=days)
+            )
         
-        return Response({
-            'sessions': session_data,
-            'count': len(session_data)
-        })
+        return sessions.select_related('course', 'tutor')
+    
+    def get_schedule_scopes(self):
+        user = self.request.user
+        if user.user_type == 'tutor':
+            return [tutor_scope(user.id)]
+        course_ids = Enrollment.objects.filter(student=user).values_list('course_id', flat=True)
+        return [student_scope(user.id)] + [course_scope(course_id) for course_id in course_ids]
+    
+    def list(self, request, *args, **kwargs):
+        request_key = request.get_full_path()
+        data = get_schedule(request.user, request_key)
+        if data is not None:
+            return Response(data)
+        
+        # Scopes are read before the rows so a concurrent change is never cached as current
+        scopes = self.get_schedule_scopes()
+        response = super().list(request, *args, **kwargs)
+        set_schedule(request.user, request_key, scopes, response.data)
+        return response
 
 class LiveSessionDetailView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def retrieve(self, request, pk):
         try:
-            session = LiveSession.objects.get(id=pk)
+            session = LiveSession.objects.select_related('course', 'tutor').get(id=pk)
             
             # Check permissions
-            user = request.user
-            if user.user_type == 'tutor' and session.tutor != user:
-                return Response({'error': 'Permission denied'}, status=403)
-            elif user.user_type == 'student':
-                enrolled = user.enrollments.filter(course=session.course).exists()
-                if not enrolled:
-                    return Response({'error': 'Not enrolled in this course'}, status=403)
+            error = session_access_error(request.user, session)
+            if error:
+                return error
             
             # Get session attendees
             attendees = SessionAttendance.objects.filter(session=session).select_related('student')
@@ -69,16 +106,7 @@ class LiveSessionDetailView(generics.RetrieveAPIView):
             } for att in attendees]
             
             return Response({
-                'id': session.id,
-                'title': session.title,
-                'course': session.course.title,
-                'tutor': f"{session.tutor.first_name} {session.tutor.last_name}",
-                'scheduled_at': session.scheduled_at,
-                'duration_minutes': session.duration_minutes,
-                'is_active': session.is_active,
-                'max_participants': session.max_participants,
-                'meeting_url': session.meeting_url,
-                'description': session.description,
+                **LiveSessionDetailSerializer(session).data,
                 'attendees': attendee_list,
                 'total_attendees': len(attendee_list)
             })
@@ -107,9 +135,8 @@ class LiveSessionCreateView(generics.CreateAPIView):
                 scheduled_at=data.get('scheduled_at'),
                 duration_minutes=data.get('duration_minutes', 60),
                 max_participants=data.get('max_participants', 50),
-                meeting_url=meeting_url,
-                description=data.get('description', ''),
-                is_active=False
+                zoom_join_url=meeting_url,
+                description=data.get('description', '')
             )
             
             return Response({
@@ -121,7 +148,7 @@ class LiveSessionCreateView(generics.CreateAPIView):
                     'scheduled_at': session.scheduled_at
                 }
             }, status=201)
-            
+        
         except Course.DoesNotExist:
             return Response({'error': 'Course not found'}, status=404)
         except Exception as e:
@@ -152,10 +179,64 @@ class SubmissionCreateView(generics.CreateAPIView):
         return Response({'message': 'Assignment submission feature coming soon'})
 
 class SessionChatView(generics.ListAPIView):
+    """Chat history of a session.
+    
+    Without parameters the recent messages come straight from Redis, oldest
+    first, with a ``next`` link to older pages read from the database newest
+    first. ``?since_seq=N`` returns the messages after sequence number N so a
+    reconnecting client only fetches what it missed.
+    """
+    serializer_class = ChatMessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ChatKeysetPagination
+    
+    def get_queryset(self):
+        return ChatMessage.objects.filter(
+            session_id=self.kwargs['session_id'],
+            is_private=False
+        ).select_related('sender')
     
     def list(self, request, session_id):
-        return Response({'message': 'Session chat feature coming soon'})
+        session = LiveSession.objects.filter(id=session_id).only('id', 'course_id', 'tutor_id').first()
+        if session is None:
+            return Response({'error': 'Session not found'}, status=404)
+        error = session_access_error(request.user, session)
+        if error:
+            return error
+        
+        if 'since_seq' in request.query_params:
+            try:
+                since_seq = int(request.query_params['since_seq'])
+            except ValueError:
+                return Response({'error': 'since_seq must be an integer'}, status=400)
+            return Response(self.messages_since(since_seq))
+        
+        if self.paginator.cursor_query_param not in request.query_params:
+            recent = recent_messages(session_id)
+            if recent:
+                return Response({
+                    'next': self.paginator.cursor_before(request, recent[0]['timestamp']),
+                    'previous': None,
+                    'results': recent
+                })
+        
+        return super().list(request)
+    
+    def messages_since(self, since_seq):
+        recent = recent_messages(self.kwargs['session_id'])
+        if recent and recent[0]['seq'] <= since_seq + 1:
+            return {'results': [message for message in recent if message['seq'] > since_seq], 'has_more': False}
+        
+        # The gap reaches past the recent list: read it from the database, then top up from
+        # Redis with messages the write-behind buffer has not saved yet
+        limit = self.paginator.max_page_size
+        rows = list(self.get_queryset().filter(seq__gt=since_seq).order_by('seq')[:limit + 1])
+        has_more = len(rows) > limit
+        results = self.get_serializer(rows[:limit], many=True).data
+        if not has_more:
+            last_seq = results[-1]['seq'] if results else since_seq
+            results += [message for message in recent if message['seq'] > last_seq]
+        return {'results': results, 'has_more': has_more}
 
 class SessionPollsView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -182,51 +263,28 @@ def join_session(request, pk):
         if not session.is_active:
             return Response({'error': 'Session is not active'}, status=400)
         
-        # Create or update attendance record
-        attendance, created = SessionAttendance.objects.get_or_create(
-            session=session,
-            student=user,
-            defaults={'joined_at': timezone.now()}
-        )
-        
-        if not created:
-            attendance.joined_at = timezone.now()
-            attendance.save()
+        # Attendance is written in bulk from presence; the live session socket keeps it fresh
+        record_presence(session.id, user.id)
         
         return Response({
             'message': 'Successfully joined session',
             'meeting_url': session.meeting_url,
             'session_title': session.title
         })
-        
+    
     except LiveSession.DoesNotExist:
         return Response({'error': 'Session not found'}, status=404)
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def leave_session(request, pk):
-    try:
-        session = LiveSession.objects.get(id=pk)
-        user = request.user
-        
-        # Update attendance record with leave time
-        try:
-            attendance = SessionAttendance.objects.get(session=session, student=user)
-            attendance.left_at = timezone.now()
-            
-            # Calculate session duration
-            if attendance.joined_at:
-                duration = timezone.now() - attendance.joined_at
-                attendance.duration_minutes = int(duration.total_seconds() / 60)
-            
-            attendance.save()
-            
-            return Response({'message': 'Successfully left session'})
-        except SessionAttendance.DoesNotExist:
-            return Response({'message': 'You were not in this session'})
-        
-    except LiveSession.DoesNotExist:
+    # Closed in bulk with other leaves by the flush_session_attendance task
+    if record_leave(pk, request.user.id):
+        return Response({'message': 'Successfully left session'})
+    
+    if not LiveSession.objects.filter(id=pk).exists():
         return Response({'error': 'Session not found'}, status=404)
+    return Response({'message': 'You were not in this session'})
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
@@ -239,15 +297,16 @@ def start_session(request, pk):
         if user.user_type != 'tutor' or session.tutor != user:
             return Response({'error': 'Only the session tutor can start the session'}, status=403)
         
-        session.is_active = True
+        session.status = 'live'
         session.started_at = timezone.now()
         session.save()
+        set_session_status(session.id, 'live')
         
         return Response({
             'message': 'Session started successfully',
             'meeting_url': session.meeting_url
         })
-        
+    
     except LiveSession.DoesNotExist:
         return Response({'error': 'Session not found'}, status=404)
 
@@ -262,23 +321,15 @@ def end_session(request, pk):
         if user.user_type != 'tutor' or session.tutor != user:
             return Response({'error': 'Only the session tutor can end the session'}, status=403)
         
-        session.is_active = False
+        session.status = 'ended'
         session.ended_at = timezone.now()
         session.save()
         
-        # Update all active attendances
-        active_attendances = SessionAttendance.objects.filter(
-            session=session, 
-            left_at__isnull=True
-        )
-        for attendance in active_attendances:
-            attendance.left_at = timezone.now()
-            if attendance.joined_at:
-                duration = timezone.now() - attendance.joined_at
-                attendance.duration_minutes = int(duration.total_seconds() / 60)
-            attendance.save()
+        # Everyone still present leaves when last seen; attendances without presence close now
+        end_session_attendance(session.id)
+        SessionAttendance.objects.filter(session=session).close(session.ended_at)
         
         return Response({'message': 'Session ended successfully'})
-        
+    
     except LiveSession.DoesNotExist:
         return Response({'error': 'Session not found'}, status=404)
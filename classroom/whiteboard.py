@@ -0,0 +1,247 @@
+"""
+Whiteboard update batching for the Channels consumers
+Coalesces pointer events per session and sends one compact frame per tick
+
+fastapi_service/whiteboard_batcher.py does the same for the FastAPI rooms.
+The two services are deployed separately and share no code, only the
+``whiteboards`` table, so the board rules (merge_update, clears and epochs)
+are kept alike in both files.
+"""
+import asyncio
+import logging
+import time
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import DataError, IntegrityError, transaction
+
+from .models import Whiteboard
+
+logger = logging.getLogger(__name__)
+
+
+def merge_update(previous, update):
+    """Merge an update into the previous state of the same element.
+
+    Later fields win, except stroke points which are appended.
+    """
+    if not previous:
+        return dict(update)
+
+    merged = {**previous, **update}
+    if isinstance(previous.get('points'), list) and isinstance(update.get('points'), list):
+        merged['points'] = previous['points'] + update['points']
+    return merged
+
+
+class WhiteboardBatcher:
+    """Per-process batcher for whiteboard groups.
+
+    Updates carrying an ``element_id`` are coalesced within a tick and folded
+    into the board's element state; ``action == "clear"`` resets the board.
+    Element state is periodically snapshotted into ``Whiteboard.content`` so
+    late joiners receive one snapshot instead of a replay.
+
+    Other processes may hold unsaved elements of the same board, so a clear
+    is saved on the tick it arrives and bumps ``Whiteboard.epoch``. Changes
+    are only merged into the epoch they were drawn on. Batches carry the
+    sender's epoch; a process that sees a newer one drops its unsaved
+    elements, as it does when a save finds the epoch has moved on.
+    """
+
+    def __init__(self):
+        self.tick = settings.WHITEBOARD_TICK_MS / 1000
+        self.snapshot_seconds = settings.WHITEBOARD_SNAPSHOT_SECONDS
+
+        self.pending = {}
+        self.pending_index = {}
+        self.elements = {}
+        self.dirty = {}
+        self.cleared = set()
+        self.epochs = {}
+        self.session_ids = {}
+        self.members = {}
+
+        self._task = None
+        self._last_snapshot = time.monotonic()
+
+    def join(self, group_name, session_id):
+        self.session_ids[group_name] = session_id
+        self.members[group_name] = self.members.get(group_name, 0) + 1
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    def leave(self, group_name):
+        self.members[group_name] = max(self.members.get(group_name, 1) - 1, 0)
+
+    def add(self, group_name, update):
+        """Queue a whiteboard update for the group's next batch"""
+        pending = self.pending.setdefault(group_name, [])
+        index = self.pending_index.setdefault(group_name, {})
+        elements = self.elements.setdefault(group_name, {})
+        dirty = self.dirty.setdefault(group_name, set())
+
+        if update.get('action') == 'clear':
+            pending.clear()
+            index.clear()
+            elements.clear()
+            dirty.clear()
+            self.cleared.add(group_name)
+            pending.append(dict(update))
+            return
+
+        element_id = update.get('element_id')
+        if element_id is None:
+            pending.append(update)
+            return
+
+        element_id = str(element_id)
+        position = index.get(element_id)
+        if position is None:
+            index[element_id] = len(pending)
+            pending.append(dict(update))
+        else:
+            pending[position] = merge_update(pending[position], update)
+
+        elements[element_id] = merge_update(elements.get(element_id), update)
+        dirty.add(element_id)
+
+    async def get_snapshot(self, group_name, session_id):
+        """Last persisted board overlaid with this process's unsaved changes"""
+        content = {}
+        if group_name not in self.cleared:
+            content, epoch = await self._load_snapshot(session_id)
+            self.observe_epoch(group_name, epoch)
+        content.update(self.elements.get(group_name, {}))
+        return content
+
+    def observe_epoch(self, group_name, epoch):
+        """Catch up with a clear saved elsewhere, dropping what was drawn before it"""
+        known = self.epochs.get(group_name)
+        if epoch is None or (known is not None and epoch <= known):
+            return
+        self.epochs[group_name] = epoch
+        # Unknown until now, or our own unsaved clear supersedes it: nothing here predates it
+        if known is None or group_name in self.cleared:
+            return
+        for state in (self.pending, self.pending_index, self.elements, self.dirty):
+            state.pop(group_name, None)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                await self.flush()
+                if time.monotonic() - self._last_snapshot >= self.snapshot_seconds:
+                    await self.persist_snapshots()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Whiteboard batch tick failed')
+
+            if not self.session_ids:
+                self._task = None
+                return
+
+    async def flush(self):
+        """Send one whiteboard_batch event per group with pending updates"""
+        channel_layer = get_channel_layer()
+        for group_name in [name for name, pending in self.pending.items() if pending]:
+            # Save a new clear before announcing it, so the batch carries its epoch
+            clearing = any(update.get('action') == 'clear' for update in self.pending[group_name])
+            if clearing and group_name in self.cleared:
+                await self._persist(group_name)
+            updates = self.pending.get(group_name)
+            if not updates:
+                continue
+            self.pending[group_name] = []
+            self.pending_index[group_name] = {}
+
+            await channel_layer.group_send(group_name, {
+                'type': 'whiteboard_batch',
+                'updates': updates,
+                'epoch': self.epochs.get(group_name),
+            })
+
+    async def persist_snapshots(self):
+        """Write changed elements into Whiteboard.content"""
+        self._last_snapshot = time.monotonic()
+
+        for group_name in list(self.session_ids):
+            if not await self._persist(group_name):
+                continue
+
+            # Forget boards this process no longer serves once they are persisted
+            if not self.members.get(group_name) and not self.pending.get(group_name):
+                self._drop_group(group_name)
+
+    async def _persist(self, group_name):
+        """Save the group's changed elements; False if the group is gone or must retry"""
+        if group_name not in self.session_ids:
+            return False
+        dirty = self.dirty.get(group_name, set())
+        cleared = group_name in self.cleared
+        if not (dirty or cleared):
+            return True
+
+        # Take ownership of the change set; updates arriving meanwhile start a new one
+        self.dirty[group_name] = set()
+        self.cleared.discard(group_name)
+
+        elements = self.elements.get(group_name, {})
+        changes = {element_id: elements[element_id] for element_id in dirty if element_id in elements}
+        try:
+            epoch, saved = await self._save_snapshot(
+                self.session_ids[group_name], changes, cleared, self.epochs.get(group_name)
+            )
+        except (DataError, IntegrityError):
+            # A deleted session never saves; retrying would hold the board forever
+            logger.exception('Dropping unsaveable whiteboard %s', group_name)
+            self._drop_group(group_name)
+            return False
+        except Exception:
+            logger.exception('Failed to persist whiteboard snapshot')
+            self.dirty.setdefault(group_name, set()).update(dirty)
+            if cleared:
+                self.cleared.add(group_name)
+            return False
+
+        if saved:
+            self.epochs[group_name] = epoch
+        else:
+            self.observe_epoch(group_name, epoch)
+        return True
+
+    def _drop_group(self, group_name):
+        for state in (
+            self.pending, self.pending_index, self.elements, self.dirty, self.epochs, self.session_ids, self.members
+        ):
+            state.pop(group_name, None)
+        self.cleared.discard(group_name)
+
+    @database_sync_to_async
+    def _load_snapshot(self, session_id):
+        board = Whiteboard.objects.filter(session_id=session_id).values_list('content', 'epoch').first()
+        if board is None:
+            return {}, 0
+        return dict(board[0] or {}), board[1]
+
+    @database_sync_to_async
+    def _save_snapshot(self, session_id, changes, cleared, epoch):
+        """Returns the board's epoch and whether the changes were saved"""
+        with transaction.atomic():
+            whiteboard, _ = Whiteboard.objects.select_for_update().get_or_create(session_id=session_id)
+            if cleared:
+                whiteboard.content = changes
+                whiteboard.epoch += 1
+            elif epoch is None or epoch == whiteboard.epoch:
+                whiteboard.content = {**whiteboard.content, **changes}
+            else:
+                # Cleared elsewhere since these changes were drawn
+                return whiteboard.epoch, False
+            whiteboard.save(update_fields=['content', 'epoch', 'updated_at'])
+            return whiteboard.epoch, True
+
+
+whiteboard_batcher = WhiteboardBatcher()
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Course, Lesson, Enrollment, LessonProgress, Review
+from .models import Category, Course, Lesson, Enrollment, LessonProgress, Review, VideoUpload
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -38,3 +38,9 @@ class ReviewAdmin(admin.ModelAdmin):
     list_display = ['course', 'student', 'rating', 'created_at']
     list_filter = ['rating', 'created_at', 'course__category']
     search_fields = ['course__title', 'student__email', 'comment']
+
+@admin.register(VideoUpload)
+class VideoUploadAdmin(admin.ModelAdmin):
+    list_display = ['filename', 'owner', 'target', 'course', 'offset', 'size', 'status', 'updated_at']
+    list_filter = ['status', 'target']
+    search_fields = ['filename', 'owner__email', 'course__title']
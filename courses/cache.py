@@ -0,0 +1,133 @@
+import hashlib
+import time
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from rest_framework.response import Response
+
+VERSION_KEY = 'catalog:version:{}'
+RESPONSE_KEY = 'catalog:response:{}'
+LOCK_TIMEOUT = 10
+LOCK_WAIT_SECONDS = 2.0
+LOCK_POLL_SECONDS = 0.05
+
+def get_versions(scopes):
+    """Current version of each invalidation scope, creating missing ones"""
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Seed from the clock so a version evicted from Redis never repeats
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+def bump_versions(*scopes):
+    """Invalidate every cached response that depends on any of the scopes"""
+    for scope in scopes:
+        key = VERSION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+
+def _response_key(request, scopes):
+    accepted_media_type = getattr(request, 'accepted_media_type', '')
+    query = sorted(request.query_params.lists())
+    raw = repr((
+        request.build_absolute_uri(request.path),
+        query,
+        accepted_media_type,
+        get_versions(scopes),
+    ))
+    return RESPONSE_KEY.format(hashlib.sha256(raw.encode()).hexdigest())
+
+def _render(request, response):
+    """Render a DRF response to bytes the same way finalize_response would"""
+    view = request.parser_context['view']
+    response.accepted_renderer = request.accepted_renderer
+    response.accepted_media_type = request.accepted_media_type
+    response.renderer_context = view.get_renderer_context()
+    response.render()
+    return (response.status_code, response['Content-Type'], response.content)
+
+def _to_response(entry):
+    status_code, content_type, content = entry
+    return HttpResponse(content, status=status_code, content_type=content_type)
+
+def cached_response(request, scopes, get_response):
+    """Serve a fully rendered response from the catalog cache.
+    
+    Entries are keyed by URL, query parameters, negotiated media type and the
+    current version of each scope, so bumping a version makes its entries
+    unreachable. Only one request rebuilds a missing entry; concurrent misses
+    wait briefly for it instead of all hitting the database.
+    """
+    key = _response_key(request, scopes)
+    entry = cache.get(key)
+    if entry is not None:
+        return _to_response(entry)
+    
+    lock_key = f'{key}:lock'
+    if not cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+        deadline = time.monotonic() + LOCK_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_SECONDS)
+            entry = cache.get(key)
+            if entry is not None:
+                return _to_response(entry)
+        # The rebuilding request is slow or died; answer without caching
+        return get_response()
+    
+    try:
+        response = get_response()
+        if not isinstance(response, Response) or response.status_code != 200:
+            return response
+        entry = _render(request, response)
+        cache.set(key, entry, timeout=settings.CATALOG_CACHE_TIMEOUT)
+        return _to_response(entry)
+    finally:
+        cache.delete(lock_key)
+
+def cache_catalog_response(get_scopes):
+    """Decorator for function-based catalog views; get_scopes(request, **kwargs) -> scopes"""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped(request, *args, **kwargs):
+            return cached_response(
+                request,
+                get_scopes(request, **kwargs),
+                lambda: view_func(request, *args, **kwargs)
+            )
+        return wrapped
+    return decorator
+
+class CatalogCacheMixin:
+    """Caches GET responses of public catalog views; see cached_response()"""
+    
+    def get_cache_scopes(self):
+        raise NotImplementedError
+    
+    def is_cacheable(self):
+        return True
+    
+    def get(self, request, *args, **kwargs):
+        if not self.is_cacheable():
+            return super().get(request, *args, **kwargs)
+        return cached_response(
+            request,
+            self.get_cache_scopes(),
+            lambda: super(CatalogCacheMixin, self).get(request, *args, **kwargs)
+        )
+
+def course_scopes(course_id=None, slug=None, category_id=None):
+    """Scopes to bump when a course, or anything shown with it, changes"""
+    scopes = ['courses']
+    if course_id is not None:
+        scopes.append(f'lessons:{course_id}')
+    if slug:
+        scopes.append(f'course:{slug}')
+    if category_id is not None:
+        scopes.append(f'category:{category_id}')
+    return scopes
@@ -0,0 +1,46 @@
+import re
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db.models import F, Q
+from rest_framework import filters
+
+SEARCH_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+def search_courses(queryset, query):
+    """Ranked full-text search over Course.search_vector.
+    
+    Every term matches as a prefix so results stay useful while the user is
+    still typing; titles that are trigram-similar to the query are included
+    as a fallback for typos. Both paths are served by GIN indexes.
+    """
+    terms = SEARCH_TERM_RE.findall(query)
+    if not terms:
+        return queryset
+    
+    search_query = SearchQuery(
+        ' & '.join(f'{term}:*' for term in terms),
+        search_type='raw',
+        config='english'
+    )
+    
+    return queryset.annotate(
+        rank=SearchRank(F('search_vector'), search_query),
+        similarity=TrigramSimilarity('title', query),
+    ).filter(
+        Q(search_vector=search_query) | Q(title__trigram_similar=query)
+    ).order_by('-rank', '-similarity', '-created_at')
+
+class CourseSearchFilter(filters.SearchFilter):
+    """SearchFilter backed by the course full-text index instead of ILIKE scans"""
+    
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        
+        results = search_courses(queryset, query)
+        
+        # An explicit ?ordering= takes precedence over relevance
+        ordering = request.query_params.get(filters.OrderingFilter.ordering_param)
+        if ordering:
+            results = results.order_by(*queryset.query.order_by)
+        return results
@@ -0,0 +1,220 @@
+"""
+Watch-time heartbeats
+Players report watched segments; they are buffered in a Redis stream and
+merged into LessonProgress.watch_time and LessonAnalytics.drop_off_points in
+bulk by the flush_lesson_heartbeats task.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from redis.exceptions import ResponseError
+from analytics.models import LessonAnalytics
+from tutoring_platform.redis_client import get_redis
+from .models import Enrollment, Lesson, LessonProgress
+
+logger = logging.getLogger(__name__)
+
+GROUP = 'heartbeat-flusher'
+CONSUMER = 'flusher'
+ENROLLMENT_CACHE_KEY = 'heartbeat:enrollment:{}:{}'
+ENROLLMENT_CACHE_SECONDS = 3600
+# Enrollments that still collect watch time
+COUNTED_STATUSES = ['active', 'completed']
+FLUSH_LOCK_KEY = 'heartbeat:flush:lock'
+MAX_BATCHES_PER_FLUSH = 20
+
+def get_enrollment_id(user, lesson_id):
+    """Enrollment the heartbeat counts towards, cached so heartbeats skip the database
+
+    Enrollment signals drop the cached ids when an enrollment changes, see forget_enrollment.
+    """
+    key = ENROLLMENT_CACHE_KEY.format(user.id, lesson_id)
+    enrollment_id = cache.get(key)
+    if enrollment_id is None:
+        enrollment_id = Enrollment.objects.filter(
+            student=user,
+            course__lessons=lesson_id,
+            status__in=COUNTED_STATUSES
+        ).values_list('id', flat=True).first()
+        if enrollment_id is None:
+            return None
+        cache.set(key, enrollment_id, timeout=ENROLLMENT_CACHE_SECONDS)
+    return enrollment_id
+
+def forget_enrollment(student_id, course_id):
+    """Drop the cached enrollment ids for a student's lessons in a course"""
+    lesson_ids = Lesson.objects.filter(course_id=course_id).values_list('id', flat=True)
+    cache.delete_many([ENROLLMENT_CACHE_KEY.format(student_id, lesson_id) for lesson_id in lesson_ids])
+
+def record_heartbeat(enrollment_id, lesson_id, start, end):
+    get_redis().xadd(
+        settings.LESSON_HEARTBEAT_STREAM,
+        {'e': enrollment_id, 'l': lesson_id, 's': start, 't': end},
+        maxlen=settings.LESSON_HEARTBEAT_STREAM_MAXLEN,
+        approximate=True
+    )
+
+def merge_intervals(intervals):
+    """Union of (start, end) intervals, sorted and non-overlapping"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def bucket_seconds(intervals, bucket_size):
+    """Watched seconds per fixed-size bucket of the video timeline"""
+    buckets = defaultdict(float)
+    for start, end in intervals:
+        bucket = int(start // bucket_size)
+        while bucket * bucket_size < end:
+            low = max(start, bucket * bucket_size)
+            high = min(end, (bucket + 1) * bucket_size)
+            buckets[bucket] += high - low
+            bucket += 1
+    return buckets
+
+def apply_heartbeats(entries):
+    """Merge stream entries and write them with one bulk_update per table"""
+    intervals = defaultdict(list)
+    for fields in entries:
+        key = (int(fields['e']), int(fields['l']))
+        intervals[key].append((float(fields['s']), float(fields['t'])))
+    
+    # Overlapping and retried heartbeats count once
+    merged = {key: merge_intervals(spans) for key, spans in intervals.items()}
+    
+    enrollment_ids = set(Enrollment.objects.filter(
+        id__in={enrollment_id for enrollment_id, _ in merged},
+        status__in=COUNTED_STATUSES
+    ).values_list('id', flat=True))
+    lesson_ids = set(Lesson.objects.filter(
+        id__in={lesson_id for _, lesson_id in merged}
+    ).values_list('id', flat=True))
+    # Heartbeats for rows deleted or dropped since they were recorded are dropped
+    merged = {
+        key: spans for key, spans in merged.items()
+        if key[0] in enrollment_ids and key[1] in lesson_ids
+    }
+    if not merged:
+        return
+    
+    with transaction.atomic():
+        _add_watch_time(merged)
+        _add_drop_off_points(merged)
+
+def _add_watch_time(merged):
+    def load():
+        rows = LessonProgress.objects.filter(
+            enrollment_id__in={enrollment_id for enrollment_id, _ in merged},
+            lesson_id__in={lesson_id for _, lesson_id in merged}
+        ).only('id', 'enrollment_id', 'lesson_id', 'watch_time')
+        return {(row.enrollment_id, row.lesson_id): row for row in rows}
+    
+    progress = load()
+    missing = [key for key in merged if key not in progress]
+    if missing:
+        LessonProgress.objects.bulk_create(
+            [LessonProgress(enrollment_id=enrollment_id, lesson_id=lesson_id) for enrollment_id, lesson_id in missing],
+            ignore_conflicts=True
+        )
+        progress = load()
+    
+    for key, spans in merged.items():
+        watched = sum(end - start for start, end in spans)
+        row = progress[key]
+        row.watch_time = (row.watch_time or timedelta()) + timedelta(seconds=watched)
+    
+    LessonProgress.objects.bulk_update(
+        [progress[key] for key in merged], ['watch_time'], batch_size=500
+    )
+
+def _add_drop_off_points(merged):
+    """drop_off_points[i] holds total seconds watched in the i-th LESSON_HEARTBEAT_BUCKET_SECONDS slice"""
+    bucket_size = settings.LESSON_HEARTBEAT_BUCKET_SECONDS
+    per_lesson = defaultdict(lambda: defaultdict(float))
+    for (_, lesson_id), spans in merged.items():
+        for bucket, seconds in bucket_seconds(spans, bucket_size).items():
+            per_lesson[lesson_id][bucket] += seconds
+    
+    def load():
+        rows = LessonAnalytics.objects.filter(lesson_id__in=per_lesson).only('id', 'lesson_id', 'drop_off_points')
+        return {row.lesson_id: row for row in rows}
+    
+    analytics = load()
+    missing = [lesson_id for lesson_id in per_lesson if lesson_id not in analytics]
+    if missing:
+        LessonAnalytics.objects.bulk_create(
+            [LessonAnalytics(lesson_id=lesson_id) for lesson_id in missing],
+            ignore_conflicts=True
+        )
+        analytics = load()
+    
+    for lesson_id, buckets in per_lesson.items():
+        row = analytics[lesson_id]
+        points = list(row.drop_off_points or [])
+        points.extend([0] * (max(buckets) + 1 - len(points)))
+        for bucket, seconds in buckets.items():
+            points[bucket] = round(points[bucket] + seconds, 1)
+        row.drop_off_points = points
+    
+    LessonAnalytics.objects.bulk_update(list(analytics.values()), ['drop_off_points'], batch_size=500)
+
+def _ensure_group(client):
+    try:
+        client.xgroup_create(settings.LESSON_HEARTBEAT_STREAM, GROUP, id='0', mkstream=True)
+    except ResponseError as e:
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+def flush_heartbeats():
+    """Drain buffered heartbeats into the database; returns the number of entries applied.
+    
+    Entries are read through a consumer group and acknowledged only after the
+    transaction commits, so a crashed flush is retried from its pending list.
+    """
+    if not cache.add(FLUSH_LOCK_KEY, 1, timeout=300):
+        return 0
+    
+    try:
+        client = get_redis()
+        _ensure_group(client)
+        stream = settings.LESSON_HEARTBEAT_STREAM
+        batch_size = settings.LESSON_HEARTBEAT_FLUSH_BATCH
+        
+        # Entries a previous run read but never acknowledged come first, then new ones.
+        # Everything read is merged together so segments split across reads count once.
+        entries = []
+        start_id = '0'
+        for _ in range(MAX_BATCHES_PER_FLUSH):
+            response = client.xreadgroup(GROUP, CONSUMER, {stream: start_id}, count=batch_size)
+            batch = response[0][1] if response else []
+            if batch:
+                entries.extend(batch)
+                if start_id != '>':
+                    start_id = batch[-1][0]
+            elif start_id == '>':
+                break
+            else:
+                start_id = '>'
+        
+        if not entries:
+            return 0
+        
+        apply_heartbeats([fields for _, fields in entries if fields])
+        
+        ids = [entry_id for entry_id, _ in entries]
+        for offset in range(0, len(ids), batch_size):
+            chunk = ids[offset:offset + batch_size]
+            client.xack(stream, GROUP, *chunk)
+            client.xdel(stream, *chunk)
+        
+        logger.info('Flushed %d lesson heartbeats', len(ids))
+        return len(ids)
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
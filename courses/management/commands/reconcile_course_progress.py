@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from courses.models import Course, Enrollment, Lesson, LessonProgress
+
+
+class Command(BaseCommand):
+    help = 'Repair drift in Course.lessons_count and Enrollment.completed_lessons/progress'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.dry_run = options['dry_run']
+
+        courses = self.reconcile_courses()
+        enrollments = self.reconcile_enrollments()
+
+        verb = 'Found' if self.dry_run else 'Repaired'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {courses} course(s) and {enrollments} enrollment(s) with drifted counters'
+        ))
+
+    def reconcile_courses(self):
+        lessons = (
+            Lesson.objects.filter(course=OuterRef('pk'))
+            .order_by().values('course').annotate(total=Count('pk')).values('total')
+        )
+        rows = (
+            Course.objects.annotate(actual=Coalesce(Subquery(lessons, output_field=IntegerField()), 0))
+            .values_list('pk', 'lessons_count', 'actual')
+        )
+
+        changed = [
+            Course(pk=pk, lessons_count=actual)
+            for pk, stored, actual in rows.iterator(chunk_size=self.batch_size)
+            if stored != actual
+        ]
+        if not self.dry_run:
+            Course.objects.bulk_update(changed, ['lessons_count'], batch_size=self.batch_size)
+        return len(changed)
+
+    def reconcile_enrollments(self):
+        completed = (
+            LessonProgress.objects.filter(enrollment=OuterRef('pk'), is_completed=True)
+            .order_by().values('enrollment').annotate(total=Count('pk')).values('total')
+        )
+        rows = (
+            Enrollment.objects.annotate(actual=Coalesce(Subquery(completed, output_field=IntegerField()), 0))
+            .values_list('pk', 'completed_lessons', 'progress', 'actual', 'course__lessons_count')
+        )
+
+        changed = []
+        for pk, stored, progress, actual, lessons_count in rows.iterator(chunk_size=self.batch_size):
+            expected_progress = Enrollment.progress_for(actual, lessons_count)
+            if stored != actual or progress != expected_progress:
+                changed.append(Enrollment(pk=pk, completed_lessons=actual, progress=expected_progress))
+
+        if not self.dry_run:
+            Enrollment.objects.bulk_update(changed, ['completed_lessons', 'progress'], batch_size=self.batch_size)
+        return len(changed)
@@ -0,0 +1,127 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.http import HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+
+COPY_BUFFER_SIZE = 1024 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+class PartFile(File):
+    """A finished part file; FileSystemStorage moves it into place instead of copying"""
+    
+    def temporary_file_path(self):
+        return self.file.name
+
+def create_part_file(upload):
+    os.makedirs(settings.VIDEO_UPLOAD_TEMP_DIR, exist_ok=True)
+    open(upload.part_path, 'wb').close()
+
+def write_chunk(upload, offset, stream, length):
+    """Stream length bytes from the request into the part file at offset; returns bytes written"""
+    written = 0
+    with open(upload.part_path, 'r+b') as part:
+        part.seek(offset)
+        while written < length:
+            data = stream.read(min(COPY_BUFFER_SIZE, length - written))
+            if not data:
+                break
+            part.write(data)
+            written += len(data)
+        # Drop bytes beyond this chunk left by an interrupted earlier attempt
+        part.truncate()
+    return written
+
+def remove_part_file(upload):
+    try:
+        os.remove(upload.part_path)
+    except FileNotFoundError:
+        pass
+
+def attach_upload(upload):
+    """Move the assembled file into storage and attach it to its lesson or course"""
+    instance = upload.lesson if upload.target == 'lesson_video' else upload.course
+    field_name = 'video_file' if upload.target == 'lesson_video' else 'preview_video'
+    field = instance._meta.get_field(field_name)
+    
+    with open(upload.part_path, 'rb') as part:
+        name = default_storage.save(field.generate_filename(instance, upload.filename), PartFile(part))
+    remove_part_file(upload)
+    
+    setattr(instance, field_name, name)
+    instance.save(update_fields=[field_name, 'updated_at'])
+    return instance
+
+def parse_range(header, size):
+    """Return (start, end) for a single bytes range, None for no range, or raise ValueError"""
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match or not any(match.groups()):
+        raise ValueError(header)
+    
+    start, end = match.groups()
+    if not start:
+        # Suffix range: the last N bytes
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as video:
+        video.seek(start)
+        remaining = length
+        while remaining > 0:
+            data = video.read(min(COPY_BUFFER_SIZE, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+def video_response(request, field_file):
+    """Serve a stored video with byte-range support.
+    
+    Behind nginx the response is an X-Accel-Redirect and nginx streams the
+    file (and handles Range itself); storages without local paths redirect
+    to the storage URL. Otherwise Django streams the requested range.
+    """
+    content_type = mimetypes.guess_type(field_file.name)[0] or 'application/octet-stream'
+    
+    if settings.VIDEO_ACCEL_REDIRECT_PREFIX:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.VIDEO_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + quote(field_file.name)
+        return response
+    
+    try:
+        path = field_file.path
+    except NotImplementedError:
+        return HttpResponseRedirect(field_file.url)
+    
+    size = os.path.getsize(path)
+    try:
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1 if size else 0
+    response = StreamingHttpResponse(
+        _read_range(path, start, length),
+        status=206 if byte_range else 200,
+        content_type=content_type
+    )
+    response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-17 17:24
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    Lesson = apps.get_model('courses', 'Lesson')
+    LessonProgress = apps.get_model('courses', 'LessonProgress')
+
+    lessons = (
+        Lesson.objects.filter(course=OuterRef('pk'))
+        .order_by().values('course').annotate(total=Count('pk')).values('total')
+    )
+    Course.objects.update(
+        lessons_count=Coalesce(Subquery(lessons, output_field=IntegerField()), 0)
+    )
+
+    completed = (
+        LessonProgress.objects.filter(enrollment=OuterRef('pk'), is_completed=True)
+        .order_by().values('enrollment').annotate(total=Count('pk')).values('total')
+    )
+    Enrollment.objects.update(
+        completed_lessons=Coalesce(Subquery(completed, output_field=IntegerField()), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0003_course_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrollment',
+            name='completed_lessons',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
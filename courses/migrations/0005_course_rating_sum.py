@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-17 17:25
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+
+BATCH_SIZE = 1000
+
+
+def average(rating_sum, count):
+    return Coalesce(
+        Round(Cast(rating_sum, DecimalField(max_digits=12, decimal_places=4)) / NullIf(count, 0), 2),
+        Value(Decimal('0.00')),
+        output_field=DecimalField(max_digits=3, decimal_places=2)
+    )
+
+
+def backfill_ratings(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Review = apps.get_model('courses', 'Review')
+    TutorProfile = apps.get_model('users', 'TutorProfile')
+
+    reviews = Review.objects.filter(course=OuterRef('pk')).order_by().values('course')
+    review_sum = Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total'), output_field=IntegerField()), 0)
+    review_count = Coalesce(Subquery(reviews.annotate(total=Count('pk')).values('total'), output_field=IntegerField()), 0)
+
+    # Batches of course ids keep each UPDATE short on large tables
+    course_ids = list(Course.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(course_ids), BATCH_SIZE):
+        batch = course_ids[start:start + BATCH_SIZE]
+        Course.objects.filter(pk__in=batch).update(rating_sum=review_sum, total_ratings=review_count)
+        Course.objects.filter(pk__in=batch).update(rating=average(models.F('rating_sum'), models.F('total_ratings')))
+
+    courses = Course.objects.filter(tutor=OuterRef('user')).order_by().values('tutor')
+    course_sum = Coalesce(Subquery(courses.annotate(total=Sum('rating_sum')).values('total'), output_field=IntegerField()), 0)
+    course_count = Coalesce(Subquery(courses.annotate(total=Sum('total_ratings')).values('total'), output_field=IntegerField()), 0)
+    TutorProfile.objects.update(rating_sum=course_sum, total_reviews=course_count)
+    TutorProfile.objects.update(rating=average(models.F('rating_sum'), models.F('total_reviews')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_enrollment_completed_lessons'),
+        ('users', '0002_tutorprofile_rating_sum'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,11 @@
+import os
+import uuid
+from decimal import Decimal
+from django.conf import settings
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models import BooleanField, Count, Exists, OuterRef, Q, Value
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 
@@ -17,6 +24,23 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+class CourseQuerySet(models.QuerySet):
+    def with_enrollment_count(self):
+        """Annotate active enrollment count in the same query"""
+        return self.annotate(
+            enrollment_count=Count('enrollments', filter=Q(enrollments__status='active'))
+        )
+    
+    def with_is_enrolled(self, user):
+        """Annotate whether user has an active enrollment in each course"""
+        if user is None or not user.is_authenticated:
+            return self.annotate(is_enrolled=Value(False, output_field=BooleanField()))
+        return self.annotate(
+            is_enrolled=Exists(
+                Enrollment.objects.filter(course=OuterRef('pk'), student=user, status='active')
+            )
+        )
+
 class Course(models.Model):
     DIFFICULTY_CHOICES = [
         ('beginner', 'Beginner'),
@@ -46,6 +70,7 @@ class Course(models.Model):
     
     difficulty = models.CharField(max_length=15, choices=DIFFICULTY_CHOICES)
     duration_weeks = models.PositiveIntegerField()
+    # Kept in step with Lesson rows by courses.signals
     lessons_count = models.PositiveIntegerField(default=0)
     
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft')
@@ -54,19 +79,41 @@ class Course(models.Model):
     requirements = models.JSONField(default=list)
     learning_outcomes = models.JSONField(default=list)
     
+    # rating = rating_sum / total_ratings, maintained incrementally by courses.signals
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)
+    rating_sum = models.PositiveIntegerField(default=0)
     total_ratings = models.PositiveIntegerField(default=0)
     
+    # Weighted title/short_description/description vector, maintained by a database trigger
+    search_vector = SearchVectorField(null=True, editable=False)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = CourseQuerySet.as_manager()
+    
     class Meta:
         db_table = 'courses'
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination: published catalog and tutor course lists
+            models.Index(fields=['status', 'created_at', 'id'], name='courses_status_created_idx'),
+            models.Index(fields=['tutor', 'created_at', 'id'], name='courses_tutor_created_idx'),
+            GinIndex(fields=['search_vector'], name='courses_search_vector_gin'),
+            GinIndex(fields=['title'], name='courses_title_trgm_gin', opclasses=['gin_trgm_ops']),
+        ]
     
     def __str__(self):
         return self.title
 
+class LessonQuerySet(models.QuerySet):
+    def syllabus(self):
+        """Only the columns a syllabus needs; content and materials are fetched per lesson"""
+        return self.only(
+            'id', 'course_id', 'title', 'lesson_type', 'video_file',
+            'video_duration', 'order', 'is_free_preview', 'updated_at'
+        )
+
 class Lesson(models.Model):
     LESSON_TYPE_CHOICES = [
         ('video', 'Video'),
@@ -92,6 +139,8 @@ class Lesson(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = LessonQuerySet.as_manager()
+    
     class Meta:
         db_table = 'lessons'
         ordering = ['order']
@@ -113,14 +162,70 @@ class Enrollment(models.Model):
     enrolled_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=15, choices=ENROLLMENT_STATUS_CHOICES, default='active')
     progress = models.DecimalField(max_digits=5, decimal_places=2, default=0.00)
+    # Denormalized count of completed LessonProgress rows; see reconcile_course_progress
+    completed_lessons = models.PositiveIntegerField(default=0)
     completed_at = models.DateTimeField(blank=True, null=True)
     
     class Meta:
         db_table = 'enrollments'
         unique_together = ['student', 'course']
+        indexes = [
+            models.Index(fields=['student', 'enrolled_at', 'id'], name='enrollments_student_idx'),
+        ]
     
     def __str__(self):
         return f"{self.student.email} - {self.course.title}"
+    
+    @staticmethod
+    def progress_for(completed_lessons, lessons_count):
+        """Percentage stored in progress for the given counters"""
+        if not lessons_count:
+            return Decimal('0.00')
+        percent = min(Decimal(completed_lessons) * 100 / lessons_count, Decimal(100))
+        return percent.quantize(Decimal('0.01'))
+
+class VideoUpload(models.Model):
+    """Resumable, chunked upload of a lesson video or course preview.
+    
+    Chunks are appended to a part file at ``offset`` (tus-style); the finished
+    file is moved into storage and attached to the lesson or course.
+    """
+    TARGET_CHOICES = [
+        ('lesson_video', 'Lesson Video'),
+        ('course_preview', 'Course Preview'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('uploading', 'Uploading'),
+        ('complete', 'Complete'),
+        ('aborted', 'Aborted'),
+    ]
+    
+    upload_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='video_uploads')
+    
+    target = models.CharField(max_length=20, choices=TARGET_CHOICES)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='video_uploads')
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, null=True, blank=True, related_name='video_uploads')
+    
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='uploading')
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'video_uploads'
+    
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+    
+    @property
+    def part_path(self):
+        return os.path.join(settings.VIDEO_UPLOAD_TEMP_DIR, f'{self.upload_id}.part')
 
 class LessonProgress(models.Model):
     enrollment = models.ForeignKey(Enrollment, on_delete=models.CASCADE, related_name='lesson_progress')
@@ -147,6 +252,9 @@ class Review(models.Model):
     class Meta:
         db_table = 'reviews'
         unique_together = ['course', 'student']
+        indexes = [
+            models.Index(fields=['course', 'created_at', 'id'], name='reviews_course_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.course.title} - {self.rating} stars"
@@ -1,6 +1,8 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from .models import Category, Course, Lesson, Enrollment, LessonProgress, Review
+from django.urls import reverse
+from .models import Category, Course, Lesson, Enrollment, LessonProgress, Review, VideoUpload
 
 User = get_user_model()
 
@@ -9,41 +11,63 @@ class CategorySerializer(serializers.ModelSerializer):
         model = Category
         fields = '__all__'
 
+def lesson_video_url(lesson, request=None):
+    """Access-checked video endpoint for a lesson, or None without a video"""
+    if not lesson.video_file:
+        return None
+    url = reverse('courses:lesson_video', kwargs={'lesson_id': lesson.id})
+    return request.build_absolute_uri(url) if request else url
+
 class LessonSerializer(serializers.ModelSerializer):
+    # The stored file is only reachable through the access-checked video endpoint
+    video_file = serializers.FileField(write_only=True, required=False)
+    video_url = serializers.SerializerMethodField()
+    
     class Meta:
         model = Lesson
         fields = '__all__'
+    
+    def get_video_url(self, obj):
+        return lesson_video_url(obj, self.context.get('request'))
+
+class LessonSyllabusSerializer(serializers.ModelSerializer):
+    """Syllabus entry; pair with Lesson.objects.syllabus()"""
+    video_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Lesson
+        fields = [
+            'id', 'course', 'title', 'lesson_type', 'video_duration',
+            'order', 'is_free_preview', 'video_url', 'updated_at'
+        ]
+    
+    def get_video_url(self, obj):
+        return lesson_video_url(obj, self.context.get('request'))
+
+class LessonBodySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Lesson
+        fields = ['id', 'description', 'content', 'materials', 'updated_at']
 
 class CourseDetailSerializer(serializers.ModelSerializer):
-    lessons = LessonSerializer(many=True, read_only=True)
+    lessons = LessonSyllabusSerializer(many=True, read_only=True)
     tutor_name = serializers.CharField(source='tutor.get_full_name', read_only=True)
     tutor_avatar = serializers.ImageField(source='tutor.avatar', read_only=True)
     category_name = serializers.CharField(source='category.name', read_only=True)
-    enrollment_count = serializers.SerializerMethodField()
-    is_enrolled = serializers.SerializerMethodField()
+    # Annotated by CourseQuerySet.with_enrollment_count() / with_is_enrolled()
+    enrollment_count = serializers.IntegerField(read_only=True)
+    is_enrolled = serializers.BooleanField(read_only=True)
     
     class Meta:
         model = Course
-        fields = '__all__'
-    
-    def get_enrollment_count(self, obj):
-        return obj.enrollments.filter(status='active').count()
-    
-    def get_is_enrolled(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return Enrollment.objects.filter(
-                student=request.user,
-                course=obj,
-                status='active'
-            ).exists()
-        return False
+        exclude = ['search_vector']
 
 class CourseListSerializer(serializers.ModelSerializer):
     tutor_name = serializers.CharField(source='tutor.get_full_name', read_only=True)
     tutor_avatar = serializers.ImageField(source='tutor.avatar', read_only=True)
     category_name = serializers.CharField(source='category.name', read_only=True)
-    enrollment_count = serializers.SerializerMethodField()
+    # Annotated by CourseQuerySet.with_enrollment_count()
+    enrollment_count = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Course
@@ -54,14 +78,11 @@ class CourseListSerializer(serializers.ModelSerializer):
             'tutor_name', 'tutor_avatar', 'category_name', 'enrollment_count',
             'created_at'
         ]
-    
-    def get_enrollment_count(self, obj):
-        return obj.enrollments.filter(status='active').count()
 
 class CourseCreateUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Course
-        exclude = ['tutor', 'rating', 'total_ratings']
+        exclude = ['tutor', 'rating', 'total_ratings', 'search_vector']
     
     def create(self, validated_data):
         validated_data['tutor'] = self.context['request'].user
@@ -96,4 +117,45 @@ class ReviewSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         validated_data['student'] = self.context['request'].user
-        return super().create(validated_data)
\ No newline at end of file
+        return super().create(validated_data)
+
+class VideoUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = VideoUpload
+        fields = [
+            'upload_id', 'target', 'course', 'lesson', 'filename',
+            'content_type', 'size', 'offset', 'status', 'created_at'
+        ]
+        read_only_fields = ['upload_id', 'offset', 'status', 'created_at']
+    
+    def validate(self, attrs):
+        course = attrs['course']
+        lesson = attrs.get('lesson')
+        
+        if course.tutor_id != self.context['request'].user.id:
+            raise serializers.ValidationError('You can only upload videos to your own courses')
+        if attrs['target'] == 'lesson_video' and (lesson is None or lesson.course_id != course.id):
+            raise serializers.ValidationError('Lesson videos need a lesson from this course')
+        if attrs['size'] > settings.VIDEO_UPLOAD_MAX_BYTES:
+            raise serializers.ValidationError(f'Videos are limited to {settings.VIDEO_UPLOAD_MAX_BYTES} bytes')
+        
+        content_type = attrs.get('content_type', '')
+        if content_type and not content_type.startswith('video/'):
+            raise serializers.ValidationError('Only video files can be uploaded')
+        return attrs
+
+
+class HeartbeatSerializer(serializers.Serializer):
+    """A watched segment of a lesson video, in seconds from the start"""
+    start = serializers.FloatField(min_value=0)
+    end = serializers.FloatField(min_value=0)
+    
+    def validate(self, attrs):
+        span = attrs['end'] - attrs['start']
+        if span <= 0:
+            raise serializers.ValidationError('end must be after start')
+        if span > settings.LESSON_HEARTBEAT_MAX_SPAN_SECONDS:
+            raise serializers.ValidationError(
+                f'Segments are limited to {settings.LESSON_HEARTBEAT_MAX_SPAN_SECONDS} seconds'
+            )
+        return attrs
@@ -0,0 +1,122 @@
+from django.db import transaction
+from decimal import Decimal
+from django.db.models import DecimalField, F, FloatField, Value
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .cache import bump_versions, course_scopes
+from .heartbeats import forget_enrollment
+from users.models import TutorProfile
+from .models import Category, Course, Enrollment, Lesson, LessonProgress, Review
+
+def bump_after_commit(scopes):
+    # Bumping before commit would let a concurrent miss re-cache the old rows
+    transaction.on_commit(lambda: bump_versions(*scopes))
+
+@receiver(pre_save, sender=Course)
+def remember_course_location(sender, instance, **kwargs):
+    """Keep the previous slug and category so their cached pages are dropped too"""
+    instance._previous_location = None
+    if instance.pk:
+        instance._previous_location = (
+            Course.objects.filter(pk=instance.pk).values_list('slug', 'category_id').first()
+        )
+
+@receiver([post_save, post_delete], sender=Course)
+def invalidate_course(sender, instance, **kwargs):
+    scopes = course_scopes(slug=instance.slug, category_id=instance.category_id)
+    previous = getattr(instance, '_previous_location', None)
+    if previous:
+        scopes += course_scopes(slug=previous[0], category_id=previous[1])
+    bump_after_commit(set(scopes))
+
+@receiver([post_save, post_delete], sender=Lesson)
+def invalidate_lesson(sender, instance, **kwargs):
+    course = Course.objects.filter(pk=instance.course_id).values_list('slug', 'category_id').first()
+    slug, category_id = course or (None, None)
+    bump_after_commit(course_scopes(course_id=instance.course_id, slug=slug, category_id=category_id))
+
+@receiver([post_save, post_delete], sender=Review)
+def invalidate_review(sender, instance, **kwargs):
+    course = Course.objects.filter(pk=instance.course_id).values_list('slug', 'category_id').first()
+    slug, category_id = course or (None, None)
+    bump_after_commit(course_scopes(slug=slug, category_id=category_id))
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category(sender, instance, **kwargs):
+    bump_after_commit(['categories', 'courses', f'category:{instance.pk}'])
+
+@receiver([post_save, post_delete], sender=Enrollment)
+def forget_cached_enrollment(sender, instance, created=False, **kwargs):
+    """Make heartbeats re-check an enrollment that was dropped or deleted"""
+    if not created:
+        transaction.on_commit(lambda: forget_enrollment(instance.student_id, instance.course_id))
+
+@receiver(post_save, sender=Lesson)
+def count_created_lesson(sender, instance, created, **kwargs):
+    if created:
+        Course.objects.filter(pk=instance.course_id).update(lessons_count=F('lessons_count') + 1)
+
+@receiver(post_delete, sender=Lesson)
+def count_deleted_lesson(sender, instance, **kwargs):
+    Course.objects.filter(pk=instance.course_id, lessons_count__gt=0).update(
+        lessons_count=F('lessons_count') - 1
+    )
+
+@receiver(post_delete, sender=LessonProgress)
+def count_deleted_progress(sender, instance, **kwargs):
+    if instance.is_completed:
+        Enrollment.objects.filter(pk=instance.enrollment_id, completed_lessons__gt=0).update(
+            completed_lessons=F('completed_lessons') - 1
+        )
+
+def rating_updates(sum_field, count_field, sum_delta, count_delta):
+    """UPDATE assignments applying a delta to a rating sum/count pair and its average.
+    
+    Every expression reads the row's pre-update values, so a single statement
+    is atomic under concurrent reviews.
+    """
+    rating_sum = F(sum_field) + sum_delta
+    count = F(count_field) + count_delta
+    # A float quotient divides fractionally everywhere (SQLite's CAST AS NUMERIC
+    # stays an integer); Round casts it back to numeric on PostgreSQL
+    average = Round(Cast(rating_sum, FloatField()) / NullIf(count, 0), 2)
+    return {
+        sum_field: rating_sum,
+        count_field: count,
+        'rating': Coalesce(average, Value(Decimal('0.00')), output_field=DecimalField(max_digits=3, decimal_places=2)),
+    }
+
+def apply_review_delta(course_id, sum_delta, count_delta):
+    """Fold one review change into its course and the course's tutor: two row updates"""
+    if not sum_delta and not count_delta:
+        return
+    Course.objects.filter(pk=course_id).update(
+        **rating_updates('rating_sum', 'total_ratings', sum_delta, count_delta)
+    )
+    TutorProfile.objects.filter(user__courses=course_id).update(
+        **rating_updates('rating_sum', 'total_reviews', sum_delta, count_delta)
+    )
+
+@receiver(pre_save, sender=Review)
+def remember_review_rating(sender, instance, **kwargs):
+    instance._previous_rating = None
+    if instance.pk:
+        instance._previous_rating = (
+            Review.objects.filter(pk=instance.pk).values_list('course_id', 'rating').first()
+        )
+
+@receiver(post_save, sender=Review)
+def aggregate_saved_review(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_rating', None)
+    if previous is None:
+        apply_review_delta(instance.course_id, instance.rating, 1)
+    elif previous[0] == instance.course_id:
+        apply_review_delta(instance.course_id, instance.rating - previous[1], 0)
+    else:
+        apply_review_delta(previous[0], -previous[1], -1)
+        apply_review_delta(instance.course_id, instance.rating, 1)
+
+@receiver(post_delete, sender=Review)
+def aggregate_deleted_review(sender, instance, **kwargs):
+    apply_review_delta(instance.course_id, -instance.rating, -1)
@@ -0,0 +1,8 @@
+from celery import shared_task
+from .heartbeats import flush_heartbeats
+
+
+@shared_task
+def flush_lesson_heartbeats():
+    """Merge buffered player heartbeats into LessonProgress and LessonAnalytics"""
+    return flush_heartbeats()
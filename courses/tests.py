@@ -1,3 +1,364 @@
-from django.test import TestCase
+import os
+import tempfile
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from tutoring_platform.pagination import KeysetPagination
+from users.models import TutorProfile, User
+from .heartbeats import get_enrollment_id
+from .media import create_part_file
+from .models import Category, Course, Enrollment, Lesson, LessonProgress, Review, VideoUpload
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def make_user(username, user_type='student'):
+    return User.objects.create_user(
+        username=username,
+        email=f'{username}@example.com',
+        password='password',
+        first_name=username,
+        last_name='Test',
+        user_type=user_type
+    )
+
+
+def make_course(tutor, index, **fields):
+    defaults = {
+        'title': f'Course {index}',
+        'slug': f'course-{index}',
+        'description': 'Description',
+        'short_description': 'Short description',
+        'difficulty': 'beginner',
+        'duration_weeks': 4,
+        'status': 'published',
+    }
+    defaults.update(fields)
+    return Course.objects.create(tutor=tutor, **defaults)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CourseListQueryCountTests(TestCase):
+    """Each list endpoint costs a fixed number of queries, however many courses it returns"""
+
+    COURSES = 8
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Programming', description='Code')
+        cls.tutor = make_user('tutor', 'tutor')
+        cls.students = [make_user(f'student{i}') for i in range(3)]
+        cls.courses = [
+            make_course(cls.tutor, i, category=cls.category, is_featured=i < 6)
+            for i in range(cls.COURSES)
+        ]
+        for course in cls.courses:
+            for lesson_order in range(3):
+                Lesson.objects.create(course=course, title=f'Lesson {lesson_order}', order=lesson_order)
+            for student in cls.students:
+                Enrollment.objects.create(student=student, course=course, status='active')
+        for student in cls.students:
+            Review.objects.create(course=cls.courses[0], student=student, rating=5, comment='Great')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def get(self, url, queries, **params):
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_course_list_cursor_mode(self):
+        data = self.get(reverse('courses:course_list'), 1)
+        self.assertEqual(len(data['results']), self.COURSES)
+        self.assertEqual(data['results'][0]['enrollment_count'], len(self.students))
+
+    def test_course_list_page_mode(self):
+        data = self.get(reverse('courses:course_list'), 2, page=1)
+        self.assertEqual(data['count'], self.COURSES)
+
+    @mock.patch.object(KeysetPagination, 'page_size', 3)
+    def test_course_list_next_page(self):
+        first = self.get(reverse('courses:course_list'), 1)
+        with self.assertNumQueries(1):
+            response = self.client.get(first['next'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_featured_courses(self):
+        data = self.get(reverse('courses:featured_courses'), 1)
+        self.assertEqual(len(data), 6)
+
+    def test_course_search_by_category(self):
+        data = self.get(reverse('courses:course_search'), 1, category='program')
+        self.assertEqual(len(data), self.COURSES)
+
+    @skipUnless(connection.vendor == 'postgresql', 'full-text search needs PostgreSQL')
+    def test_course_search_by_text(self):
+        self.get(reverse('courses:course_search'), 1, q='course')
+
+    def test_tutor_courses(self):
+        self.client.force_authenticate(self.tutor)
+        data = self.get(reverse('courses:tutor_courses'), 1)
+        self.assertEqual(len(data['results']), self.COURSES)
+
+    def test_course_detail_anonymous(self):
+        data = self.get(reverse('courses:course_detail', args=['course-0']), 2)
+        self.assertEqual(len(data['lessons']), 3)
+        self.assertFalse(data['is_enrolled'])
+
+    def test_course_detail_enrolled(self):
+        self.client.force_authenticate(self.students[0])
+        data = self.get(reverse('courses:course_detail', args=['course-0']), 2)
+        self.assertTrue(data['is_enrolled'])
+
+    def test_lessons(self):
+        data = self.get(reverse('courses:lesson_list', args=[self.courses[0].id]), 2)
+        self.assertEqual(data['count'], 3)
+
+    def test_categories(self):
+        data = self.get(reverse('courses:category_list'), 2)
+        self.assertEqual(data['count'], 1)
+
+    def test_student_enrollments(self):
+        self.client.force_authenticate(self.students[0])
+        data = self.get(reverse('courses:student_enrollments'), 1)
+        self.assertEqual(len(data['results']), self.COURSES)
+        self.assertEqual(data['results'][0]['student_name'], 'student0 Test')
+
+    def test_course_reviews(self):
+        data = self.get(reverse('courses:course_reviews', args=[self.courses[0].id]), 1)
+        self.assertEqual(len(data['results']), len(self.students))
+
+    def test_cached_repeat_request(self):
+        url = reverse('courses:course_list')
+        self.get(url, 1)
+        self.get(url, 0)
+        self.get(reverse('courses:featured_courses'), 1)
+        self.get(reverse('courses:featured_courses'), 0)
+
+    def test_cost_does_not_grow_with_courses(self):
+        for i in range(self.COURSES, self.COURSES * 2):
+            course = make_course(self.tutor, i, category=self.category, is_featured=True)
+            Enrollment.objects.create(student=self.students[0], course=course, status='active')
+        cache.clear()
+        data = self.get(reverse('courses:course_list'), 1)
+        self.assertEqual(len(data['results']), self.COURSES * 2)
+
+
+class ProgressCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tutor = make_user('tutor', 'tutor')
+        cls.student = make_user('student')
+        cls.course = make_course(cls.tutor, 0)
+        cls.lessons = [
+            Lesson.objects.create(course=cls.course, title=f'Lesson {i}', order=i) for i in range(4)
+        ]
+
+    def setUp(self):
+        self.enrollment = Enrollment.objects.create(student=self.student, course=self.course, status='active')
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def complete(self, lesson):
+        return self.client.post(reverse('courses:mark_lesson_complete', args=[lesson.id]))
+
+    def test_lessons_count_follows_lessons(self):
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.lessons_count, 4)
+        self.lessons[-1].delete()
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.lessons_count, 3)
+
+    def test_completion_updates_progress(self):
+        response = self.complete(self.lessons[0])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['course_progress'], 25)
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.completed_lessons, 1)
+
+    def test_repeat_completion_is_counted_once(self):
+        self.complete(self.lessons[0])
+        self.complete(self.lessons[0])
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.completed_lessons, 1)
+        self.assertEqual(self.enrollment.progress, 25)
+
+    def test_last_lesson_completes_enrollment(self):
+        for lesson in self.lessons:
+            self.complete(lesson)
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.progress, 100)
+        self.assertEqual(self.enrollment.status, 'completed')
+        self.assertIsNotNone(self.enrollment.completed_at)
+
+    def test_deleted_progress_is_uncounted(self):
+        self.complete(self.lessons[0])
+        LessonProgress.objects.get(enrollment=self.enrollment).delete()
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.completed_lessons, 0)
+
+    def test_reconcile_repairs_drift(self):
+        self.complete(self.lessons[0])
+        Course.objects.filter(pk=self.course.pk).update(lessons_count=9)
+        Enrollment.objects.filter(pk=self.enrollment.pk).update(completed_lessons=3, progress=75)
+        call_command('reconcile_course_progress', stdout=mock.Mock())
+        self.course.refresh_from_db()
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.course.lessons_count, 4)
+        self.assertEqual(self.enrollment.completed_lessons, 1)
+        self.assertEqual(self.enrollment.progress, 25)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class HeartbeatEnrollmentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = make_user('student')
+        cls.course = make_course(make_user('tutor', 'tutor'), 0)
+        cls.lesson = Lesson.objects.create(course=cls.course, title='Lesson', order=0)
+
+    def setUp(self):
+        cache.clear()
+        self.enrollment = Enrollment.objects.create(student=self.student, course=self.course, status='active')
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def test_unenrolled_student_is_not_counted(self):
+        self.assertEqual(get_enrollment_id(self.student, self.lesson.id), self.enrollment.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('courses:unenroll_course', args=[self.course.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(get_enrollment_id(self.student, self.lesson.id))
+
+    def test_deleted_enrollment_is_not_counted(self):
+        self.assertEqual(get_enrollment_id(self.student, self.lesson.id), self.enrollment.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.enrollment.delete()
+        self.assertIsNone(get_enrollment_id(self.student, self.lesson.id))
+
+
+class RatingCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tutor = make_user('tutor', 'tutor')
+        cls.profile = TutorProfile.objects.create(user=cls.tutor, title='Dr', qualifications='phd')
+        cls.courses = [make_course(cls.tutor, i) for i in range(2)]
+        cls.students = [make_user(f'student{i}') for i in range(2)]
+
+    def assertRating(self, obj, rating, count):
+        obj.refresh_from_db()
+        self.assertEqual(obj.rating, Decimal(rating))
+        total = obj.total_reviews if isinstance(obj, TutorProfile) else obj.total_ratings
+        self.assertEqual(total, count)
+
+    def review(self, student, course, rating):
+        return Review.objects.create(course=course, student=student, rating=rating, comment='')
+
+    def test_new_reviews_roll_up(self):
+        self.review(self.students[0], self.courses[0], 5)
+        self.review(self.students[1], self.courses[0], 4)
+        self.review(self.students[0], self.courses[1], 2)
+        self.assertRating(self.courses[0], '4.50', 2)
+        self.assertRating(self.courses[1], '2.00', 1)
+        self.assertRating(self.profile, '3.67', 3)
+
+    def test_edited_review_replaces_its_rating(self):
+        review = self.review(self.students[0], self.courses[0], 5)
+        review.rating = 3
+        review.save()
+        self.assertRating(self.courses[0], '3.00', 1)
+        self.assertRating(self.profile, '3.00', 1)
+
+    def test_moved_review_changes_course(self):
+        review = self.review(self.students[0], self.courses[0], 4)
+        review.course = self.courses[1]
+        review.save()
+        self.assertRating(self.courses[0], '0.00', 0)
+        self.assertRating(self.courses[1], '4.00', 1)
+        self.assertRating(self.profile, '4.00', 1)
+
+    def test_deleting_last_review_resets_rating(self):
+        review = self.review(self.students[0], self.courses[0], 4)
+        review.delete()
+        self.assertRating(self.courses[0], '0.00', 0)
+        self.assertRating(self.profile, '0.00', 0)
+
+
+class VideoUploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tutor = make_user('tutor', 'tutor')
+        cls.course = make_course(cls.tutor, 0)
+        cls.lesson = Lesson.objects.create(course=cls.course, title='Lesson', order=0)
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = override_settings(
+            MEDIA_ROOT=media_root.name,
+            VIDEO_UPLOAD_TEMP_DIR=os.path.join(media_root.name, 'upload_parts'),
+            VIDEO_UPLOAD_MAX_CHUNK_BYTES=1000
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.upload = VideoUpload.objects.create(
+            owner=self.tutor, target='lesson_video', course=self.course, lesson=self.lesson,
+            filename='intro.mp4', size=10
+        )
+        create_part_file(self.upload)
+        self.client = APIClient()
+        self.client.force_authenticate(self.tutor)
+        self.url = reverse('courses:video_upload', args=[self.upload.upload_id])
+
+    def patch(self, offset, data):
+        return self.client.generic(
+            'PATCH', self.url, data, content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset)
+        )
+
+    def read_part(self):
+        with open(self.upload.part_path, 'rb') as part:
+            return part.read()
+
+    def test_chunks_advance_offset(self):
+        response = self.patch(0, b'hello')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Upload-Offset'], '5')
+        self.assertEqual(self.read_part(), b'hello')
+
+    def test_offset_conflict_leaves_part_untouched(self):
+        self.patch(0, b'hello')
+        response = self.patch(0, b'HELLO')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['offset'], 5)
+        self.assertEqual(self.read_part(), b'hello')
+        self.upload.refresh_from_db()
+        self.assertEqual(self.upload.offset, 5)
+
+    def test_last_chunk_attaches_video(self):
+        self.patch(0, b'hello')
+        response = self.patch(5, b'world')
+        self.assertEqual(response.status_code, 200)
+        self.upload.refresh_from_db()
+        self.lesson.refresh_from_db()
+        self.assertEqual(self.upload.status, 'complete')
+        self.assertFalse(os.path.exists(self.upload.part_path))
+        with self.lesson.video_file.open('rb') as video:
+            self.assertEqual(video.read(), b'helloworld')
+
+    def test_aborted_upload_rejects_chunks(self):
+        self.client.delete(self.url)
+        response = self.patch(0, b'hello')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(os.path.exists(self.upload.part_path))
@@ -11,6 +11,8 @@ urlpatterns = [
     path('', views.CourseListView.as_view(), name='course_list'),
     path('featured/', views.featured_courses, name='featured_courses'),
     path('search/', views.course_search, name='course_search'),
+    path('uploads/', views.VideoUploadCreateView.as_view(), name='video_upload_create'),
+    path('uploads/<uuid:upload_id>/', views.VideoUploadView.as_view(), name='video_upload'),
     path('<slug:slug>/', views.CourseDetailView.as_view(), name='course_detail'),
     
     # Course management - Tutor endpoints
@@ -24,6 +26,8 @@ urlpatterns = [
     path('<int:course_id>/lessons/<int:pk>/', views.LessonDetailView.as_view(), name='lesson_detail'),
     path('<int:course_id>/lessons/create/', views.LessonCreateView.as_view(), name='lesson_create'),
     path('<int:course_id>/lessons/<int:pk>/update/', views.LessonUpdateView.as_view(), name='lesson_update'),
+    path('lessons/<int:lesson_id>/video/', views.lesson_video, name='lesson_video'),
+    path('lessons/<int:lesson_id>/body/', views.lesson_body, name='lesson_body'),
     
     # Student enrollment
     path('<int:course_id>/enroll/', views.enroll_course, name='enroll_course'),
@@ -32,6 +36,7 @@ urlpatterns = [
     
     # Progress tracking
     path('lessons/<int:lesson_id>/complete/', views.mark_lesson_complete, name='mark_lesson_complete'),
+    path('lessons/<int:lesson_id>/heartbeat/', views.lesson_heartbeat, name='lesson_heartbeat'),
     
     # Reviews
     path('<int:course_id>/reviews/', views.CourseReviewsView.as_view(), name='course_reviews'),
@@ -1,44 +1,84 @@
-from rest_framework import generics, status, permissions, filters
+from rest_framework import generics, status, permissions, filters, serializers
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, Avg
-from .models import Category, Course, Lesson, Enrollment, LessonProgress, Review
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Prefetch
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.http import parse_etags, quote_etag
+from tutoring_platform.pagination import EnrollmentKeysetPagination, KeysetPagination
+from .cache import CatalogCacheMixin, cache_catalog_response
+from .filters import CourseSearchFilter, search_courses
+from .heartbeats import get_enrollment_id, record_heartbeat
+from .media import attach_upload, create_part_file, remove_part_file, video_response, write_chunk
+from .models import Category, Course, Lesson, Enrollment, LessonProgress, Review, VideoUpload
 from .serializers import (
     CategorySerializer,
     CourseDetailSerializer,
     CourseListSerializer,
     CourseCreateUpdateSerializer,
     LessonSerializer,
+    LessonSyllabusSerializer,
+    LessonBodySerializer,
+    HeartbeatSerializer,
     EnrollmentSerializer,
     LessonProgressSerializer,
-    ReviewSerializer
+    ReviewSerializer,
+    VideoUploadSerializer
 )
 
-class CategoryListView(generics.ListAPIView):
+class CategoryListView(CatalogCacheMixin, generics.ListAPIView):
     queryset = Category.objects.filter(is_active=True)
     serializer_class = CategorySerializer
     permission_classes = [permissions.AllowAny]
+    
+    def get_cache_scopes(self):
+        return ['categories']
 
-class CourseListView(generics.ListAPIView):
+class CourseListView(CatalogCacheMixin, generics.ListAPIView):
     serializer_class = CourseListSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    # Search runs last so relevance ordering applies unless ?ordering= is given
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, CourseSearchFilter]
     filterset_fields = ['category', 'difficulty', 'is_featured']
     search_fields = ['title', 'description', 'short_description']
     ordering_fields = ['created_at', 'rating', 'price']
-    ordering = ['-created_at']
+    ordering = ['-created_at', '-id']
+    pagination_class = KeysetPagination
+    
+    def get_cache_scopes(self):
+        # A list filtered to one category only changes with that category's courses
+        category = self.request.query_params.get('category', '')
+        if category.isdigit():
+            return [f'category:{category}']
+        return ['courses']
     
     def get_queryset(self):
-        return Course.objects.filter(status='published').select_related('tutor', 'category')
+        return Course.objects.filter(status='published').select_related('tutor', 'category').with_enrollment_count()
 
-class CourseDetailView(generics.RetrieveAPIView):
+class CourseDetailView(CatalogCacheMixin, generics.RetrieveAPIView):
     serializer_class = CourseDetailSerializer
     permission_classes = [permissions.AllowAny]
     lookup_field = 'slug'
     
+    def is_cacheable(self):
+        # is_enrolled is per user, so only anonymous responses are shared
+        return not self.request.user.is_authenticated
+    
+    def get_cache_scopes(self):
+        return [f"course:{self.kwargs['slug']}"]
+    
     def get_queryset(self):
-        return Course.objects.filter(status='published').select_related('tutor', 'category').prefetch_related('lessons')
+        return (
+            Course.objects.filter(status='published')
+            .select_related('tutor', 'category')
+            .prefetch_related(Prefetch('lessons', queryset=Lesson.objects.syllabus()))
+            .with_enrollment_count()
+            .with_is_enrolled(self.request.user)
+        )
 
 class CourseCreateView(generics.CreateAPIView):
     serializer_class = CourseCreateUpdateSerializer
@@ -63,17 +103,21 @@ class CourseDeleteView(generics.DestroyAPIView):
 class TutorCoursesView(generics.ListAPIView):
     serializer_class = CourseListSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
-        return Course.objects.filter(tutor=self.request.user).select_related('category')
+        return Course.objects.filter(tutor=self.request.user).select_related('tutor', 'category').with_enrollment_count()
 
-class LessonListView(generics.ListAPIView):
-    serializer_class = LessonSerializer
+class LessonListView(CatalogCacheMixin, generics.ListAPIView):
+    serializer_class = LessonSyllabusSerializer
     permission_classes = [permissions.AllowAny]
     
+    def get_cache_scopes(self):
+        return [f"lessons:{self.kwargs['course_id']}"]
+    
     def get_queryset(self):
         course_id = self.kwargs.get('course_id')
-        return Lesson.objects.filter(course_id=course_id).order_by('order')
+        return Lesson.objects.filter(course_id=course_id).syllabus().order_by('order')
 
 class LessonDetailView(generics.RetrieveAPIView):
     serializer_class = LessonSerializer
@@ -100,6 +144,138 @@ class LessonUpdateView(generics.UpdateAPIView):
         course_id = self.kwargs.get('course_id')
         return Lesson.objects.filter(course_id=course_id, course__tutor=self.request.user)
 
+def lesson_access_error(user, lesson):
+    """Error response unless user may view the lesson; lesson must carry tutor_id"""
+    if lesson.is_free_preview or (user.is_authenticated and lesson.tutor_id == user.id):
+        return None
+    if not user.is_authenticated:
+        return Response({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
+    if not Enrollment.objects.filter(
+        student=user,
+        course_id=lesson.course_id,
+        status__in=['active', 'completed']
+    ).exists():
+        return Response({'error': 'You must be enrolled to view this lesson'}, status=status.HTTP_403_FORBIDDEN)
+    return None
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def lesson_video(request, lesson_id):
+    lesson = get_object_or_404(Lesson.objects.syllabus().annotate(tutor_id=F('course__tutor_id')), id=lesson_id)
+    if not lesson.video_file:
+        return Response({'error': 'Lesson has no video'}, status=status.HTTP_404_NOT_FOUND)
+    
+    error = lesson_access_error(request.user, lesson)
+    if error:
+        return error
+    
+    return video_response(request, lesson.video_file)
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def lesson_body(request, lesson_id):
+    """Lesson content and materials, revalidated with ETag/If-None-Match"""
+    lesson = get_object_or_404(Lesson.objects.syllabus().annotate(tutor_id=F('course__tutor_id')), id=lesson_id)
+    error = lesson_access_error(request.user, lesson)
+    if error:
+        return error
+    
+    etag = quote_etag(f'{lesson.id}-{lesson.updated_at.timestamp()}')
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    
+    # Unchanged lessons are answered before the body columns are read
+    if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+    if etag in if_none_match or '*' in if_none_match:
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    body = Lesson.objects.only('id', 'description', 'content', 'materials', 'updated_at').get(id=lesson.id)
+    return Response(LessonBodySerializer(body).data, headers=headers)
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def lesson_heartbeat(request, lesson_id):
+    """Buffer a watched segment; flush_lesson_heartbeats applies it to LessonProgress in bulk"""
+    serializer = HeartbeatSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    
+    enrollment_id = get_enrollment_id(request.user, lesson_id)
+    if enrollment_id is None:
+        return Response({'error': 'Lesson or enrollment not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    record_heartbeat(enrollment_id, lesson_id, serializer.validated_data['start'], serializer.validated_data['end'])
+    return Response(status=status.HTTP_202_ACCEPTED)
+
+class VideoUploadCreateView(generics.CreateAPIView):
+    """Start a resumable upload; chunks are then PATCHed to VideoUploadView"""
+    serializer_class = VideoUploadSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def perform_create(self, serializer):
+        upload = serializer.save(owner=self.request.user)
+        create_part_file(upload)
+
+class VideoUploadView(APIView):
+    """tus-style chunk endpoint.
+    
+    GET/HEAD report the current offset, PATCH appends a raw chunk at the
+    ``Upload-Offset`` header, DELETE aborts. The request body is streamed to
+    the part file, never loaded into memory.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_upload(self, upload_id, lock=False):
+        uploads = VideoUpload.objects.select_for_update() if lock else VideoUpload.objects
+        return get_object_or_404(uploads, upload_id=upload_id, owner=self.request.user)
+    
+    def offset_response(self, upload, status_code=status.HTTP_200_OK, data=None):
+        response = Response(data or VideoUploadSerializer(upload).data, status=status_code)
+        response['Upload-Offset'] = str(upload.offset)
+        response['Upload-Length'] = str(upload.size)
+        return response
+    
+    def get(self, request, upload_id):
+        return self.offset_response(self.get_upload(upload_id))
+    
+    def patch(self, request, upload_id):
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers.get('Content-Length') or 0)
+        except (KeyError, ValueError):
+            return Response({'error': 'Upload-Offset and Content-Length headers are required'}, status=status.HTTP_400_BAD_REQUEST)
+        if length > settings.VIDEO_UPLOAD_MAX_CHUNK_BYTES:
+            return Response({'error': f'Chunks are limited to {settings.VIDEO_UPLOAD_MAX_CHUNK_BYTES} bytes'}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        
+        # The row lock is held while the part file is written and truncated, so a
+        # concurrent PATCH or DELETE for the same upload waits and then sees the new offset
+        with transaction.atomic():
+            upload = self.get_upload(upload_id, lock=True)
+            if upload.status != 'uploading':
+                return Response({'error': f'Upload is {upload.status}'}, status=status.HTTP_409_CONFLICT)
+            if offset != upload.offset:
+                return self.offset_response(upload, status.HTTP_409_CONFLICT, {'error': 'Offset mismatch', 'offset': upload.offset})
+            if offset + length > upload.size:
+                return Response({'error': 'Chunk exceeds declared upload size'}, status=status.HTTP_400_BAD_REQUEST)
+            
+            if length:
+                upload.offset += write_chunk(upload, offset, request.stream, length)
+            update_fields = ['offset', 'updated_at']
+            if upload.offset == upload.size:
+                attach_upload(upload)
+                upload.status = 'complete'
+                update_fields.append('status')
+            upload.save(update_fields=update_fields)
+        
+        return self.offset_response(upload)
+    
+    def delete(self, request, upload_id):
+        with transaction.atomic():
+            upload = self.get_upload(upload_id, lock=True)
+            if upload.status == 'uploading':
+                remove_part_file(upload)
+                upload.status = 'aborted'
+                upload.save(update_fields=['status', 'updated_at'])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def enroll_course(request, course_id):
@@ -148,42 +324,44 @@ def unenroll_course(request, course_id):
 class StudentEnrollmentsView(generics.ListAPIView):
     serializer_class = EnrollmentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = EnrollmentKeysetPagination
     
     def get_queryset(self):
-        return Enrollment.objects.filter(student=self.request.user).select_related('course')
+        return Enrollment.objects.filter(student=self.request.user).select_related('course', 'student')
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def mark_lesson_complete(request, lesson_id):
     try:
-        lesson = Lesson.objects.get(id=lesson_id)
-        enrollment = Enrollment.objects.get(
-            student=request.user,
-            course=lesson.course,
-            status='active'
-        )
-        
-        progress, created = LessonProgress.objects.get_or_create(
-            enrollment=enrollment,
-            lesson=lesson,
-            defaults={'is_completed': True}
-        )
-        
-        if not created:
-            progress.is_completed = True
-            progress.save()
-        
-        # Update overall course progress
-        total_lessons = lesson.course.lessons.count()
-        completed_lessons = LessonProgress.objects.filter(
-            enrollment=enrollment,
-            is_completed=True
-        ).count()
-        
-        enrollment.progress = (completed_lessons / total_lessons) * 100 if total_lessons > 0 else 0
-        if enrollment.progress >= 100:
-            enrollment.status = 'completed'
-        enrollment.save()
+        with transaction.atomic():
+            lesson = Lesson.objects.select_related('course').get(id=lesson_id)
+            # Row lock serializes concurrent completions for the same enrollment
+            enrollment = Enrollment.objects.select_for_update().get(
+                student=request.user,
+                course_id=lesson.course_id,
+                status='active'
+            )
+            
+            now = timezone.now()
+            progress, created = LessonProgress.objects.get_or_create(
+                enrollment=enrollment,
+                lesson=lesson,
+                defaults={'is_completed': True, 'completed_at': now}
+            )
+            
+            newly_completed = created or LessonProgress.objects.filter(
+                pk=progress.pk,
+                is_completed=False
+            ).update(is_completed=True, completed_at=now) == 1
+            
+            # Counters replace COUNT queries: one LessonProgress and one Enrollment write per call
+            if newly_completed:
+                completed_lessons = enrollment.completed_lessons + 1
+                enrollment.progress = Enrollment.progress_for(completed_lessons, lesson.course.lessons_count)
+                updates = {'completed_lessons': F('completed_lessons') + 1, 'progress': enrollment.progress}
+                if enrollment.progress >= 100:
+                    updates.update(status='completed', completed_at=now)
+                Enrollment.objects.filter(pk=enrollment.pk).update(**updates)
         
         return Response({
             'message': 'Lesson marked as complete',
@@ -196,10 +374,11 @@ def mark_lesson_complete(request, lesson_id):
 class CourseReviewsView(generics.ListCreateAPIView):
     serializer_class = ReviewSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
         course_id = self.kwargs.get('course_id')
-        return Review.objects.filter(course_id=course_id).select_related('student').order_by('-created_at')
+        return Review.objects.filter(course_id=course_id).select_related('student')
     
     def perform_create(self, serializer):
         course_id = self.kwargs.get('course_id')
@@ -213,21 +392,17 @@ class CourseReviewsView(generics.ListCreateAPIView):
         ).exists():
             raise serializers.ValidationError('You must be enrolled to review this course')
         
-        review = serializer.save(course=course, student=self.request.user)
-        
-        # Update course rating
-        avg_rating = Review.objects.filter(course=course).aggregate(Avg('rating'))['rating__avg']
-        course.rating = round(avg_rating, 2) if avg_rating else 0
-        course.total_ratings = Review.objects.filter(course=course).count()
-        course.save()
+        # Course and tutor ratings are updated incrementally by courses.signals
+        serializer.save(course=course, student=self.request.user)
 
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
+@cache_catalog_response(lambda request: ['courses'])
 def featured_courses(request):
     courses = Course.objects.filter(
         status='published',
         is_featured=True
-    ).select_related('tutor', 'category')[:6]
+    ).select_related('tutor', 'category').with_enrollment_count()[:6]
     
     serializer = CourseListSerializer(courses, many=True, context={'request': request})
     return Response(serializer.data)
@@ -241,15 +416,11 @@ def course_search(request):
     courses = Course.objects.filter(status='published')
     
     if query:
-        courses = courses.filter(
-            Q(title__icontains=query) |
-            Q(description__icontains=query) |
-            Q(short_description__icontains=query)
-        )
+        courses = search_courses(courses, query)
     
     if category:
         courses = courses.filter(category__name__icontains=category)
     
-    courses = courses.select_related('tutor', 'category')[:20]
+    courses = courses.select_related('tutor', 'category').with_enrollment_count()[:20]
     serializer = CourseListSerializer(courses, many=True, context={'request': request})
     return Response(serializer.data)
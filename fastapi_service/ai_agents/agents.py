@@ -3,7 +3,8 @@ Individual AI Agents using LangGraph
 Each agent specializes in specific tutoring tasks
 """
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List
+import asyncio
+from typing import Dict, Any, List, AsyncIterator
 import json
 import structlog
 from langchain_openai import ChatOpenAI
@@ -16,8 +17,13 @@ logger = structlog.get_logger()
 class BaseAgent(ABC):
     """Base class for all AI agents"""
     
-    def __init__(self, llm: ChatOpenAI):
+    # Opt in to the orchestrator response cache for answers that don't depend on the user
+    cacheable = False
+    
+    def __init__(self, llm: ChatOpenAI, fast_llm: ChatOpenAI = None):
         self.llm = llm
+        # Cheaper model for classification-style steps; defaults to the main model
+        self.fast_llm = fast_llm or llm
         self.graph = None
         self.description = ""
         self.capabilities = []
@@ -31,12 +37,19 @@ class BaseAgent(ABC):
     async def process(self, state: AgentState) -> Dict[str, Any]:
         """Process request and return response"""
         pass
+    
+    async def stream(self, state: AgentState) -> AsyncIterator[Dict[str, Any]]:
+        """Stream response events; agents without token streaming emit a single done event"""
+        result = await self.process(state)
+        yield {"type": "done", "result": result}
 
 class PersonalTutorAgent(BaseAgent):
     """24/7 Personal AI Tutor Agent"""
     
-    def __init__(self, llm: ChatOpenAI):
-        super().__init__(llm)
+    cacheable = True
+    
+    def __init__(self, llm: ChatOpenAI, fast_llm: ChatOpenAI = None):
+        super().__init__(llm, fast_llm)
         self.description = "24/7 AI tutoring assistant for student support"
         self.capabilities = [
             "Answer questions about course material",
@@ -51,22 +64,31 @@ class PersonalTutorAgent(BaseAgent):
         graph = StateGraph(AgentState)
         
         # Define nodes
+        graph.add_node("prepare_request", self._prepare_request)
         graph.add_node("analyze_question", self._analyze_question)
         graph.add_node("retrieve_context", self._retrieve_context)
         graph.add_node("generate_response", self._generate_response)
         graph.add_node("validate_response", self._validate_response)
         
-        # Define edges
-        graph.set_entry_point("analyze_question")
-        graph.add_edge("analyze_question", "retrieve_context")
-        graph.add_edge("retrieve_context", "generate_response")
+        # Define edges - analysis and retrieval are independent, so fan out and join
+        graph.set_entry_point("prepare_request")
+        graph.add_edge("prepare_request", "analyze_question")
+        graph.add_edge("prepare_request", "retrieve_context")
+        graph.add_edge(["analyze_question", "retrieve_context"], "generate_response")
         graph.add_edge("generate_response", "validate_response")
         graph.add_edge("validate_response", END)
         
         self.graph = graph.compile()
     
-    async def _analyze_question(self, state: AgentState) -> AgentState:
-        """Analyze the student's question"""
+    async def _prepare_request(self, state: AgentState) -> Dict[str, Any]:
+        """Reset per-request bookkeeping before the parallel steps"""
+        return {"error_message": None, "retry_count": 0}
+    
+    async def _analyze_question(self, state: AgentState) -> Dict[str, Any]:
+        """Analyze the student's question
+        
+        Runs in parallel with retrieval, so it returns only the keys it updates.
+        """
         question = state["context"].get("message", "")
         
         analysis_prompt = f"""
@@ -82,37 +104,40 @@ class PersonalTutorAgent(BaseAgent):
         Return JSON format.
         """
         
-        response = await self.llm.ainvoke([SystemMessage(content=analysis_prompt)])
+        response = await self.fast_llm.ainvoke([SystemMessage(content=analysis_prompt)])
         
         try:
             analysis = json.loads(response.content)
-            state["analysis_results"] = analysis
         except:
-            state["analysis_results"] = {"type": "general", "difficulty": "intermediate"}
+            analysis = {"type": "general", "difficulty": "intermediate"}
         
-        return state
+        return {"analysis_results": analysis}
     
-    async def _retrieve_context(self, state: AgentState) -> AgentState:
-        """Retrieve relevant context for the question"""
+    async def _retrieve_context(self, state: AgentState) -> Dict[str, Any]:
+        """Retrieve relevant context for the question
+        
+        Runs in parallel with analysis, so it returns only the keys it updates.
+        """
         # In production, this would query vector database with course materials
         course_id = state.get("course_id")
         user_id = state.get("user_id")
         
         # Placeholder context retrieval
-        state["context"]["retrieved_materials"] = [
+        context = dict(state["context"])
+        context["retrieved_materials"] = [
             "Course lecture notes relevant to question",
             "Related practice problems",
             "Textbook references"
         ]
         
-        return state
+        return {"context": context}
     
-    async def _generate_response(self, state: AgentState) -> AgentState:
-        """Generate helpful response"""
+    def _build_tutor_prompt(self, state: AgentState) -> str:
+        """Build the generation prompt from question and analysis"""
         question = state["context"].get("message", "")
         analysis = state.get("analysis_results", {})
         
-        tutor_prompt = f"""
+        return f"""
         You are Naikoria AI, a helpful and encouraging personal tutor.
         
         Student Question: {question}
@@ -127,17 +152,22 @@ class PersonalTutorAgent(BaseAgent):
         
         Provide a helpful response that promotes learning.
         """
-        
-        response = await self.llm.ainvoke([SystemMessage(content=tutor_prompt)])
-        
-        state["generated_content"] = {
-            "answer": response.content,
+    
+    def _build_generated_content(self, answer: str) -> Dict[str, Any]:
+        return {
+            "answer": answer,
             "suggestions": [
                 "Try working through a similar example",
                 "Review the related course material",
                 "Break the problem into smaller steps"
             ]
         }
+    
+    async def _generate_response(self, state: AgentState) -> AgentState:
+        """Generate helpful response"""
+        response = await self.llm.ainvoke([SystemMessage(content=self._build_tutor_prompt(state))])
+        
+        state["generated_content"] = self._build_generated_content(response.content)
         
         return state
     
@@ -153,16 +183,39 @@ class PersonalTutorAgent(BaseAgent):
         
         return state
     
-    async def process(self, state: AgentState) -> Dict[str, Any]:
-        """Process student question"""
-        result = await self.graph.ainvoke(state)
-        
+    def _build_result(self, result: AgentState) -> Dict[str, Any]:
         return {
             "answer": result.get("generated_content", {}).get("answer", "I'm here to help! Could you please rephrase your question?"),
             "suggestions": result.get("generated_content", {}).get("suggestions", []),
             "confidence": result.get("confidence_score", 0.8),
             "agent_type": "personal_tutor"
         }
+    
+    async def process(self, state: AgentState) -> Dict[str, Any]:
+        """Process student question"""
+        result = await self.graph.ainvoke(state)
+        
+        return self._build_result(result)
+    
+    async def stream(self, state: AgentState) -> AsyncIterator[Dict[str, Any]]:
+        """Process student question, streaming the answer as it is generated"""
+        analysis, retrieved = await asyncio.gather(
+            self._analyze_question(state),
+            self._retrieve_context(state)
+        )
+        state.update(analysis)
+        state.update(retrieved)
+        
+        chunks = []
+        async for chunk in self.llm.astream([SystemMessage(content=self._build_tutor_prompt(state))]):
+            if chunk.content:
+                chunks.append(chunk.content)
+                yield {"type": "chunk", "content": chunk.content}
+        
+        state["generated_content"] = self._build_generated_content("".join(chunks))
+        state = await self._validate_response(state)
+        
+        yield {"type": "done", "result": self._build_result(state)}
 
 class ContentCuratorAgent(BaseAgent):
     """Content Curator Agent for generating educational content"""
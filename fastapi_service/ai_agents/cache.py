@@ -0,0 +1,100 @@
+"""
+Response cache for AI agents
+Serves repeat questions without another LLM round trip
+"""
+import hashlib
+import json
+import re
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+import structlog
+
+logger = structlog.get_logger()
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+class ResponseCache:
+    """Two-level (in-process LRU + Redis TTL) cache of agent responses"""
+    
+    def __init__(self, redis_client=None, ttl_seconds: int = 86400, max_local_entries: int = 1000):
+        self.redis = redis_client
+        self.ttl_seconds = ttl_seconds
+        self.max_local_entries = max_local_entries
+        self.local: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.metrics: Dict[str, Dict[str, int]] = {}
+    
+    @staticmethod
+    def normalize_message(message: str) -> str:
+        """Fold case, punctuation and whitespace so trivially different phrasings share a key"""
+        message = _PUNCTUATION.sub(" ", message.lower())
+        return _WHITESPACE.sub(" ", message).strip()
+    
+    def make_key(self, agent_type: str, data: Dict[str, Any]) -> Optional[str]:
+        """Build cache key from agent type, course and normalized message"""
+        message = self.normalize_message(str(data.get("message", "")))
+        if not message:
+            return None
+        
+        digest = hashlib.sha256(
+            f"{agent_type}:{data.get('course_id') or ''}:{message}".encode("utf-8")
+        ).hexdigest()
+        return f"ai_cache:{agent_type}:{digest}"
+    
+    def _record(self, agent_type: str, outcome: str):
+        counters = self.metrics.setdefault(agent_type, {"hits": 0, "misses": 0})
+        counters[outcome] += 1
+    
+    async def get(self, agent_type: str, key: str) -> Optional[Dict[str, Any]]:
+        """Look up a cached response, local first then Redis"""
+        if key in self.local:
+            self.local.move_to_end(key)
+            self._record(agent_type, "hits")
+            return self.local[key]
+        
+        if self.redis is not None:
+            try:
+                raw = await self.redis.get(key)
+            except Exception as e:
+                logger.error("Response cache read failed", error=str(e))
+                raw = None
+            
+            if raw:
+                result = json.loads(raw)
+                self._store_local(key, result)
+                self._record(agent_type, "hits")
+                return result
+        
+        self._record(agent_type, "misses")
+        return None
+    
+    async def set(self, key: str, result: Dict[str, Any]):
+        """Store response locally and in Redis with TTL"""
+        self._store_local(key, result)
+        
+        if self.redis is not None:
+            try:
+                await self.redis.set(key, json.dumps(result), ex=self.ttl_seconds)
+            except Exception as e:
+                logger.error("Response cache write failed", error=str(e))
+    
+    def _store_local(self, key: str, result: Dict[str, Any]):
+        self.local[key] = result
+        self.local.move_to_end(key)
+        while len(self.local) > self.max_local_entries:
+            self.local.popitem(last=False)
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Hit/miss counters per agent"""
+        metrics = {}
+        for agent_type, counters in self.metrics.items():
+            total = counters["hits"] + counters["misses"]
+            metrics[agent_type] = {
+                **counters,
+                "hit_rate": round(counters["hits"] / total, 3) if total else 0.0
+            }
+        
+        return {
+            "local_entries": len(self.local),
+            "agents": metrics
+        }
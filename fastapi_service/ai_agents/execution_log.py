@@ -0,0 +1,196 @@
+"""
+Bounded execution log for AI agents
+Keeps recent runs in memory and persists compact records to Postgres in batches
+"""
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+import asyncio
+import uuid
+import structlog
+from sqlalchemy import text
+from sqlalchemy.exc import DataError, IntegrityError
+
+from database import async_session
+
+logger = structlog.get_logger()
+
+INSERT_EXECUTIONS_SQL = text(
+    "INSERT INTO agent_executions "
+    "(execution_id, agent_type, user_id, course_id, success, cached, duration_ms, error, created_at) "
+    "VALUES (CAST(:execution_id AS uuid), :agent_type, :user_id, :course_id, :success, :cached, "
+    ":duration_ms, :error, :created_at)"
+)
+
+# Column limits of agent_executions: user_id is bigint, course_id and duration_ms integer
+BIGINT_MAX = 2 ** 63 - 1
+INTEGER_MAX = 2 ** 31 - 1
+
+# Errors caused by a row's values rather than the database being unreachable
+ROW_ERRORS = (DataError, IntegrityError)
+
+def _column_id(value: Any, maximum: int) -> Optional[int]:
+    """A client-supplied id as an int if it fits the column, else None"""
+    if not str(value).isdigit():
+        return None
+    value = int(value)
+    return value if 0 < value <= maximum else None
+
+class ExecutionLog:
+    """Ring buffer of compact execution records with running counters
+    
+    Records are queued for asynchronous batched inserts into agent_executions.
+    Only identifiers, outcome and timing are kept - never request or response
+    payloads - so memory stays bounded regardless of traffic.
+    
+    A batch that fails because the database is unreachable is retried whole
+    by the next flush. A batch the database rejects is retried row by row, and
+    a row rejected on ``max_attempts`` flushes is dropped.
+    """
+    
+    def __init__(
+        self,
+        max_records: int = 1000,
+        flush_interval_seconds: float = 2.0,
+        batch_size: int = 200,
+        max_pending: int = 10000,
+        max_attempts: int = 3
+    ):
+        self.recent = deque(maxlen=max_records)
+        self.flush_interval_seconds = flush_interval_seconds
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        
+        self.counters = {"total": 0, "successful": 0, "failed": 0, "cached": 0}
+        self.agent_counters: Dict[str, Dict[str, int]] = {}
+        
+        self._pending: List[Dict[str, Any]] = []
+        # Rejected inserts so far, by execution_id
+        self._attempts: Dict[str, int] = {}
+        self._flush_requested = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        """Start the background flusher"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Stop the flusher and write out remaining records"""
+        if self._task is not None:
+            # Let a flush in progress finish rather than cancelling it halfway
+            self._stopping = True
+            self._flush_requested.set()
+            await self._task
+            self._task = None
+            self._stopping = False
+        await self.flush()
+    
+    def record(
+        self,
+        agent_type: str,
+        data: Dict[str, Any],
+        success: bool,
+        duration_ms: int,
+        error: str = "",
+        cached: bool = False
+    ) -> str:
+        """Record an execution and return its execution_id"""
+        record = {
+            "execution_id": str(uuid.uuid4()),
+            "agent_type": agent_type[:50],
+            "user_id": _column_id(data.get("user_id"), BIGINT_MAX),
+            "course_id": _column_id(data.get("course_id"), INTEGER_MAX),
+            "success": success,
+            "cached": cached,
+            "duration_ms": min(max(duration_ms, 0), INTEGER_MAX),
+            "error": error[:500],
+            "created_at": datetime.now(timezone.utc)
+        }
+        
+        self.recent.append(record)
+        
+        agent_counters = self.agent_counters.setdefault(
+            agent_type, {"total": 0, "successful": 0, "failed": 0, "cached": 0}
+        )
+        for counters in (self.counters, agent_counters):
+            counters["total"] += 1
+            counters["successful" if success else "failed"] += 1
+            if cached:
+                counters["cached"] += 1
+        
+        self._pending.append(record)
+        if len(self._pending) > self.max_pending:
+            # Database is unreachable for too long; drop the oldest rather than grow
+            dropped = len(self._pending) - self.max_pending
+            del self._pending[:dropped]
+            logger.warning("Dropped unpersisted execution records", count=dropped)
+        if len(self._pending) >= self.batch_size:
+            self._flush_requested.set()
+        
+        return record["execution_id"]
+    
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+    
+    async def flush(self):
+        """Insert queued records in one batch"""
+        if not self._pending:
+            return
+        
+        batch, self._pending = self._pending, []
+        try:
+            rejected = {record["execution_id"] for record in await self._insert(batch)}
+        except asyncio.CancelledError:
+            # Stopped mid-flush: keep the batch for the final flush
+            self._pending = (batch + self._pending)[-self.max_pending:]
+            raise
+        except Exception as e:
+            logger.error("Failed to persist execution records", error=str(e), count=len(batch))
+            # Retry with the next flush, keeping the backlog bounded
+            self._pending = (batch + self._pending)[-self.max_pending:]
+            return
+        
+        retry = []
+        for record in batch:
+            execution_id = record["execution_id"]
+            if execution_id not in rejected:
+                self._attempts.pop(execution_id, None)
+                continue
+            attempts = self._attempts[execution_id] = self._attempts.get(execution_id, 0) + 1
+            if attempts < self.max_attempts:
+                retry.append(record)
+            else:
+                del self._attempts[execution_id]
+                logger.error("Dropping unsaveable execution record", execution_id=execution_id, attempts=attempts)
+        self._pending = (retry + self._pending)[-self.max_pending:]
+    
+    async def _insert(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Insert a batch, row by row if the database rejects it; returns the rejected rows"""
+        async with async_session() as session:
+            try:
+                await session.execute(INSERT_EXECUTIONS_SQL, batch)
+                await session.commit()
+                return []
+            except ROW_ERRORS as e:
+                await session.rollback()
+                logger.warning("Execution record batch rejected, inserting one by one", error=str(e), count=len(batch))
+            
+            rejected = []
+            for record in batch:
+                try:
+                    await session.execute(INSERT_EXECUTIONS_SQL, [record])
+                    await session.commit()
+                except ROW_ERRORS as e:
+                    await session.rollback()
+                    logger.warning("Execution record rejected", execution_id=record["execution_id"], error=str(e))
+                    rejected.append(record)
+            return rejected
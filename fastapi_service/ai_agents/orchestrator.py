@@ -2,8 +2,11 @@
 AI Agent Orchestrator for Naikoria Tech Academy
 Routes requests to appropriate LangGraph agents
 """
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, AsyncIterator
+import time
+import uuid
 import structlog
+from sqlalchemy import text
 from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import ToolExecutor
@@ -17,30 +20,47 @@ from .agents import (
     LectureTranscriptionAgent,
     DiscussionModeratorAgent
 )
+from .cache import ResponseCache
+from .execution_log import ExecutionLog
 from .state import AgentState
 from config import settings
+from database import async_session
 
 logger = structlog.get_logger()
 
 class AgentOrchestrator:
     """Orchestrates AI agents and routes requests"""
     
-    def __init__(self):
+    def __init__(self, redis_client=None):
         self.llm = ChatOpenAI(
-            model="gpt-4",
+            model=settings.ai_model,
             api_key=settings.openai_api_key,
             temperature=0.3
         )
+        self.fast_llm = ChatOpenAI(
+            model=settings.ai_fast_model,
+            api_key=settings.openai_api_key,
+            temperature=0
+        )
         
         self.agents = {}
-        self.execution_history = []
+        self.execution_log = ExecutionLog(
+            max_records=settings.ai_execution_log_size,
+            flush_interval_seconds=settings.ai_execution_flush_seconds
+        )
+        
+        self.response_cache = ResponseCache(
+            redis_client=redis_client,
+            ttl_seconds=settings.ai_cache_ttl_seconds,
+            max_local_entries=settings.ai_cache_max_local_entries
+        ) if settings.ai_cache_enabled else None
     
     async def initialize(self):
         """Initialize all AI agents"""
         try:
             # Initialize individual agents
             self.agents = {
-                'personal_tutor': PersonalTutorAgent(self.llm),
+                'personal_tutor': PersonalTutorAgent(self.llm, fast_llm=self.fast_llm),
                 'content_curator': ContentCuratorAgent(self.llm),
                 'analytics': LearningAnalyticsAgent(self.llm),
                 'assignment_grader': AssignmentGraderAgent(self.llm),
@@ -53,49 +73,96 @@ class AgentOrchestrator:
                 await agent.initialize()
                 logger.info(f"✅ {agent_name} agent initialized")
             
+            self.execution_log.start()
+            
             logger.info("🤖 All AI agents initialized successfully")
             
         except Exception as e:
             logger.error("Failed to initialize agents", error=str(e))
             raise
     
+    async def _get_cached(self, agent, agent_type: str, data: Dict[str, Any]):
+        """Return (cache_key, cached_result) for cacheable agents"""
+        if self.response_cache is None or not agent.cacheable:
+            return None, None
+        
+        cache_key = self.response_cache.make_key(agent_type, data)
+        if not cache_key:
+            return None, None
+        
+        cached = await self.response_cache.get(agent_type, cache_key)
+        if cached is not None:
+            logger.info(
+                "Agent request served from cache",
+                agent_type=agent_type,
+                user_id=data.get('user_id')
+            )
+        return cache_key, cached
+    
+    def _build_state(self, data: Dict[str, Any]) -> AgentState:
+        """Create initial agent state from request data"""
+        return AgentState(
+            messages=[HumanMessage(content=str(data))],
+            context=data,
+            user_id=data.get('user_id'),
+            course_id=data.get('course_id'),
+            session_data={}
+        )
+    
+    async def shutdown(self):
+        """Flush pending execution records"""
+        await self.execution_log.stop()
+    
+    def _record_execution(
+        self,
+        agent_type: str,
+        data: Dict[str, Any],
+        started_at: float,
+        success: bool,
+        error: str = "",
+        cached: bool = False
+    ) -> str:
+        """Record a compact execution entry and return its execution_id"""
+        return self.execution_log.record(
+            agent_type,
+            data,
+            success=success,
+            duration_ms=int((time.monotonic() - started_at) * 1000),
+            error=error,
+            cached=cached
+        )
+    
     async def route_request(self, agent_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
         """Route request to appropriate agent"""
+        started_at = time.monotonic()
         try:
             if agent_type not in self.agents:
                 raise ValueError(f"Unknown agent type: {agent_type}")
             
             agent = self.agents[agent_type]
             
-            # Create initial state
-            state = AgentState(
-                messages=[HumanMessage(content=str(data))],
-                context=data,
-                user_id=data.get('user_id'),
-                course_id=data.get('course_id'),
-                session_data={}
-            )
+            # Serve repeat questions from cache
+            cache_key, cached = await self._get_cached(agent, agent_type, data)
+            if cached is not None:
+                execution_id = self._record_execution(agent_type, data, started_at, success=True, cached=True)
+                return {**cached, 'execution_id': execution_id}
             
             # Process with agent
-            result = await agent.process(state)
-            
-            # Record execution
-            execution_record = {
-                'agent_type': agent_type,
-                'input_data': data,
-                'output_data': result,
-                'success': True,
-                'timestamp': None  # Will be set by database
-            }
-            self.execution_history.append(execution_record)
+            result = await agent.process(self._build_state(data))
+            
+            if cache_key:
+                await self.response_cache.set(cache_key, result)
+            
+            execution_id = self._record_execution(agent_type, data, started_at, success=True)
             
             logger.info(
                 "Agent request processed",
                 agent_type=agent_type,
+                execution_id=execution_id,
                 user_id=data.get('user_id')
             )
             
-            return result
+            return {**result, 'execution_id': execution_id}
             
         except Exception as e:
             logger.error(
@@ -105,15 +172,52 @@ class AgentOrchestrator:
                 user_id=data.get('user_id')
             )
             
-            # Record failed execution
-            execution_record = {
-                'agent_type': agent_type,
-                'input_data': data,
-                'output_data': {'error': str(e)},
-                'success': False,
-                'timestamp': None
-            }
-            self.execution_history.append(execution_record)
+            self._record_execution(agent_type, data, started_at, success=False, error=str(e))
+            
+            raise
+    
+    async def stream_request(self, agent_type: str, data: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """Route request to agent and stream its events
+        
+        Yields {"type": "chunk", "content": ...} events while the answer is
+        generated, followed by one {"type": "done", "result": ...} event.
+        """
+        started_at = time.monotonic()
+        try:
+            if agent_type not in self.agents:
+                raise ValueError(f"Unknown agent type: {agent_type}")
+            
+            agent = self.agents[agent_type]
+            
+            cache_key, cached = await self._get_cached(agent, agent_type, data)
+            if cached is not None:
+                execution_id = self._record_execution(agent_type, data, started_at, success=True, cached=True)
+                yield {"type": "done", "result": {**cached, 'execution_id': execution_id}}
+                return
+            
+            async for event in agent.stream(self._build_state(data)):
+                if event["type"] == "done":
+                    if cache_key:
+                        await self.response_cache.set(cache_key, event["result"])
+                    execution_id = self._record_execution(agent_type, data, started_at, success=True)
+                    event = {**event, "result": {**event["result"], 'execution_id': execution_id}}
+                yield event
+            
+            logger.info(
+                "Agent stream processed",
+                agent_type=agent_type,
+                user_id=data.get('user_id')
+            )
+            
+        except Exception as e:
+            logger.error(
+                "Agent stream failed",
+                agent_type=agent_type,
+                error=str(e),
+                user_id=data.get('user_id')
+            )
+            
+            self._record_execution(agent_type, data, started_at, success=False, error=str(e))
             
             raise
     
@@ -121,16 +225,19 @@ class AgentOrchestrator:
         """Get status of all agents"""
         status = {
             'agents': {},
-            'total_executions': len(self.execution_history),
-            'successful_executions': sum(1 for exec in self.execution_history if exec['success']),
-            'failed_executions': sum(1 for exec in self.execution_history if not exec['success'])
+            'total_executions': self.execution_log.counters['total'],
+            'successful_executions': self.execution_log.counters['successful'],
+            'failed_executions': self.execution_log.counters['failed'],
+            'executions_by_agent': self.execution_log.agent_counters,
+            'response_cache': self.response_cache.get_metrics() if self.response_cache else None
         }
         
         for agent_name, agent in self.agents.items():
             status['agents'][agent_name] = {
                 'status': 'active',
                 'description': agent.description,
-                'capabilities': agent.capabilities
+                'capabilities': agent.capabilities,
+                'cacheable': agent.cacheable
             }
         
         return status
@@ -143,20 +250,30 @@ class AgentOrchestrator:
         feedback: str,
         user_id: int
     ):
-        """Record feedback for agent performance"""
-        feedback_record = {
-            'agent_type': agent_type,
-            'execution_id': execution_id,
-            'rating': rating,
-            'feedback': feedback,
-            'user_id': user_id,
-            'timestamp': None
-        }
+        """Record feedback for agent performance against a stored execution"""
+        # Raises ValueError for anything that isn't an execution_id we handed out
+        execution_id = str(uuid.UUID(str(execution_id)))
+        
+        async with async_session() as session:
+            await session.execute(
+                text(
+                    "INSERT INTO agent_feedback (execution_id, agent_type, user_id, rating, feedback, created_at) "
+                    "VALUES (CAST(:execution_id AS uuid), :agent_type, :user_id, :rating, :feedback, now())"
+                ),
+                {
+                    'execution_id': execution_id,
+                    'agent_type': agent_type,
+                    'user_id': user_id,
+                    'rating': rating,
+                    'feedback': feedback
+                }
+            )
+            await session.commit()
         
-        # In production, save to database
         logger.info(
             "Agent feedback recorded",
             agent_type=agent_type,
+            execution_id=execution_id,
             rating=rating,
             user_id=user_id
         )
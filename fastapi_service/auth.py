@@ -5,7 +5,11 @@ JWT token verification with Django compatibility
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
+from typing import Dict, Optional, Tuple
 from config import settings
+import asyncio
+import json
+import time
 import httpx
 import structlog
 
@@ -42,27 +46,131 @@ async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(secur
             headers={"WWW-Authenticate": "Bearer"}
         )
 
-async def get_current_user(token_payload: dict = Depends(verify_token)):
+def decode_websocket_token(token: Optional[str]) -> Optional[dict]:
+    """Payload of a valid JWT passed to a WebSocket endpoint, or None"""
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+    except JWTError as e:
+        logger.warning("WebSocket JWT verification failed", error=str(e))
+        return None
+    return payload if payload.get("user_id") is not None else None
+
+# Process-wide pooled client for Django calls (keep-alive, HTTP/2)
+_http_client: Optional[httpx.AsyncClient] = None
+
+# Short-lived profile cache: in-process first, Redis shared across workers
+_profile_cache: Dict[str, Tuple[float, dict]] = {}
+_PROFILE_CACHE_MAX_ENTRIES = 10000
+_profile_redis = None
+
+# In-flight profile fetches, so concurrent requests for one user share a round trip
+_inflight_fetches: Dict[str, asyncio.Future] = {}
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared Django HTTP client, creating it on first use"""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            base_url=settings.django_service_url,
+            http2=settings.django_http2,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            timeout=10.0
+        )
+    return _http_client
+
+async def close_http_client():
+    """Close the shared Django HTTP client on shutdown"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+def configure_profile_cache(redis_client):
+    """Share profile cache entries across workers through Redis"""
+    global _profile_redis
+    _profile_redis = redis_client
+
+def _profile_cache_key(token_payload: dict) -> str:
+    return f"user_profile:{token_payload.get('user_id')}:{token_payload.get('jti', '')}"
+
+async def _get_cached_profile(cache_key: str) -> Optional[dict]:
+    cached = _profile_cache.get(cache_key)
+    if cached:
+        expires_at, profile = cached
+        if expires_at > time.monotonic():
+            return profile
+        del _profile_cache[cache_key]
+    
+    if _profile_redis is not None:
+        try:
+            raw = await _profile_redis.get(cache_key)
+        except Exception as e:
+            logger.error("Profile cache read failed", error=str(e))
+            raw = None
+        if raw:
+            profile = json.loads(raw)
+            _profile_cache[cache_key] = (time.monotonic() + settings.profile_cache_ttl_seconds, profile)
+            return profile
+    
+    return None
+
+async def _set_cached_profile(cache_key: str, profile: dict):
+    now = time.monotonic()
+    if len(_profile_cache) >= _PROFILE_CACHE_MAX_ENTRIES:
+        for key in [k for k, (expires_at, _) in _profile_cache.items() if expires_at <= now]:
+            del _profile_cache[key]
+        if len(_profile_cache) >= _PROFILE_CACHE_MAX_ENTRIES:
+            _profile_cache.clear()
+    _profile_cache[cache_key] = (now + settings.profile_cache_ttl_seconds, profile)
+    
+    if _profile_redis is not None:
+        try:
+            await _profile_redis.set(cache_key, json.dumps(profile), ex=settings.profile_cache_ttl_seconds)
+        except Exception as e:
+            logger.error("Profile cache write failed", error=str(e))
+
+async def _fetch_profile(cache_key: str, access_token: str) -> dict:
+    """Fetch user profile from Django and cache it"""
+    response = await get_http_client().get(
+        "/api/v1/users/profile/",
+        headers={"Authorization": f"Bearer {access_token}"}
+    )
+    
+    if response.status_code != 200:
+        logger.error("Failed to fetch user data", status_code=response.status_code)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate user"
+        )
+    
+    profile = response.json()
+    await _set_cached_profile(cache_key, profile)
+    return profile
+
+async def get_current_user(
+    token_payload: dict = Depends(verify_token),
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
     """Get current user information from Django service"""
+    cache_key = _profile_cache_key(token_payload)
+    
     try:
-        # Get user info from Django API
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{settings.django_service_url}/api/v1/users/profile/",
-                headers={"Authorization": f"Bearer {token_payload.get('access_token', '')}"},
-                timeout=10.0
-            )
-            
-            if response.status_code == 200:
-                user_data = response.json()
-                user_data.update(token_payload)  # Merge token data
-                return user_data
-            else:
-                logger.error("Failed to fetch user data", status_code=response.status_code)
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Could not validate user"
-                )
+        profile = await _get_cached_profile(cache_key)
+        
+        if profile is None:
+            # Coalesce concurrent lookups for the same user and token
+            future = _inflight_fetches.get(cache_key)
+            if future is None:
+                future = asyncio.ensure_future(_fetch_profile(cache_key, credentials.credentials))
+                _inflight_fetches[cache_key] = future
+                future.add_done_callback(lambda _: _inflight_fetches.pop(cache_key, None))
+            profile = await asyncio.shield(future)
+        
+        user_data = dict(profile)
+        user_data.update(token_payload)  # Merge token data
+        return user_data
                 
     except httpx.RequestError as e:
         logger.error("Django service communication failed", error=str(e))
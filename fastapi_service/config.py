@@ -1,6 +1,7 @@
 """
 Configuration for Naikoria AI Service
 """
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 from typing import List
 import os
@@ -16,6 +17,16 @@ class Settings(BaseSettings):
     # Redis
     redis_url: str = "redis://localhost:6379/0"
     
+    # WebSockets
+    ws_send_queue_size: int = 256
+    ws_send_timeout_seconds: float = 5.0
+    # A resume replays the whole gap into the send queue, so it may not exceed it
+    ws_replay_buffer_size: int = 200
+    ws_replay_ttl_seconds: int = 3600
+    whiteboard_tick_ms: int = 33
+    whiteboard_snapshot_seconds: float = 10.0
+    poll_broadcasts_per_second: float = 2.0
+    
     # CORS
     allowed_origins: List[str] = [
         "http://localhost:3000",
@@ -30,13 +41,33 @@ class Settings(BaseSettings):
     
     # AI Configuration
     openai_api_key: str = ""
+    ai_model: str = "gpt-4"
+    # Smaller model for cheap steps such as question analysis
+    ai_fast_model: str = "gpt-3.5-turbo"
+    
+    # AI response cache
+    ai_cache_enabled: bool = True
+    ai_cache_ttl_seconds: int = 86400
+    ai_cache_max_local_entries: int = 1000
+    
+    # AI execution log
+    ai_execution_log_size: int = 1000
+    ai_execution_flush_seconds: float = 2.0
     
     # Django Service Communication
     django_service_url: str = "http://localhost:8000"
+    django_http2: bool = True
+    profile_cache_ttl_seconds: int = 30
     
     # Logging
     log_level: str = "INFO"
     
+    @model_validator(mode="after")
+    def check_replay_fits_send_queue(self):
+        if self.ws_replay_buffer_size > self.ws_send_queue_size:
+            raise ValueError("ws_replay_buffer_size must not exceed ws_send_queue_size")
+        return self
+    
     class Config:
         env_file = "../.env"
         case_sensitive = False
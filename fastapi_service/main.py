@@ -3,23 +3,29 @@ Naikoria Tech Academy - FastAPI AI Service
 Real-time Features & AI Agents powered by LangGraph
 """
 import os
+import json
+import uuid
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import structlog
 import redis.asyncio as redis
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 
 # Import our modules
 from config import settings
-from auth import verify_token, get_current_user
+from auth import verify_token, get_current_user, configure_profile_cache, close_http_client, decode_websocket_token
 from ai_agents import AgentOrchestrator
 from websocket_manager import ConnectionManager
-from database import init_database
+from whiteboard_batcher import WhiteboardBatcher
+from poll_aggregator import PollAggregator
+from database import async_session, init_database
 
 # Configure structured logging
 structlog.configure(
@@ -44,7 +50,21 @@ logger = structlog.get_logger()
 # Global instances
 redis_client = None
 agent_orchestrator = None
-websocket_manager = ConnectionManager()
+websocket_manager = ConnectionManager(
+    send_queue_size=settings.ws_send_queue_size,
+    send_timeout=settings.ws_send_timeout_seconds,
+    replay_buffer_size=settings.ws_replay_buffer_size,
+    replay_ttl_seconds=settings.ws_replay_ttl_seconds
+)
+whiteboard_batcher = WhiteboardBatcher(
+    websocket_manager,
+    tick_ms=settings.whiteboard_tick_ms,
+    snapshot_seconds=settings.whiteboard_snapshot_seconds
+)
+poll_aggregator = PollAggregator(
+    websocket_manager,
+    broadcasts_per_second=settings.poll_broadcasts_per_second
+)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -56,9 +76,15 @@ async def lifespan(app: FastAPI):
     
     # Initialize Redis
     redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+    configure_profile_cache(redis_client)
+    
+    # Relay WebSocket room broadcasts between workers
+    await websocket_manager.start(redis_client)
+    await whiteboard_batcher.start(redis_client)
+    poll_aggregator.start(redis_client)
     
     # Initialize AI Agent Orchestrator
-    agent_orchestrator = AgentOrchestrator()
+    agent_orchestrator = AgentOrchestrator(redis_client=redis_client)
     await agent_orchestrator.initialize()
     
     # Initialize database
@@ -70,6 +96,10 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("🛑 Shutting down Naikoria AI Service...")
+    await agent_orchestrator.shutdown()
+    await whiteboard_batcher.stop()
+    await websocket_manager.stop()
+    await close_http_client()
     await redis_client.close()
     logger.info("✅ Shutdown complete")
 
@@ -144,7 +174,7 @@ async def health_check():
             "services": {
                 "redis": "connected",
                 "agents": "ready",
-                "websockets": f"{len(websocket_manager.active_connections)} connections"
+                "websockets": f"{await websocket_manager.total_connections()} connections"
             }
         }
     except Exception as e:
@@ -174,12 +204,51 @@ async def ai_tutor_chat(
             agent_type="personal_tutor",
             confidence=response.get("confidence"),
             suggestions=response.get("suggestions", []),
-            metadata=response.get("metadata", {})
+            metadata={**response.get("metadata", {}), "execution_id": response["execution_id"]}
         )
     except Exception as e:
         logger.error("AI tutor chat failed", error=str(e))
         raise HTTPException(status_code=500, detail="AI service error")
 
+@app.post("/ai/tutor/chat/stream")
+async def ai_tutor_chat_stream(
+    request: ChatRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """Personal AI Tutor - streams the answer as Server-Sent Events"""
+    async def event_stream():
+        try:
+            async for event in agent_orchestrator.stream_request(
+                agent_type="personal_tutor",
+                data={
+                    "message": request.message,
+                    "context": request.context,
+                    "user_id": request.user_id,
+                    "course_id": request.course_id
+                }
+            ):
+                if event["type"] == "chunk":
+                    yield f"event: chunk\ndata: {json.dumps({'content': event['content']})}\n\n"
+                else:
+                    result = event["result"]
+                    response = AgentResponse(
+                        response=result["answer"],
+                        agent_type="personal_tutor",
+                        confidence=result.get("confidence"),
+                        suggestions=result.get("suggestions", []),
+                        metadata={**result.get("metadata", {}), "execution_id": result["execution_id"]}
+                    )
+                    yield f"event: done\ndata: {response.model_dump_json()}\n\n"
+        except Exception as e:
+            logger.error("AI tutor chat stream failed", error=str(e))
+            yield f"event: error\ndata: {json.dumps({'detail': 'AI service error'})}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/ai/generate/quiz")
 async def generate_quiz(
     request: QuizGenerationRequest,
@@ -205,7 +274,8 @@ async def generate_quiz(
         return {
             "questions": response["questions"],
             "metadata": response.get("metadata", {}),
-            "agent_type": "content_curator"
+            "agent_type": "content_curator",
+            "execution_id": response["execution_id"]
         }
     except Exception as e:
         logger.error("Quiz generation failed", error=str(e))
@@ -231,7 +301,8 @@ async def analyze_assignment(
             "feedback": response["feedback"],
             "suggestions": response.get("suggestions", []),
             "rubric_breakdown": response.get("rubric_breakdown", {}),
-            "agent_type": "assignment_grader"
+            "agent_type": "assignment_grader",
+            "execution_id": response["execution_id"]
         }
     except Exception as e:
         logger.error("Assignment analysis failed", error=str(e))
@@ -239,13 +310,28 @@ async def analyze_assignment(
 
 # WebSocket endpoints for real-time features
 @app.websocket("/ws/chat/{room_id}")
-async def websocket_chat(websocket: WebSocket, room_id: str):
-    """Real-time chat for live sessions"""
-    await websocket_manager.connect(websocket, room_id)
+async def websocket_chat(websocket: WebSocket, room_id: str, last_seq: Optional[int] = None):
+    """Real-time chat for live sessions
+    
+    Reconnecting clients pass the last ``seq`` they received as ``last_seq``
+    and get only the messages they missed. Clients offering the ``msgpack``
+    subprotocol exchange MessagePack binary frames instead of JSON text.
+    """
+    async def resync():
+        # Too far behind to replay; the client reloads the history itself
+        return {"type": "resync_required"}
+    
     try:
+        await websocket_manager.connect(
+            websocket,
+            room_id,
+            last_seq=last_seq,
+            snapshot=resync if last_seq is not None else None
+        )
+        
         while True:
             # Receive message
-            data = await websocket.receive_json()
+            data = await websocket_manager.receive_message(websocket)
             
             # Process message through AI if needed
             if data.get("ai_assist"):
@@ -268,59 +354,142 @@ async def websocket_chat(websocket: WebSocket, room_id: str):
         websocket_manager.disconnect(websocket, room_id)
 
 @app.websocket("/ws/live-session/{session_id}")
-async def websocket_live_session(websocket: WebSocket, session_id: str):
-    """Real-time live session features"""
-    await websocket_manager.connect(websocket, f"session_{session_id}")
+async def websocket_live_session(
+    websocket: WebSocket,
+    session_id: str,
+    last_seq: Optional[int] = None,
+    token: Optional[str] = None
+):
+    """Real-time live session features
+    
+    Reconnecting clients pass the last ``seq`` they received as ``last_seq``
+    and get only the events they missed; when those are no longer buffered
+    they get a fresh snapshot instead. Clients offering the ``msgpack``
+    subprotocol exchange MessagePack binary frames instead of JSON text.
+    Voting in polls requires an access ``token``.
+    """
+    user = decode_websocket_token(token)
+    if not await live_session_exists(session_id):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    room_id = f"session_{session_id}"
+    
+    async def snapshot():
+        # Late joiners get the current board as one snapshot; events after its seq follow
+        return {
+            "type": "whiteboard_snapshot",
+            "content": await whiteboard_batcher.get_snapshot(room_id, session_id)
+        }
+    
     try:
+        await websocket_manager.connect(websocket, room_id, last_seq=last_seq, snapshot=snapshot)
+        
         while True:
-            data = await websocket.receive_json()
+            data = await websocket_manager.receive_message(websocket)
             
             # Handle different message types
             if data["type"] == "whiteboard_update":
-                await websocket_manager.broadcast_to_room(
-                    f"session_{session_id}", 
-                    data, 
-                    exclude_sender=websocket
-                )
+                # Coalesced and sent to the room as one whiteboard_batch frame per tick
+                whiteboard_batcher.add(room_id, session_id, data)
             elif data["type"] == "poll_response":
                 # Process poll response
-                await handle_poll_response(session_id, data)
+                await handle_poll_response(session_id, user, data, websocket)
             elif data["type"] == "question":
-                # Route to AI tutor for instant help
-                ai_response = await agent_orchestrator.route_request(
+                # Route to AI tutor for instant help, streaming chunks as they arrive
+                async for event in agent_orchestrator.stream_request(
                     agent_type="personal_tutor",
                     data={
                         "message": data["message"],
                         "session_id": session_id,
                         "user_id": data["user_id"]
                     }
-                )
-                await websocket.send_json({
-                    "type": "ai_response",
-                    "response": ai_response["answer"],
-                    "agent_type": "personal_tutor"
-                })
+                ):
+                    if event["type"] == "chunk":
+                        await websocket_manager.send_message({
+                            "type": "ai_response_chunk",
+                            "content": event["content"],
+                            "agent_type": "personal_tutor"
+                        }, websocket)
+                    else:
+                        await websocket_manager.send_message({
+                            "type": "ai_response",
+                            "response": event["result"]["answer"],
+                            "agent_type": "personal_tutor",
+                            "execution_id": event["result"]["execution_id"]
+                        }, websocket)
                 
     except Exception as e:
         logger.error("Live session WebSocket error", error=str(e), session_id=session_id)
     finally:
-        websocket_manager.disconnect(websocket, f"session_{session_id}")
+        websocket_manager.disconnect(websocket, room_id)
+
+async def live_session_exists(session_id: str) -> bool:
+    """Whether session_id is the id of an existing live session"""
+    try:
+        uuid.UUID(session_id)
+    except ValueError:
+        return False
+    async with async_session() as session:
+        result = await session.execute(
+            text("SELECT 1 FROM live_sessions WHERE id = CAST(:session_id AS uuid)"),
+            {"session_id": session_id}
+        )
+        return result.first() is not None
 
-async def handle_poll_response(session_id: str, data: Dict[str, Any]):
+async def handle_poll_response(session_id: str, user: Optional[dict], data: Dict[str, Any], websocket: WebSocket):
     """Handle poll responses in live sessions"""
-    # Store poll response in Redis
-    poll_key = f"poll:{session_id}:{data['poll_id']}"
-    await redis_client.hincrby(poll_key, data["selected_option"], 1)
+    if user is None:
+        await websocket_manager.send_json_to_websocket({
+            "type": "error",
+            "detail": "Authentication required to vote"
+        }, websocket)
+        return
     
-    # Get updated results
-    results = await redis_client.hgetall(poll_key)
+    # Counted atomically in Redis; results go out at most poll_broadcasts_per_second
+    try:
+        await poll_aggregator.record_vote(session_id, user["user_id"], data)
+    except (KeyError, TypeError, ValueError) as e:
+        await websocket_manager.send_json_to_websocket({
+            "type": "error",
+            "detail": str(e) if isinstance(e, ValueError) else "poll_id and selected_option are required"
+        }, websocket)
+
+async def tutor_owns_poll(session_id: str, poll_id: int, user_id: int) -> bool:
+    """Whether the poll belongs to the session and the session is hosted by user_id"""
+    try:
+        uuid.UUID(session_id)
+    except ValueError:
+        return False
+    async with async_session() as session:
+        result = await session.execute(
+            text(
+                "SELECT 1 FROM polls JOIN live_sessions ON live_sessions.id = polls.session_id "
+                "WHERE polls.id = :poll_id AND polls.session_id = CAST(:session_id AS uuid) "
+                "AND live_sessions.tutor_id = :user_id"
+            ),
+            {"poll_id": poll_id, "session_id": session_id, "user_id": user_id}
+        )
+        return result.first() is not None
+
+@app.post("/ai/live-sessions/{session_id}/polls/{poll_id}/close")
+async def close_poll(
+    session_id: str,
+    poll_id: int,
+    current_user: dict = Depends(get_current_user)
+):
+    """Close a live poll and persist its responses"""
+    if current_user.get("user_type") != "tutor":
+        raise HTTPException(status_code=403, detail="Only tutors can close polls")
+    if not await tutor_owns_poll(session_id, poll_id, current_user["user_id"]):
+        raise HTTPException(status_code=404, detail="Poll not found")
     
-    # Broadcast updated results
-    await websocket_manager.broadcast_to_room(f"session_{session_id}", {
-        "type": "poll_update",
-        "poll_id": data["poll_id"],
-        "results": results
-    })
+    try:
+        results = await poll_aggregator.close_poll(session_id, str(poll_id))
+        return {"poll_id": poll_id, "results": results}
+    except Exception as e:
+        logger.error("Poll close failed", error=str(e), poll_id=poll_id)
+        raise HTTPException(status_code=500, detail="Poll close error")
 
 # Agent status and management
 @app.get("/ai/agents/status")
@@ -347,6 +516,8 @@ async def submit_agent_feedback(
         )
         
         return {"message": "Feedback recorded successfully"}
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=400, detail="agent_type, a valid execution_id and rating are required")
     except Exception as e:
         logger.error("Feedback submission failed", error=str(e))
         raise HTTPException(status_code=500, detail="Feedback submission error")
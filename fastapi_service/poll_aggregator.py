@@ -0,0 +1,191 @@
+"""
+Live poll aggregation
+Atomic vote counting in Redis with throttled result broadcasts
+"""
+from typing import Dict, Any, List, Optional, Set, Tuple
+import asyncio
+import json
+import structlog
+from sqlalchemy import text
+
+from database import async_session
+
+logger = structlog.get_logger()
+
+# Records a respondent's vote once (matching PollResponse's (poll, respondent)
+# uniqueness) and increments the chosen options. Returns 1 if the vote counted,
+# 0 for a repeat vote and -1 once the poll is closed.
+#   KEYS: counts hash, responses hash, closed marker
+#   ARGV: respondent id, selected options JSON, key TTL, option...
+VOTE_SCRIPT = """
+if redis.call('EXISTS', KEYS[3]) == 1 then
+    return -1
+end
+local added = redis.call('HSETNX', KEYS[2], ARGV[1], ARGV[2])
+if added == 1 then
+    for i = 4, #ARGV do
+        redis.call('HINCRBY', KEYS[1], ARGV[i], 1)
+    end
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+    redis.call('EXPIRE', KEYS[2], ARGV[3])
+end
+return added
+"""
+
+class PollAggregator:
+    """Counts poll votes atomically and broadcasts results at a bounded rate
+    
+    The rate is shared by all workers: a broadcast first claims the poll's
+    throttle key in Redis, and a worker that loses waits for the key to
+    expire. Tallies are read when the broadcast goes out, so whichever
+    worker sends it includes every vote counted so far.
+    """
+    
+    def __init__(self, manager, broadcasts_per_second: float = 2.0, key_ttl_seconds: int = 86400):
+        self.manager = manager
+        self.min_interval_ms = max(int(1000 / broadcasts_per_second), 1)
+        self.key_ttl_seconds = key_ttl_seconds
+        self.redis = None
+        self._vote_script = None
+        
+        # Options of open polls and whether several may be chosen, loaded on first vote
+        self.polls: Dict[Tuple[str, str], Tuple[Set[str], bool]] = {}
+        
+        # Polls with a result broadcast waiting for the rate limit
+        self.scheduled: Dict[Tuple[str, str], asyncio.Task] = {}
+    
+    def start(self, redis_client):
+        self.redis = redis_client
+        self._vote_script = redis_client.register_script(VOTE_SCRIPT)
+    
+    @staticmethod
+    def _keys(session_id: str, poll_id: str) -> List[str]:
+        prefix = f"poll:{session_id}:{poll_id}"
+        return [prefix, f"{prefix}:responses", f"{prefix}:closed"]
+    
+    @staticmethod
+    def _throttle_key(session_id: str, poll_id: str) -> str:
+        return f"poll:{session_id}:{poll_id}:broadcast"
+    
+    async def _get_poll(self, session_id: str, poll_id: str) -> Optional[Tuple[Set[str], bool]]:
+        """Options of an active poll in the session and whether several may be chosen"""
+        key = (session_id, poll_id)
+        if key not in self.polls:
+            async with async_session() as session:
+                result = await session.execute(
+                    text(
+                        "SELECT options, is_multiple_choice FROM polls "
+                        "WHERE id = :poll_id AND session_id = CAST(:session_id AS uuid) AND is_active"
+                    ),
+                    {"poll_id": int(poll_id), "session_id": session_id}
+                )
+                row = result.first()
+            if row is None:
+                return None
+            self.polls[key] = ({str(option) for option in row[0]}, row[1])
+        return self.polls[key]
+    
+    async def record_vote(self, session_id: str, respondent_id: int, data: Dict[str, Any]) -> bool:
+        """Record a vote; returns False for duplicates and closed polls
+        
+        Raises ValueError for unknown polls and options, and for several
+        options on a single-choice poll.
+        """
+        poll_id = str(int(data["poll_id"]))
+        options = data.get("selected_options") or [data["selected_option"]]
+        # Choosing an option twice counts once
+        options = list(dict.fromkeys(str(option) for option in options))
+        
+        poll = await self._get_poll(session_id, poll_id)
+        if poll is None:
+            raise ValueError("Unknown or closed poll")
+        valid_options, multiple_choice = poll
+        if any(option not in valid_options for option in options):
+            raise ValueError("Unknown poll option")
+        if len(options) > 1 and not multiple_choice:
+            raise ValueError("Only one option may be chosen")
+        
+        added = await self._vote_script(
+            keys=self._keys(session_id, poll_id),
+            args=[respondent_id, json.dumps(options), self.key_ttl_seconds, *options]
+        )
+        
+        if added != 1:
+            return False
+        
+        key = (session_id, poll_id)
+        if key not in self.scheduled:
+            self.scheduled[key] = asyncio.create_task(self._broadcast_later(key))
+        return True
+    
+    async def _broadcast_later(self, key: Tuple[str, str]):
+        """Send the current tallies once the poll's rate limit allows"""
+        session_id, poll_id = key
+        counts_key, _, closed_key = self._keys(session_id, poll_id)
+        throttle_key = self._throttle_key(session_id, poll_id)
+        try:
+            while True:
+                # close_poll sends the final results, wherever it ran
+                if await self.redis.exists(closed_key):
+                    return
+                if await self.redis.set(throttle_key, 1, nx=True, px=self.min_interval_ms):
+                    break
+                # Another broadcast went out within the interval, possibly from another worker
+                wait_ms = await self.redis.pttl(throttle_key)
+                await asyncio.sleep(max(wait_ms, 1) / 1000)
+            
+            counts = {option: int(count) for option, count in (await self.redis.hgetall(counts_key)).items()}
+            await self.manager.broadcast_to_room(f"session_{session_id}", {
+                "type": "poll_update",
+                "poll_id": poll_id,
+                "results": counts
+            })
+        finally:
+            self.scheduled.pop(key, None)
+    
+    async def close_poll(self, session_id: str, poll_id: str) -> Dict[str, int]:
+        """Stop accepting votes and flush responses to Poll/PollResponse in bulk"""
+        counts_key, responses_key, closed_key = self._keys(session_id, poll_id)
+        
+        await self.redis.set(closed_key, 1, ex=self.key_ttl_seconds)
+        pending = self.scheduled.pop((session_id, poll_id), None)
+        if pending:
+            pending.cancel()
+        
+        counts = {option: int(count) for option, count in (await self.redis.hgetall(counts_key)).items()}
+        responses = await self.redis.hgetall(responses_key)
+        
+        async with async_session() as session:
+            if responses:
+                await session.execute(
+                    text(
+                        "INSERT INTO poll_responses (poll_id, respondent_id, selected_options, responded_at) "
+                        "VALUES (:poll_id, :respondent_id, CAST(:selected_options AS jsonb), now()) "
+                        "ON CONFLICT (poll_id, respondent_id) DO NOTHING"
+                    ),
+                    [
+                        {
+                            "poll_id": int(poll_id),
+                            "respondent_id": int(respondent_id),
+                            "selected_options": selected_options
+                        }
+                        for respondent_id, selected_options in responses.items()
+                    ]
+                )
+            await session.execute(
+                text("UPDATE polls SET is_active = false WHERE id = :poll_id AND session_id = CAST(:session_id AS uuid)"),
+                {"poll_id": int(poll_id), "session_id": session_id}
+            )
+            await session.commit()
+        
+        await self.redis.delete(counts_key, responses_key, self._throttle_key(session_id, poll_id))
+        self.polls.pop((session_id, poll_id), None)
+        
+        await self.manager.broadcast_to_room(f"session_{session_id}", {
+            "type": "poll_closed",
+            "poll_id": poll_id,
+            "results": counts
+        })
+        
+        logger.info("Poll closed", session_id=session_id, poll_id=poll_id, responses=len(responses))
+        return counts
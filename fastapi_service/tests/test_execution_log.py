@@ -0,0 +1,129 @@
+"""
+Tests for batching and persistence of the AI execution log
+
+    cd fastapi_service && python -m unittest discover tests
+"""
+import asyncio
+import unittest
+from unittest import mock
+
+from sqlalchemy.exc import DataError, OperationalError
+
+from ai_agents import execution_log
+from ai_agents.execution_log import ExecutionLog
+
+
+class FakeDatabase:
+    """Stands in for async_session; rows whose agent_type is "poison" are rejected"""
+
+    def __init__(self):
+        self.rows = []
+        self.statements = 0
+        self.down = False
+        self.slow = None
+
+    def __call__(self):
+        return FakeSession(self)
+
+
+class FakeSession:
+    def __init__(self, database):
+        self.database = database
+        self.staged = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def execute(self, statement, rows):
+        if self.database.slow is not None:
+            await self.database.slow.wait()
+        if self.database.down:
+            raise OperationalError("INSERT", {}, ConnectionError("connection refused"))
+        self.database.statements += 1
+        if any(row["agent_type"] == "poison" for row in rows):
+            raise DataError("INSERT", {}, ValueError("value out of range"))
+        self.staged.extend(rows)
+
+    async def commit(self):
+        self.database.rows.extend(self.staged)
+        self.staged = []
+
+    async def rollback(self):
+        self.staged = []
+
+
+class ExecutionLogTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.database = FakeDatabase()
+        patcher = mock.patch.object(execution_log, "async_session", self.database)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.log = ExecutionLog(max_attempts=2)
+
+    def record(self, agent_type="personal_tutor", **data):
+        return self.log.record(agent_type, data, success=True, duration_ms=12)
+
+    def saved(self):
+        return [row["agent_type"] for row in self.database.rows]
+
+    async def test_records_are_inserted_in_one_batch(self):
+        for _ in range(3):
+            self.record()
+        await self.log.flush()
+        self.assertEqual(self.database.statements, 1)
+        self.assertEqual(len(self.database.rows), 3)
+        self.assertEqual(self.log._pending, [])
+
+    async def test_batch_is_kept_while_database_is_down(self):
+        self.record()
+        self.record()
+        self.database.down = True
+        for _ in range(5):
+            await self.log.flush()
+        self.assertEqual(len(self.log._pending), 2)
+
+        self.database.down = False
+        await self.log.flush()
+        self.assertEqual(len(self.database.rows), 2)
+
+    async def test_poison_row_is_dropped_after_max_attempts(self):
+        self.record("poison")
+        self.record("grader")
+        await self.log.flush()
+        self.assertEqual(self.saved(), ["grader"])
+        self.assertEqual([row["agent_type"] for row in self.log._pending], ["poison"])
+
+        self.record("curator")
+        await self.log.flush()
+        self.assertEqual(self.saved(), ["grader", "curator"])
+        self.assertEqual(self.log._pending, [])
+        self.assertEqual(self.log._attempts, {})
+
+    async def test_out_of_range_ids_are_dropped(self):
+        self.record(user_id="99999999999999999999", course_id=str(2 ** 31))
+        self.record(user_id="42", course_id=7)
+        await self.log.flush()
+        self.assertEqual(
+            [(row["user_id"], row["course_id"]) for row in self.database.rows],
+            [(None, None), (42, 7)]
+        )
+
+    async def test_stop_lets_a_running_flush_finish(self):
+        self.log.flush_interval_seconds = 0.01
+        self.log.start()
+        self.database.slow = asyncio.Event()
+        self.record()
+        await asyncio.sleep(0.05)
+
+        stopping = asyncio.create_task(self.log.stop())
+        await asyncio.sleep(0.01)
+        self.database.slow.set()
+        await stopping
+        self.assertEqual(len(self.database.rows), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+"""
+Tests for poll result broadcasts shared between workers
+
+    cd fastapi_service && python -m unittest discover tests
+"""
+import asyncio
+import unittest
+from unittest import mock
+
+import poll_aggregator
+from poll_aggregator import PollAggregator
+
+try:
+    import fakeredis
+except ImportError:  # Redis-backed tests need fakeredis (and lupa for scripts)
+    fakeredis = None
+
+
+class FakeManager:
+    def __init__(self):
+        self.frames = []
+
+    async def broadcast_to_room(self, room_id, data):
+        self.frames.append(data)
+
+
+class FakeSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def execute(self, statement, params=None):
+        pass
+
+    async def commit(self):
+        pass
+
+
+@unittest.skipUnless(fakeredis, "fakeredis is not installed")
+class PollAggregatorTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        server = fakeredis.FakeServer()
+        self.redis = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+        # Two workers, each with its own connection to the same Redis
+        self.workers = []
+        for _ in range(2):
+            worker = PollAggregator(FakeManager(), broadcasts_per_second=10)
+            worker.start(fakeredis.aioredis.FakeRedis(server=server, decode_responses=True))
+            worker.polls[("s", "1")] = ({"a", "b"}, False)
+            self.workers.append(worker)
+
+        patcher = mock.patch.object(poll_aggregator, "async_session", FakeSession)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def frames(self, frame_type="poll_update"):
+        return [frame for worker in self.workers for frame in worker.manager.frames if frame["type"] == frame_type]
+
+    async def test_workers_share_the_broadcast_rate(self):
+        first, second = self.workers
+        await first.record_vote("s", 1, {"poll_id": 1, "selected_option": "a"})
+        await second.record_vote("s", 2, {"poll_id": 1, "selected_option": "b"})
+        await asyncio.sleep(0.05)
+        self.assertEqual(len(self.frames()), 1)
+
+        await asyncio.sleep(0.1)
+        updates = self.frames()
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(updates[-1]["results"], {"a": 1, "b": 1})
+
+    async def test_close_forgets_the_throttle(self):
+        first, second = self.workers
+        await first.record_vote("s", 1, {"poll_id": 1, "selected_option": "a"})
+        await second.record_vote("s", 2, {"poll_id": 1, "selected_option": "a"})
+        await asyncio.sleep(0.01)
+
+        results = await first.close_poll("s", "1")
+        await asyncio.sleep(0.15)
+        self.assertEqual(results, {"a": 2})
+        self.assertEqual(len(self.frames()), 1)
+        self.assertEqual(len(self.frames("poll_closed")), 1)
+        self.assertEqual(first.scheduled, {})
+        self.assertEqual(second.scheduled, {})
+        self.assertFalse(await self.redis.exists(first._throttle_key("s", "1")))
+
+
+if __name__ == "__main__":
+    unittest.main()
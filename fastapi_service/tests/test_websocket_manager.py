@@ -0,0 +1,137 @@
+"""
+Tests for the WebSocket connection manager's replay on reconnect and presence
+
+    cd fastapi_service && python -m unittest discover tests
+"""
+import asyncio
+import json
+import time
+import unittest
+from unittest import mock
+
+from websocket_manager import ConnectionManager, encode_message, with_seq
+
+try:
+    import fakeredis
+except ImportError:  # Redis-backed tests need fakeredis (and lupa for scripts)
+    fakeredis = None
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.scope = {"subprotocols": []}
+        self.sent = []
+        self.close_code = None
+    
+    async def accept(self, subprotocol=None):
+        pass
+    
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+    
+    async def close(self, code=None):
+        self.close_code = code
+
+
+class ReplayTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncTearDown(self):
+        for websocket, connection in list(self.manager.connections.items()):
+            self.manager.disconnect(websocket, connection["room_id"])
+        await asyncio.sleep(0)
+    
+    async def drain(self):
+        for _ in range(20):
+            await asyncio.sleep(0)
+    
+    async def test_resume_replays_missed_events(self):
+        self.manager = ConnectionManager(send_queue_size=16, replay_buffer_size=16)
+        first = FakeWebSocket()
+        await self.manager.connect(first, "room")
+        for n in range(5):
+            await self.manager.broadcast_to_room("room", {"type": "event", "n": n})
+        self.manager.disconnect(first, "room")
+        
+        second = FakeWebSocket()
+        resumed = await self.manager.connect(second, "room", last_seq=2, snapshot=self.snapshot)
+        await self.drain()
+        self.assertTrue(resumed)
+        self.assertEqual([message["seq"] for message in second.sent if message["type"] == "event"], [3, 4, 5])
+    
+    async def test_gap_larger_than_send_queue_gets_snapshot(self):
+        self.manager = ConnectionManager(send_queue_size=256, replay_buffer_size=256)
+        missed = [(seq, with_seq(encode_message({"type": "event"}), seq)) for seq in range(1, 301)]
+        websocket = FakeWebSocket()
+        with mock.patch.object(self.manager, "events_since", return_value=missed), \
+                mock.patch.object(self.manager, "current_seq", return_value=300):
+            resumed = await asyncio.wait_for(
+                self.manager.connect(websocket, "room", last_seq=0, snapshot=self.snapshot), 5
+            )
+        await self.drain()
+        
+        self.assertFalse(resumed)
+        self.assertIsNone(websocket.close_code)
+        self.assertEqual(websocket.sent, [{"type": "snapshot", "seq": 300}])
+        self.assertIn(websocket, self.manager.connections)
+    
+    def test_replay_buffer_must_fit_send_queue(self):
+        self.manager = ConnectionManager()
+        with self.assertRaises(ValueError):
+            ConnectionManager(send_queue_size=256, replay_buffer_size=500)
+    
+    async def snapshot(self):
+        return {"type": "snapshot"}
+
+
+@unittest.skipUnless(fakeredis, "fakeredis is not installed")
+class PresenceTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        server = fakeredis.FakeServer()
+        self.redis = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+        self.workers = []
+        for _ in range(2):
+            worker = ConnectionManager()
+            await worker.start(fakeredis.aioredis.FakeRedis(server=server, decode_responses=True))
+            self.workers.append(worker)
+    
+    async def asyncTearDown(self):
+        for worker in self.workers:
+            await worker.stop()
+    
+    async def drain(self):
+        for _ in range(20):
+            await asyncio.sleep(0)
+    
+    async def test_counts_are_summed_across_workers(self):
+        first, second = self.workers
+        alice, bob = FakeWebSocket(), FakeWebSocket()
+        await first.connect(alice, "room")
+        await second.connect(bob, "room")
+        await asyncio.sleep(0.05)
+        
+        joined = [message for message in alice.sent if message["type"] == "user_joined"]
+        self.assertEqual(joined[-1]["total_connections"], 2)
+        self.assertEqual(await first.get_room_connections("room"), 2)
+        
+        second.disconnect(bob, "room")
+        await asyncio.sleep(0.05)
+        left = [message for message in alice.sent if message["type"] == "user_left"]
+        self.assertEqual(left[-1]["total_connections"], 1)
+        self.assertEqual(await second.get_room_connections("room"), 1)
+        first.disconnect(alice, "room")
+        await self.drain()
+    
+    async def test_entries_of_dead_workers_are_ignored(self):
+        expired = int(time.time() * 1000) - 1
+        await self.redis.hset("ws:presence:room:room", "dead", f"5:{expired}")
+        self.assertEqual(await self.workers[0].get_room_connections("room"), 0)
+        
+        websocket = FakeWebSocket()
+        await self.workers[0].connect(websocket, "room")
+        self.assertEqual(await self.workers[1].get_room_connections("room"), 1)
+        self.assertEqual(list(await self.redis.hgetall("ws:presence:room:room")), [self.workers[0].worker_id])
+        self.workers[0].disconnect(websocket, "room")
+        await self.drain()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+"""
+Tests for whiteboard clears across workers
+
+    cd fastapi_service && python -m unittest discover tests
+"""
+import json
+import unittest
+from unittest import mock
+
+import whiteboard_batcher
+from whiteboard_batcher import WhiteboardBatcher
+
+
+class FakeBoard:
+    """Stands in for async_session over one whiteboards row"""
+
+    def __init__(self, content=None, epoch=0):
+        self.content = content or {}
+        self.epoch = epoch
+
+    def __call__(self):
+        return FakeSession(self)
+
+
+class FakeResult:
+    def __init__(self, row):
+        self.row = row
+
+    def first(self):
+        return self.row
+
+    def scalar(self):
+        return self.row[0] if self.row else None
+
+
+class FakeSession:
+    def __init__(self, board):
+        self.board = board
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def execute(self, statement, params):
+        sql = str(statement)
+        if sql.startswith("SELECT content"):
+            return FakeResult((self.board.content, self.board.epoch))
+        if sql.startswith("SELECT epoch"):
+            return FakeResult((self.board.epoch,))
+        changes = json.loads(params["content"])
+        if "epoch + 1" in sql:
+            self.board.content = changes
+            self.board.epoch += 1
+        elif params["epoch"] is None or params["epoch"] == self.board.epoch:
+            self.board.content = {**self.board.content, **changes}
+        else:
+            return FakeResult(None)
+        return FakeResult((self.board.epoch,))
+
+    async def commit(self):
+        pass
+
+
+class FakeManager:
+    def __init__(self):
+        self.rooms = {"session_x": set()}
+        self.frames = []
+
+    async def broadcast_to_room(self, room_id, data):
+        self.frames.append(data)
+
+
+class WhiteboardBatcherTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.board = FakeBoard({"old": {"element_id": "old"}})
+        patcher = mock.patch.object(whiteboard_batcher, "async_session", self.board)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def joined_batcher(self):
+        batcher = WhiteboardBatcher(FakeManager())
+        batcher.redis = mock.AsyncMock()
+        batcher.session_ids["session_x"] = "x"
+        await batcher.get_snapshot("session_x", "x")
+        return batcher
+
+    async def test_clear_is_not_undone_by_another_worker(self):
+        clearing = await self.joined_batcher()
+        drawing = await self.joined_batcher()
+
+        drawing.add("session_x", "x", {"element_id": "a", "points": [[1, 2]]})
+        clearing.add("session_x", "x", {"action": "clear"})
+        await clearing.flush()
+        self.assertEqual((self.board.content, self.board.epoch), ({}, 1))
+        self.assertEqual(clearing.manager.frames[0]["updates"], [{"action": "clear"}])
+        clearing.redis.publish.assert_awaited_once_with(
+            whiteboard_batcher.EPOCH_CHANNEL, json.dumps({"room_id": "session_x", "epoch": 1})
+        )
+
+        await drawing.persist_snapshots()
+        self.assertEqual((self.board.content, self.board.epoch), ({}, 1))
+        self.assertEqual(drawing.epochs["session_x"], 1)
+        self.assertNotIn("session_x", drawing.elements)
+
+        drawing.add("session_x", "x", {"element_id": "b", "points": [[3, 4]]})
+        await drawing.persist_snapshots()
+        self.assertEqual(list(self.board.content), ["b"])
+
+    async def test_announced_clear_drops_unsaved_elements(self):
+        batcher = await self.joined_batcher()
+        batcher.add("session_x", "x", {"element_id": "a", "points": [[1, 2]]})
+
+        batcher.observe_epoch("session_x", 0)
+        self.assertEqual(batcher.dirty["session_x"], {"a"})
+        batcher.observe_epoch("session_x", 1)
+        self.assertNotIn("session_x", batcher.dirty)
+        self.assertNotIn("session_x", batcher.pending)
+
+
+if __name__ == "__main__":
+    unittest.main()
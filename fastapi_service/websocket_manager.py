@@ -2,37 +2,322 @@
 WebSocket Connection Manager for Real-time Features
 Handles live sessions, chat, and real-time collaboration
 """
-from typing import Dict, List, Set
-from fastapi import WebSocket
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Set, Optional, Tuple, Union
+from collections import deque
+from fastapi import WebSocket, WebSocketDisconnect
+import asyncio
 import json
+import time
+import uuid
 import structlog
 
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; without it only JSON is offered
+    msgpack = None
+
 logger = structlog.get_logger()
 
+# Redis keys for multi-worker fan-out and presence
+ROOM_CHANNEL_PREFIX = "ws:room:"
+PRESENCE_KEY_PREFIX = "ws:presence:"
+PRESENCE_WORKERS_KEY = "ws:presence:workers"
+ROOM_PRESENCE_KEY_PREFIX = "ws:presence:room:"
+PRESENCE_TTL_SECONDS = 60
+PRESENCE_REFRESH_SECONDS = 20
+REPLAY_KEY_PREFIX = "ws:replay:"
+SEQ_KEY_PREFIX = "ws:seq:"
+
+# Numbers a room event, appends it to the room's replay buffer and publishes it
+# in one round trip, so publish order always matches sequence order.
+#   KEYS: sequence counter, replay list, room channel
+#   ARGV: encoded event (a JSON object), room id, excluded connection id or "", buffer size, key TTL
+BROADCAST_SCRIPT = """
+local seq = redis.call('INCR', KEYS[1])
+local rest = string.sub(ARGV[1], 2)
+if rest ~= '}' then
+    rest = ',' .. rest
+end
+local text = '{"seq":' .. seq .. rest
+redis.call('RPUSH', KEYS[2], text)
+redis.call('LTRIM', KEYS[2], -tonumber(ARGV[4]), -1)
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+local envelope = {room_id = ARGV[2], seq = seq, text = text}
+if ARGV[3] ~= '' then
+    envelope['exclude_connection_id'] = ARGV[3]
+end
+redis.call('PUBLISH', KEYS[3], cjson.encode(envelope))
+return seq
+"""
+
+# Records this worker's connection count in a room, both in the worker's hash
+# and in the room's hash of worker -> "count:deadline ms", and returns the
+# room's total over all workers. Entries of workers that stopped refreshing
+# them are past their deadline; they are left out and removed.
+#   KEYS: worker presence hash, room presence hash, presence workers set
+#   ARGV: room id, worker id, count, now in ms, TTL in seconds
+PRESENCE_SCRIPT = """
+local now = tonumber(ARGV[4])
+if tonumber(ARGV[3]) > 0 then
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[3])
+    redis.call('HSET', KEYS[2], ARGV[2], ARGV[3] .. ':' .. (now + tonumber(ARGV[5]) * 1000))
+else
+    redis.call('HDEL', KEYS[1], ARGV[1])
+    redis.call('HDEL', KEYS[2], ARGV[2])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+redis.call('SADD', KEYS[3], ARGV[2])
+local total = 0
+local entries = redis.call('HGETALL', KEYS[2])
+for i = 1, #entries, 2 do
+    local count, deadline = string.match(entries[i + 1], '(%d+):(%d+)')
+    if tonumber(deadline) > now then
+        total = total + tonumber(count)
+    else
+        redis.call('HDEL', KEYS[2], entries[i])
+    end
+end
+if total > 0 then
+    redis.call('EXPIRE', KEYS[2], ARGV[5])
+end
+return total
+"""
+
+# Close code sent to clients evicted for not keeping up
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+# Subprotocol for clients that want MessagePack binary frames instead of JSON text
+MSGPACK_SUBPROTOCOL = "msgpack"
+
+def encode_message(data: dict) -> str:
+    """Serialize a message once for every recipient"""
+    if orjson is not None:
+        return orjson.dumps(data).decode("utf-8")
+    return json.dumps(data, separators=(",", ":"))
+
+def pack_message(text: str) -> bytes:
+    """Re-encode an encoded JSON message as MessagePack"""
+    return msgpack.packb(orjson.loads(text) if orjson is not None else json.loads(text))
+
+def negotiate_subprotocol(websocket: WebSocket) -> Optional[str]:
+    """The binary subprotocol if the client offers it and msgpack is installed"""
+    if msgpack is not None and MSGPACK_SUBPROTOCOL in websocket.scope.get("subprotocols", []):
+        return MSGPACK_SUBPROTOCOL
+    return None
+
+def with_seq(text: str, seq: int) -> str:
+    """Prefix an encoded JSON object with its sequence number, as BROADCAST_SCRIPT does"""
+    rest = text[1:]
+    if rest != "}":
+        rest = "," + rest
+    return f'{{"seq":{seq}{rest}'
+
 class ConnectionManager:
-    """Manages WebSocket connections and rooms"""
+    """Manages WebSocket connections and rooms
     
-    def __init__(self):
+    Sockets are always held by the local worker. When a Redis client is
+    attached with start(), broadcasts are published to a per-room channel and
+    every worker (including this one) fans them out to its local sockets, and
+    per-room connection counts are mirrored to Redis for cluster-wide presence.
+    
+    Each message is encoded once and queued for every recipient. A per-socket
+    sender task drains its bounded queue, so one slow client never stalls the
+    room; clients whose queue overflows or whose send times out are evicted.
+    
+    Room events carry a per-room ``seq`` and the last ``replay_buffer_size``
+    of them are kept, so a client reconnecting with the last seq it saw gets
+    only what it missed instead of reloading the session.
+    
+    Clients offering the ``msgpack`` subprotocol get MessagePack binary
+    frames; a message is re-encoded for them once per worker, not per socket.
+    Everyone else keeps JSON text frames.
+    """
+    
+    def __init__(
+        self,
+        send_queue_size: int = 256,
+        send_timeout: float = 5.0,
+        replay_buffer_size: int = 200,
+        replay_ttl_seconds: int = 3600
+    ):
+        # A resume queues the whole gap at once, so it must fit in the send queue
+        if replay_buffer_size > send_queue_size:
+            raise ValueError("replay_buffer_size must not exceed send_queue_size")
+        self.send_queue_size = send_queue_size
+        self.send_timeout = send_timeout
+        self.replay_buffer_size = replay_buffer_size
+        self.replay_ttl_seconds = replay_ttl_seconds
+        
         # Store active connections by room
         self.rooms: Dict[str, Set[WebSocket]] = {}
         # Store connection metadata
         self.connections: Dict[WebSocket, Dict[str, str]] = {}
+        
+        # Sequence numbers and replay buffers when running without Redis; like the Redis
+        # keys they outlive the room's last socket until replay_ttl_seconds after its last event
+        self.local_seq: Dict[str, int] = {}
+        self.local_replay: Dict[str, Deque[Tuple[int, str]]] = {}
+        self.local_replay_expires: Dict[str, float] = {}
+        
+        # Distributed backend (optional)
+        self.redis = None
+        self.worker_id = uuid.uuid4().hex
+        self._pubsub = None
+        self._broadcast_script = None
+        self._presence_script = None
+        self._listener_task: Optional[asyncio.Task] = None
+        self._presence_task: Optional[asyncio.Task] = None
+    
+    @property
+    def _presence_key(self) -> str:
+        return f"{PRESENCE_KEY_PREFIX}{self.worker_id}"
     
-    async def connect(self, websocket: WebSocket, room_id: str, user_data: Dict = None):
-        """Accept WebSocket connection and add to room"""
-        await websocket.accept()
+    @staticmethod
+    def _room_presence_key(room_id: str) -> str:
+        return f"{ROOM_PRESENCE_KEY_PREFIX}{room_id}"
+    
+    @staticmethod
+    def _replay_keys(room_id: str) -> List[str]:
+        return [f"{SEQ_KEY_PREFIX}{room_id}", f"{REPLAY_KEY_PREFIX}{room_id}"]
+    
+    async def start(self, redis_client):
+        """Attach Redis and start relaying room broadcasts between workers"""
+        self.redis = redis_client
+        self._broadcast_script = redis_client.register_script(BROADCAST_SCRIPT)
+        self._presence_script = redis_client.register_script(PRESENCE_SCRIPT)
+        self._pubsub = redis_client.pubsub()
+        await self._pubsub.psubscribe(f"{ROOM_CHANNEL_PREFIX}*")
+        
+        self._listener_task = asyncio.create_task(self._listen())
+        self._presence_task = asyncio.create_task(self._refresh_presence())
+        
+        logger.info("WebSocket Redis backend started", worker_id=self.worker_id)
+    
+    async def stop(self):
+        """Stop relaying and withdraw this worker's presence"""
+        for task in (self._listener_task, self._presence_task):
+            if task:
+                task.cancel()
+        
+        if self._pubsub is not None:
+            await self._pubsub.punsubscribe()
+            await self._pubsub.close()
+        
+        if self.redis is not None:
+            pipe = self.redis.pipeline()
+            for room_id in self.rooms:
+                pipe.hdel(self._room_presence_key(room_id), self.worker_id)
+            pipe.delete(self._presence_key)
+            pipe.srem(PRESENCE_WORKERS_KEY, self.worker_id)
+            await pipe.execute()
+        
+        self.redis = None
+    
+    async def _listen(self):
+        """Fan out room broadcasts published by any worker to local sockets"""
+        while True:
+            try:
+                async for message in self._pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    payload = json.loads(message["data"])
+                    self._broadcast_local(
+                        payload["room_id"],
+                        payload["text"],
+                        exclude_connection_id=payload.get("exclude_connection_id"),
+                        seq=payload.get("seq")
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("WebSocket Redis listener failed", error=str(e))
+                await asyncio.sleep(1)
+    
+    async def _refresh_presence(self):
+        """Periodically rewrite this worker's presence hash; it expires if the worker dies"""
+        while True:
+            try:
+                await self._sync_presence()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("WebSocket presence refresh failed", error=str(e))
+            await asyncio.sleep(PRESENCE_REFRESH_SECONDS)
+    
+    async def _sync_presence(self):
+        """Rewrite this worker's room counts in Redis, renewing their deadlines"""
+        if self.redis is None:
+            return
+        
+        counts = self.get_local_rooms()
+        deadline = int(time.time() * 1000) + PRESENCE_TTL_SECONDS * 1000
+        pipe = self.redis.pipeline()
+        pipe.delete(self._presence_key)
+        if counts:
+            pipe.hset(self._presence_key, mapping=counts)
+        pipe.expire(self._presence_key, PRESENCE_TTL_SECONDS)
+        pipe.sadd(PRESENCE_WORKERS_KEY, self.worker_id)
+        for room_id, count in counts.items():
+            pipe.hset(self._room_presence_key(room_id), self.worker_id, f"{count}:{deadline}")
+            pipe.expire(self._room_presence_key(room_id), PRESENCE_TTL_SECONDS)
+        await pipe.execute()
+    
+    async def _sync_room_presence(self, room_id: str) -> int:
+        """Record this worker's count in room; returns the room's count across workers"""
+        count = len(self.rooms.get(room_id, ()))
+        if self.redis is None:
+            return count
+        
+        return int(await self._presence_script(
+            keys=[self._presence_key, self._room_presence_key(room_id), PRESENCE_WORKERS_KEY],
+            args=[room_id, self.worker_id, count, int(time.time() * 1000), PRESENCE_TTL_SECONDS]
+        ))
+    
+    async def connect(
+        self,
+        websocket: WebSocket,
+        room_id: str,
+        user_data: Dict = None,
+        last_seq: Optional[int] = None,
+        snapshot: Optional[Callable[[], Awaitable[dict]]] = None
+    ) -> bool:
+        """Accept WebSocket connection and add to room
+        
+        With ``last_seq`` the events the client missed since then are queued
+        ahead of live ones. When nothing was replayed, either because no
+        ``last_seq`` was given or because the gap is no longer buffered, the
+        message returned by ``snapshot`` is queued first instead, carrying the
+        ``seq`` it is current as of. Returns whether the client was resumed.
+        """
+        subprotocol = negotiate_subprotocol(websocket)
+        await websocket.accept(subprotocol=subprotocol)
         
         # Add to room
         if room_id not in self.rooms:
             self.rooms[room_id] = set()
         self.rooms[room_id].add(websocket)
         
-        # Store connection metadata
+        # Store connection metadata and start its outbound sender
+        queue = asyncio.Queue(maxsize=self.send_queue_size)
         self.connections[websocket] = {
             "room_id": room_id,
-            "user_data": user_data or {}
+            "user_data": user_data or {},
+            "connection_id": uuid.uuid4().hex,
+            "binary": subprotocol is not None,
+            "queue": queue,
+            "sender_task": asyncio.create_task(self._sender(websocket, room_id, queue)),
+            # Live events held back until the replay or snapshot is queued, as (seq, text)
+            "holdback": [] if last_seq is not None or snapshot is not None else None
         }
         
+        total_connections = await self._sync_room_presence(room_id)
+        
         logger.info(
             "WebSocket connected",
             room_id=room_id,
@@ -44,21 +329,101 @@ class ConnectionManager:
             "type": "user_joined",
             "room_id": room_id,
             "user_data": user_data,
-            "total_connections": len(self.rooms[room_id])
-        }, exclude_sender=websocket)
+            "total_connections": total_connections
+        }, exclude_sender=websocket, replay=False)
+        
+        if last_seq is not None:
+            try:
+                missed = await self.events_since(room_id, last_seq)
+            except Exception as e:
+                logger.error("Failed to read replay buffer", error=str(e), room_id=room_id)
+                missed = None
+            # A gap larger than the free send queue would evict the socket mid-replay; send the snapshot instead
+            connection = self.connections.get(websocket)
+            if missed is not None and connection is not None:
+                free = connection["queue"].maxsize - connection["queue"].qsize() - len(connection["holdback"])
+                if len(missed) > free:
+                    logger.info("Replay gap exceeds send queue, sending snapshot", room_id=room_id, missed=len(missed))
+                    missed = None
+            if missed is not None:
+                self._release(websocket, room_id, [text for _, text in missed], missed[-1][0] if missed else last_seq)
+                return True
+        
+        if snapshot is None:
+            self._release(websocket, room_id, [], None)
+            return False
+        
+        # Read the seq first, so the snapshot is at least as new as it
+        seq = await self.current_seq(room_id)
+        data = await snapshot()
+        self._release(websocket, room_id, [encode_message({**data, "seq": seq})], seq)
+        return False
+    
+    def _release(self, websocket: WebSocket, room_id: str, texts: List[str], newest: Optional[int]):
+        """Queue texts, then the live events held back meanwhile that are newer than seq newest"""
+        connection = self.connections.get(websocket)
+        if connection is None or connection["holdback"] is None:
+            return
+        held, connection["holdback"] = connection["holdback"], None
+        
+        # Live events already covered by the replay or snapshot are skipped; unnumbered ones always go
+        texts = texts + [text for seq, text in held if newest is None or seq is None or seq > newest]
+        
+        try:
+            for text in texts:
+                connection["queue"].put_nowait(pack_message(text) if connection["binary"] else text)
+        except asyncio.QueueFull:
+            logger.warning("Evicting websocket consumer during replay", room_id=room_id)
+            asyncio.create_task(self._evict(websocket, room_id))
+    
+    async def current_seq(self, room_id: str) -> int:
+        """Sequence number of the room's latest event, 0 if none is buffered"""
+        if self.redis is None:
+            return self.local_seq.get(room_id, 0)
+        return int(await self.redis.get(self._replay_keys(room_id)[0]) or 0)
+    
+    async def events_since(self, room_id: str, last_seq: int) -> Optional[List[Tuple[int, str]]]:
+        """Buffered (seq, text) events after last_seq, or None if some were already dropped"""
+        if self.redis is None:
+            events = list(self.local_replay.get(room_id, ()))
+        else:
+            events = [(json.loads(text)["seq"], text) for text in await self.redis.lrange(self._replay_keys(room_id)[1], 0, -1)]
+        
+        if not events:
+            return [] if last_seq == await self.current_seq(room_id) else None
+        # A last_seq beyond the newest event means the room's counter expired and restarted
+        if events[0][0] > last_seq + 1 or last_seq > events[-1][0]:
+            return None
+        return [(seq, text) for seq, text in events if seq > last_seq]
+    
+    def _expire_local_replay(self):
+        """Drop the local replay state of empty rooms idle for replay_ttl_seconds"""
+        now = time.monotonic()
+        for room_id, expires in list(self.local_replay_expires.items()):
+            if expires <= now and room_id not in self.rooms:
+                del self.local_replay_expires[room_id]
+                self.local_seq.pop(room_id, None)
+                self.local_replay.pop(room_id, None)
     
     def disconnect(self, websocket: WebSocket, room_id: str):
         """Remove WebSocket connection"""
+        # Already removed (e.g. evicted as a slow consumer)
+        if websocket not in self.connections:
+            return
+        
         # Remove from room
         if room_id in self.rooms:
             self.rooms[room_id].discard(websocket)
             if not self.rooms[room_id]:  # Remove empty room
                 del self.rooms[room_id]
+                self._expire_local_replay()
         
-        # Remove connection metadata
-        user_data = self.connections.get(websocket, {}).get("user_data", {})
-        if websocket in self.connections:
-            del self.connections[websocket]
+        # Remove connection metadata and stop its sender
+        connection = self.connections.pop(websocket)
+        user_data = connection.get("user_data", {})
+        sender_task = connection.get("sender_task")
+        if sender_task and sender_task is not asyncio.current_task():
+            sender_task.cancel()
         
         logger.info(
             "WebSocket disconnected",
@@ -66,69 +431,246 @@ class ConnectionManager:
             connections_in_room=len(self.rooms.get(room_id, set()))
         )
         
-        # Notify room about disconnection
-        if room_id in self.rooms:
-            import asyncio
-            asyncio.create_task(self.broadcast_to_room(room_id, {
+        asyncio.create_task(self._notify_left(room_id, user_data))
+    
+    async def _notify_left(self, room_id: str, user_data: Dict):
+        """Update presence and notify room about disconnection"""
+        total_connections = await self._sync_room_presence(room_id)
+        if total_connections:
+            await self.broadcast_to_room(room_id, {
                 "type": "user_left",
                 "room_id": room_id,
                 "user_data": user_data,
-                "total_connections": len(self.rooms[room_id])
-            }))
+                "total_connections": total_connections
+            }, replay=False)
     
     async def send_personal_message(self, message: str, websocket: WebSocket):
         """Send message to specific WebSocket"""
         try:
-            await websocket.send_text(message)
+            await self._enqueue(websocket, message)
         except Exception as e:
             logger.error("Failed to send personal message", error=str(e))
     
     async def send_json_to_websocket(self, data: dict, websocket: WebSocket):
         """Send JSON data to specific WebSocket"""
         try:
-            await websocket.send_json(data)
+            await self.send_message(data, websocket)
         except Exception as e:
             logger.error("Failed to send JSON to websocket", error=str(e))
     
-    async def broadcast_to_room(self, room_id: str, data: dict, exclude_sender: WebSocket = None):
-        """Broadcast message to all connections in room"""
+    async def send_message(self, data: dict, websocket: WebSocket):
+        """Send data in the connection's negotiated format, behind what is already queued for it"""
+        if self.connections.get(websocket, {}).get("binary"):
+            await self._enqueue(websocket, msgpack.packb(data))
+        else:
+            await self._enqueue(websocket, encode_message(data))
+    
+    async def _enqueue(self, websocket: WebSocket, frame: Union[str, bytes]):
+        """Queue a frame for one connection, waiting up to send_timeout for room in its queue
+        
+        Everything sent to a socket goes through its queue, so only its sender
+        task ever writes to it and room events keep their order.
+        """
+        connection = self.connections.get(websocket)
+        if connection is None:
+            raise RuntimeError("WebSocket is not connected")
+        try:
+            await asyncio.wait_for(connection["queue"].put(frame), timeout=self.send_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Evicting slow websocket consumer", room_id=connection["room_id"])
+            await self._evict(websocket, connection["room_id"])
+            raise
+    
+    async def receive_message(self, websocket: WebSocket) -> Any:
+        """Receive and decode one message, JSON text or MessagePack binary"""
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        if message.get("bytes") is not None:
+            if msgpack is not None:
+                return msgpack.unpackb(message["bytes"])
+            return json.loads(message["bytes"])
+        return json.loads(message["text"])
+    
+    async def _sender(self, websocket: WebSocket, room_id: str, queue: asyncio.Queue):
+        """Drain a connection's outbound queue, evicting it if a send stalls or fails"""
+        try:
+            while True:
+                frame = await queue.get()
+                send = websocket.send_bytes if isinstance(frame, bytes) else websocket.send_text
+                await asyncio.wait_for(send(frame), timeout=self.send_timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(
+                "Evicting slow or broken websocket",
+                error=str(e) or type(e).__name__,
+                room_id=room_id
+            )
+            await self._evict(websocket, room_id)
+    
+    async def _evict(self, websocket: WebSocket, room_id: str):
+        """Drop a connection that cannot keep up"""
+        self.disconnect(websocket, room_id)
+        try:
+            await websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+        except Exception:
+            pass
+    
+    async def broadcast_to_room(
+        self,
+        room_id: str,
+        data: dict,
+        exclude_sender: WebSocket = None,
+        replay: bool = True
+    ):
+        """Broadcast message to all connections in room, across all workers
+        
+        Unless ``replay`` is False (presence notices), the message gets the
+        room's next ``seq`` and is kept for clients that reconnect.
+        """
+        exclude_connection_id = None
+        if exclude_sender is not None:
+            exclude_connection_id = self.connections.get(exclude_sender, {}).get("connection_id")
+        
+        if replay and "seq" in data:
+            # The room's own numbering wins over a client-supplied field
+            data = {key: value for key, value in data.items() if key != "seq"}
+        text = encode_message(data)
+        
+        if not replay:
+            await self._publish(room_id, text, exclude_connection_id)
+            return
+        
+        if self.redis is None:
+            seq = self.local_seq.get(room_id, 0) + 1
+            self.local_seq[room_id] = seq
+            text = with_seq(text, seq)
+            buffer = self.local_replay.setdefault(room_id, deque(maxlen=self.replay_buffer_size))
+            buffer.append((seq, text))
+            self.local_replay_expires[room_id] = time.monotonic() + self.replay_ttl_seconds
+            self._broadcast_local(room_id, text, exclude_connection_id, seq)
+            return
+        
+        try:
+            await self._broadcast_script(
+                keys=[*self._replay_keys(room_id), f"{ROOM_CHANNEL_PREFIX}{room_id}"],
+                args=[text, room_id, exclude_connection_id or "", self.replay_buffer_size, self.replay_ttl_seconds]
+            )
+        except Exception as e:
+            # Deliver unnumbered so this worker's clients still get it; a local seq would clash
+            logger.error("Failed to publish room broadcast", error=str(e), room_id=room_id)
+            self._broadcast_local(room_id, text, exclude_connection_id)
+    
+    async def _publish(self, room_id: str, text: str, exclude_connection_id: str = None):
+        """Fan out an unnumbered message through Redis, or locally without it"""
+        if self.redis is not None:
+            try:
+                await self.redis.publish(f"{ROOM_CHANNEL_PREFIX}{room_id}", encode_message({
+                    "room_id": room_id,
+                    "text": text,
+                    "exclude_connection_id": exclude_connection_id
+                }))
+                return
+            except Exception as e:
+                # Fall back to local delivery so this worker's clients still get the message
+                logger.error("Failed to publish room broadcast", error=str(e), room_id=room_id)
+        
+        self._broadcast_local(room_id, text, exclude_connection_id)
+    
+    def _broadcast_local(
+        self,
+        room_id: str,
+        text: str,
+        exclude_connection_id: str = None,
+        seq: Optional[int] = None
+    ):
+        """Queue an encoded message for this worker's connections in room"""
         if room_id not in self.rooms:
             return
         
-        disconnected = set()
+        slow_consumers = []
+        # MessagePack form, encoded on first use
+        packed = None
         
-        for websocket in self.rooms[room_id].copy():
-            if exclude_sender and websocket == exclude_sender:
+        for websocket in self.rooms[room_id]:
+            connection = self.connections.get(websocket)
+            if connection is None:
+                continue
+            if exclude_connection_id and connection["connection_id"] == exclude_connection_id:
+                continue
+            if connection["holdback"] is not None:
+                connection["holdback"].append((seq, text))
                 continue
-                
+            
+            frame: Union[str, bytes] = text
+            if connection["binary"]:
+                if packed is None:
+                    packed = pack_message(text)
+                frame = packed
+            
             try:
-                await websocket.send_json(data)
-            except Exception as e:
-                logger.error(
-                    "Failed to send to websocket",
-                    error=str(e),
-                    room_id=room_id
-                )
-                disconnected.add(websocket)
+                connection["queue"].put_nowait(frame)
+            except asyncio.QueueFull:
+                slow_consumers.append(websocket)
         
-        # Clean up disconnected sockets
-        for websocket in disconnected:
-            self.disconnect(websocket, room_id)
+        # Evict clients whose outbound queue is full
+        for websocket in slow_consumers:
+            logger.warning("Evicting slow websocket consumer", room_id=room_id)
+            asyncio.create_task(self._evict(websocket, room_id))
     
     async def broadcast_to_all(self, data: dict):
-        """Broadcast message to all active connections"""
-        for room_id in list(self.rooms.keys()):
+        """Broadcast message to all active rooms"""
+        for room_id in await self.get_all_rooms():
             await self.broadcast_to_room(room_id, data)
     
-    def get_room_connections(self, room_id: str) -> int:
-        """Get number of connections in room"""
-        return len(self.rooms.get(room_id, set()))
+    async def get_room_connections(self, room_id: str) -> int:
+        """Get number of connections in room across all workers"""
+        if self.redis is None:
+            return len(self.rooms.get(room_id, set()))
+        
+        now = int(time.time() * 1000)
+        total = 0
+        for entry in (await self.redis.hgetall(self._room_presence_key(room_id))).values():
+            count, deadline = entry.split(":")
+            if int(deadline) > now:
+                total += int(count)
+        return total
     
-    def get_all_rooms(self) -> Dict[str, int]:
-        """Get all active rooms and connection counts"""
+    def get_local_rooms(self) -> Dict[str, int]:
+        """Get rooms and connection counts held by this worker"""
         return {room_id: len(connections) for room_id, connections in self.rooms.items()}
     
+    async def get_all_rooms(self) -> Dict[str, int]:
+        """Get all active rooms and connection counts across all workers"""
+        if self.redis is None:
+            return self.get_local_rooms()
+        
+        worker_ids = list(await self.redis.smembers(PRESENCE_WORKERS_KEY))
+        pipe = self.redis.pipeline()
+        for worker_id in worker_ids:
+            pipe.hgetall(f"{PRESENCE_KEY_PREFIX}{worker_id}")
+        worker_rooms = await pipe.execute()
+        
+        rooms: Dict[str, int] = {}
+        expired_workers = []
+        for worker_id, counts in zip(worker_ids, worker_rooms):
+            if not counts:
+                expired_workers.append(worker_id)
+                continue
+            for room_id, count in counts.items():
+                rooms[room_id] = rooms.get(room_id, 0) + int(count)
+        
+        if expired_workers:
+            await self.redis.srem(PRESENCE_WORKERS_KEY, *expired_workers)
+        
+        return rooms
+    
+    async def total_connections(self) -> int:
+        """Total number of active connections across all workers"""
+        return sum((await self.get_all_rooms()).values())
+    
     @property
     def active_connections(self) -> int:
-        """Total number of active connections"""
-        return len(self.connections)
\ No newline at end of file
+        """Total number of active connections on this worker"""
+        return len(self.connections)
@@ -0,0 +1,311 @@
+"""
+Whiteboard update batching for live sessions
+Coalesces pointer events per room and sends one compact frame per tick
+
+classroom/whiteboard.py does the same for the Django Channels consumers.
+The two services are deployed separately and share no code, only the
+``whiteboards`` table, so the board rules (merge_update, clears and epochs)
+are kept alike in both files.
+"""
+from typing import Dict, List, Set, Optional
+import asyncio
+import json
+import time
+import structlog
+from sqlalchemy import text
+from sqlalchemy.exc import DataError, IntegrityError
+
+from database import async_session
+
+logger = structlog.get_logger()
+
+# Workers announce saved clears here so the others drop their unsaved elements
+EPOCH_CHANNEL = "whiteboard:epochs"
+
+def merge_update(previous: Optional[dict], update: dict) -> dict:
+    """Merge an update into the previous state of the same element
+    
+    Later fields win, except stroke points which are appended.
+    """
+    if not previous:
+        return dict(update)
+    
+    merged = {**previous, **update}
+    if isinstance(previous.get("points"), list) and isinstance(update.get("points"), list):
+        merged["points"] = previous["points"] + update["points"]
+    return merged
+
+class WhiteboardBatcher:
+    """Per-room whiteboard frame batcher with periodic snapshots
+    
+    Updates carrying an ``element_id`` are coalesced within a tick and folded
+    into the room's element state; an update with ``action == "clear"`` resets
+    the board. Element state is snapshotted into ``whiteboards.content`` so late
+    joiners receive a single snapshot instead of a replay.
+    
+    Other workers may hold unsaved elements of the same board, so a clear is
+    saved on the tick it arrives and bumps ``whiteboards.epoch``. Changes are
+    only merged into the epoch they were drawn on. Saved clears are announced
+    over Redis; a worker that hears of a newer epoch drops its unsaved
+    elements, as it does when a save finds the epoch has moved on.
+    """
+    
+    def __init__(self, manager, tick_ms: int = 33, snapshot_seconds: float = 10.0):
+        self.manager = manager
+        self.tick = tick_ms / 1000
+        self.snapshot_seconds = snapshot_seconds
+        
+        # Updates waiting for the next tick, with element_id -> position for coalescing
+        self.pending: Dict[str, List[dict]] = {}
+        self.pending_index: Dict[str, Dict[str, int]] = {}
+        
+        # Full element state per room, and what changed since the last snapshot
+        self.elements: Dict[str, Dict[str, dict]] = {}
+        self.dirty: Dict[str, Set[str]] = {}
+        self.cleared: Set[str] = set()
+        self.epochs: Dict[str, int] = {}
+        self.session_ids: Dict[str, str] = {}
+        
+        self.redis = None
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+        self._listener_task: Optional[asyncio.Task] = None
+        self._last_snapshot = time.monotonic()
+    
+    async def start(self, redis_client=None):
+        """Start the tick loop, and hear other workers' clears when Redis is attached"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        if redis_client is not None and self._pubsub is None:
+            self.redis = redis_client
+            self._pubsub = redis_client.pubsub()
+            await self._pubsub.subscribe(EPOCH_CHANNEL)
+            self._listener_task = asyncio.create_task(self._listen())
+    
+    async def stop(self):
+        """Stop the tick loop, flushing pending frames and snapshots"""
+        for task in (self._task, self._listener_task):
+            if task is not None:
+                task.cancel()
+        self._task = self._listener_task = None
+        if self._pubsub is not None:
+            await self._pubsub.unsubscribe()
+            await self._pubsub.close()
+            self._pubsub = None
+        await self.flush()
+        await self.persist_snapshots()
+    
+    def add(self, room_id: str, session_id: str, update: dict):
+        """Queue a whiteboard update for the room's next batch"""
+        self.session_ids[room_id] = session_id
+        pending = self.pending.setdefault(room_id, [])
+        index = self.pending_index.setdefault(room_id, {})
+        elements = self.elements.setdefault(room_id, {})
+        dirty = self.dirty.setdefault(room_id, set())
+        
+        if update.get("action") == "clear":
+            pending.clear()
+            index.clear()
+            elements.clear()
+            dirty.clear()
+            self.cleared.add(room_id)
+            pending.append(dict(update))
+            return
+        
+        element_id = update.get("element_id")
+        if element_id is None:
+            pending.append(update)
+            return
+        
+        element_id = str(element_id)
+        position = index.get(element_id)
+        if position is None:
+            index[element_id] = len(pending)
+            pending.append(dict(update))
+        else:
+            pending[position] = merge_update(pending[position], update)
+        
+        elements[element_id] = merge_update(elements.get(element_id), update)
+        dirty.add(element_id)
+    
+    async def get_snapshot(self, room_id: str, session_id: str) -> Dict[str, dict]:
+        """Current board state: last persisted snapshot overlaid with local changes"""
+        content = {}
+        if room_id not in self.cleared:
+            try:
+                async with async_session() as session:
+                    result = await session.execute(
+                        text("SELECT content, epoch FROM whiteboards WHERE session_id = CAST(:session_id AS uuid)"),
+                        {"session_id": session_id}
+                    )
+                    row = result.first()
+                if row is None:
+                    self.observe_epoch(room_id, 0)
+                else:
+                    content = dict(row[0] or {})
+                    self.observe_epoch(room_id, row[1])
+            except Exception as e:
+                logger.error("Failed to load whiteboard snapshot", error=str(e), session_id=session_id)
+        
+        content.update(self.elements.get(room_id, {}))
+        return content
+    
+    def observe_epoch(self, room_id: str, epoch: int):
+        """Catch up with a clear saved elsewhere, dropping what was drawn before it"""
+        known = self.epochs.get(room_id)
+        if known is not None and epoch <= known:
+            return
+        self.epochs[room_id] = epoch
+        # Unknown until now, or our own unsaved clear supersedes it: nothing here predates it
+        if known is None or room_id in self.cleared:
+            return
+        for state in (self.pending, self.pending_index, self.elements, self.dirty):
+            state.pop(room_id, None)
+    
+    async def _listen(self):
+        """Follow clears saved by other workers"""
+        while True:
+            try:
+                async for message in self._pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    payload = json.loads(message["data"])
+                    # Only rooms this worker holds state for can go stale
+                    if payload["room_id"] in self.session_ids:
+                        self.observe_epoch(payload["room_id"], payload["epoch"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Whiteboard epoch listener failed", error=str(e))
+                await asyncio.sleep(1)
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                await self.flush()
+                if time.monotonic() - self._last_snapshot >= self.snapshot_seconds:
+                    await self.persist_snapshots()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Whiteboard batch tick failed", error=str(e))
+    
+    async def flush(self):
+        """Send one batch frame per room with pending updates"""
+        rooms = [room_id for room_id, pending in self.pending.items() if pending]
+        for room_id in rooms:
+            # Save a new clear before announcing it, so no other worker's older elements outlive it
+            clearing = any(update.get("action") == "clear" for update in self.pending[room_id])
+            if clearing and room_id in self.cleared:
+                await self._persist_room(room_id)
+            updates = self.pending.get(room_id)
+            if not updates:
+                continue
+            self.pending[room_id] = []
+            self.pending_index[room_id] = {}
+            
+            await self.manager.broadcast_to_room(room_id, {
+                "type": "whiteboard_batch",
+                "updates": updates
+            })
+    
+    async def persist_snapshots(self):
+        """Write changed elements into whiteboards.content"""
+        self._last_snapshot = time.monotonic()
+        
+        for room_id in list(self.session_ids):
+            if not await self._persist_room(room_id):
+                continue
+            
+            # Forget rooms this worker no longer serves once they are persisted
+            if room_id not in self.manager.rooms and not self.pending.get(room_id):
+                self._drop_room(room_id)
+    
+    async def _persist_room(self, room_id: str) -> bool:
+        """Save the room's changed elements; False if the room is gone or must retry"""
+        if room_id not in self.session_ids:
+            return False
+        dirty = self.dirty.get(room_id, set())
+        cleared = room_id in self.cleared
+        if not (dirty or cleared):
+            return True
+        
+        # Take ownership of the change set; updates arriving meanwhile start a new one
+        self.dirty[room_id] = set()
+        self.cleared.discard(room_id)
+        
+        elements = self.elements.get(room_id, {})
+        changes = {element_id: elements[element_id] for element_id in dirty if element_id in elements}
+        params = {
+            "session_id": self.session_ids[room_id],
+            "content": json.dumps(changes),
+            "epoch": self.epochs.get(room_id)
+        }
+        
+        try:
+            async with async_session() as session:
+                if cleared:
+                    # A clear replaces the stored board and starts a new epoch
+                    result = await session.execute(
+                        text(
+                            "INSERT INTO whiteboards (session_id, content, epoch, updated_at) "
+                            "VALUES (CAST(:session_id AS uuid), CAST(:content AS jsonb), 1, now()) "
+                            "ON CONFLICT (session_id) DO UPDATE "
+                            "SET content = EXCLUDED.content, epoch = whiteboards.epoch + 1, updated_at = now() "
+                            "RETURNING epoch"
+                        ),
+                        params
+                    )
+                else:
+                    # Merge changed elements, unless the board was cleared since they were drawn
+                    result = await session.execute(
+                        text(
+                            "INSERT INTO whiteboards (session_id, content, epoch, updated_at) "
+                            "VALUES (CAST(:session_id AS uuid), CAST(:content AS jsonb), "
+                            "COALESCE(CAST(:epoch AS integer), 0), now()) "
+                            "ON CONFLICT (session_id) DO UPDATE "
+                            "SET content = whiteboards.content || EXCLUDED.content, updated_at = now() "
+                            "WHERE CAST(:epoch AS integer) IS NULL OR whiteboards.epoch = CAST(:epoch AS integer) "
+                            "RETURNING epoch"
+                        ),
+                        params
+                    )
+                epoch = result.scalar()
+                saved = epoch is not None
+                if not saved:
+                    result = await session.execute(
+                        text("SELECT epoch FROM whiteboards WHERE session_id = CAST(:session_id AS uuid)"),
+                        params
+                    )
+                    epoch = result.scalar()
+                await session.commit()
+        except (DataError, IntegrityError) as e:
+            # A malformed or deleted session never saves; retrying would hold the room forever
+            logger.error("Dropping unsaveable whiteboard", error=str(e), room_id=room_id)
+            self._drop_room(room_id)
+            return False
+        except Exception as e:
+            logger.error("Failed to persist whiteboard snapshot", error=str(e), room_id=room_id)
+            self.dirty.setdefault(room_id, set()).update(dirty)
+            if cleared:
+                self.cleared.add(room_id)
+            return False
+        
+        if not saved:
+            self.observe_epoch(room_id, epoch)
+            return True
+        
+        self.epochs[room_id] = epoch
+        if cleared and self.redis is not None:
+            try:
+                await self.redis.publish(EPOCH_CHANNEL, json.dumps({"room_id": room_id, "epoch": epoch}))
+            except Exception as e:
+                # Other workers still find out when their next save is refused
+                logger.error("Failed to announce whiteboard clear", error=str(e), room_id=room_id)
+        return True
+    
+    def _drop_room(self, room_id: str):
+        for state in (self.pending, self.pending_index, self.elements, self.dirty, self.epochs, self.session_ids):
+            state.pop(room_id, None)
+        self.cleared.discard(room_id)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark closing session attendances: row by row against set-based UPDATEs
+
+For each session size, fills a throwaway test database with open
+SessionAttendance rows and times two cases. "end" is the tutor ending the
+session, where everyone left still present is closed at once. "leave" is a
+leave storm, where everyone disconnects at slightly different times and the
+buffered leaves are flushed together. Each case is timed the old way, one
+load and save() per attendee, and through SessionAttendanceQuerySet.close()
+or apply_attendance(). Run it against PostgreSQL, like production:
+
+    DJANGO_SETTINGS_MODULE=tutoring_platform.settings python scripts/bench_attendance.py --sizes 50 200 500
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tutoring_platform.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection, transaction  # noqa: E402
+from django.test.utils import CaptureQueriesContext, setup_test_environment  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from classroom.attendance import apply_attendance  # noqa: E402
+from classroom.models import LiveSession, SessionAttendance  # noqa: E402
+from courses.models import Course  # noqa: E402
+from users.models import User  # noqa: E402
+
+
+def make_session(size):
+    tag = uuid.uuid4().hex[:8]
+    tutor = User.objects.create(username=f'tutor-{tag}', email=f'tutor-{tag}@example.com', user_type='tutor')
+    course = Course.objects.create(
+        tutor=tutor, title=tag, slug=tag, description=tag, short_description=tag,
+        difficulty='beginner', duration_weeks=1
+    )
+    session = LiveSession.objects.create(
+        course=course, tutor=tutor, title=tag, scheduled_at=timezone.now(), status='live'
+    )
+    students = User.objects.bulk_create(
+        User(username=f'student-{tag}-{i}', email=f'student-{tag}-{i}@example.com', password='!')
+        for i in range(size)
+    )
+    return session, [student.id for student in students]
+
+
+def end_row_by_row(session, now, student_ids):
+    for attendance in SessionAttendance.objects.filter(session=session, left_at__isnull=True):
+        attendance.left_at = now
+        attendance.duration_minutes = int((now - attendance.joined_at).total_seconds() / 60)
+        attendance.save()
+
+
+def end_set_based(session, now, student_ids):
+    SessionAttendance.objects.filter(session=session).close(now)
+
+
+def leave_times(now, student_ids):
+    # Everyone drops within a few seconds of each other
+    return {student_id: now - timedelta(milliseconds=index * 7) for index, student_id in enumerate(student_ids)}
+
+
+def leave_row_by_row(session, now, student_ids):
+    for student_id, left_at in leave_times(now, student_ids).items():
+        attendance = SessionAttendance.objects.get(session=session, student_id=student_id)
+        attendance.left_at = left_at
+        attendance.duration_minutes = int((left_at - attendance.joined_at).total_seconds() / 60)
+        attendance.save()
+
+
+def leave_bulk(session, now, student_ids):
+    apply_attendance(session.id, {}, leave_times(now, student_ids))
+
+
+CASES = [
+    ('end', end_row_by_row, end_set_based),
+    ('leave', leave_row_by_row, leave_bulk),
+]
+
+
+def measure(close, session, student_ids, rounds):
+    timings = []
+    for _ in range(rounds):
+        savepoint = transaction.savepoint()
+        now = timezone.now()
+        SessionAttendance.objects.bulk_create(
+            SessionAttendance(session=session, student_id=student_id, joined_at=now - timedelta(minutes=45), is_present=True)
+            for student_id in student_ids
+        )
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            close(session, now, student_ids)
+            timings.append((time.perf_counter() - started) * 1000)
+        closed = SessionAttendance.objects.filter(session=session, left_at__isnull=False).count()
+        assert closed == len(student_ids), f'{close.__name__} closed {closed} of {len(student_ids)}'
+        transaction.savepoint_rollback(savepoint)
+    return statistics.median(timings), len(queries)
+
+
+def main(args):
+    print(f"{'case':>6} {'rows':>6} {'row-by-row ms':>14} {'queries':>8} {'set-based ms':>13} {'queries':>8}")
+    with transaction.atomic():
+        for size in args.sizes:
+            session, student_ids = make_session(size)
+            for name, row_by_row, set_based in CASES:
+                slow_ms, slow_queries = measure(row_by_row, session, student_ids, args.rounds)
+                fast_ms, fast_queries = measure(set_based, session, student_ids, args.rounds)
+                print(f'{name:>6} {size:>6} {slow_ms:>14.1f} {slow_queries:>8} {fast_ms:>13.1f} {fast_queries:>8}')
+        transaction.set_rollback(True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 200, 500])
+    parser.add_argument('--rounds', type=int, default=5)
+    parsed = parser.parse_args()
+
+    setup_test_environment()
+    database_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        main(parsed)
+    finally:
+        connection.creation.destroy_test_db(database_name, verbosity=0)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark room broadcast latency against room size
+
+Drives ConnectionManager with in-memory sockets (no network, no Redis) and
+reports, per room size, how long one whiteboard-sized broadcast takes to
+reach every socket. With --slow, one socket in each room never completes a
+send, to show the rest of the room is not held up by it.
+
+    python scripts/bench_broadcast.py --sizes 10 50 200 500 --rounds 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'fastapi_service'))
+
+import structlog  # noqa: E402
+
+from websocket_manager import ConnectionManager  # noqa: E402
+
+STROKE = {
+    'type': 'whiteboard_batch',
+    'updates': [
+        {'element_id': f'el-{i}', 'type': 'stroke', 'color': '#1e88e5', 'width': 2,
+         'points': [[x * 7 % 1920, x * 13 % 1080] for x in range(16)]}
+        for i in range(8)
+    ]
+}
+
+
+class FakeWebSocket:
+    """Records when the last expected frame arrives"""
+
+    def __init__(self, stall=False):
+        self.scope = {'subprotocols': []}
+        self.stall = stall
+        self.received = 0
+        self.expected = None
+        self.done = None
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, text):
+        if self.stall:
+            await asyncio.sleep(3600)
+        self.received += 1
+        if self.expected is not None and self.received >= self.expected:
+            self.done.set()
+
+    send_bytes = send_text
+
+    async def close(self, code=None):
+        pass
+
+
+async def measure(size, rounds, slow):
+    manager = ConnectionManager(send_queue_size=rounds + size + 16, send_timeout=30, replay_buffer_size=rounds)
+    room_id = f'bench-{size}'
+    sockets = [FakeWebSocket() for _ in range(size)]
+    for websocket in sockets:
+        await manager.connect(websocket, room_id)
+    if slow:
+        await manager.connect(FakeWebSocket(stall=True), room_id)
+    # Let join notices drain before timing
+    while any(manager.connections[websocket]['queue'].qsize() for websocket in sockets):
+        await asyncio.sleep(0.01)
+
+    latencies = []
+    for _ in range(rounds):
+        for websocket in sockets:
+            websocket.expected = websocket.received + 1
+            websocket.done = asyncio.Event()
+        started = time.perf_counter()
+        await manager.broadcast_to_room(room_id, STROKE)
+        await asyncio.gather(*(websocket.done.wait() for websocket in sockets))
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    senders = [connection['sender_task'] for connection in manager.connections.values()]
+    for websocket in list(manager.connections):
+        manager.disconnect(websocket, room_id)
+    await asyncio.gather(*senders, return_exceptions=True)
+    await asyncio.sleep(0.1)
+    return latencies
+
+
+async def main(args):
+    print(f"{'sockets':>8} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for size in args.sizes:
+        latencies = sorted(await measure(size, args.rounds, args.slow))
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f'{size:>8} {statistics.median(latencies):>9.3f} {p95:>9.3f} {latencies[-1]:>9.3f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 50, 200, 500])
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--slow', action='store_true', help='add one socket that never finishes a send')
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(30))
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark the MessagePack wire format against JSON for live session traffic
+
+For chat messages and whiteboard frames, reports the frame size in bytes and
+the CPU time per frame for:
+
+- the server encoding a broadcast, once per worker (encode_message for JSON;
+  pack_message on top of it for MessagePack);
+- a client decoding it;
+- a client encoding what it sends up.
+
+Clients are stood in for by the stdlib json module and msgpack.
+
+    python scripts/bench_wire.py --number 20000
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'fastapi_service'))
+
+import msgpack  # noqa: E402
+
+from websocket_manager import encode_message, pack_message  # noqa: E402
+
+
+def stroke(index, points):
+    return {
+        'element_id': f'el-{index}', 'type': 'stroke', 'color': '#1e88e5', 'width': 2,
+        'points': [[x * 7 % 1920, x * 13 % 1080] for x in range(points)]
+    }
+
+
+MESSAGES = {
+    'chat': {
+        'seq': 48213, 'type': 'chat_message', 'username': 'ada.lovelace',
+        'message': 'Could you go over the second example again? I lost track after the recursion step.',
+        'timestamp': '2026-10-17T18:42:07.318512Z'
+    },
+    'whiteboard update': {'seq': 48214, 'type': 'whiteboard_update', 'data': stroke(0, 4)},
+    'whiteboard batch': {'seq': 48215, 'type': 'whiteboard_batch', 'updates': [stroke(i, 16) for i in range(8)]},
+}
+
+
+def per_frame_us(statement, number):
+    return min(timeit.repeat(statement, number=number, repeat=5)) / number * 1e6
+
+
+def main(args):
+    print(f"{'message':>18} {'format':>8} {'bytes':>7} {'server enc us':>14} {'client dec us':>14} {'client enc us':>14}")
+    for name, data in MESSAGES.items():
+        text = encode_message(data)
+        packed = pack_message(text)
+        rows = [
+            ('json', len(text.encode('utf-8')),
+             lambda: encode_message(data), lambda: json.loads(text), lambda: json.dumps(data)),
+            ('msgpack', len(packed),
+             lambda: pack_message(encode_message(data)), lambda: msgpack.unpackb(packed), lambda: msgpack.packb(data)),
+        ]
+        for wire, size, server_encode, client_decode, client_encode in rows:
+            print(
+                f'{name:>18} {wire:>8} {size:>7}'
+                f' {per_frame_us(server_encode, args.number):>14.2f}'
+                f' {per_frame_us(client_decode, args.number):>14.2f}'
+                f' {per_frame_us(client_encode, args.number):>14.2f}'
+            )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000, help='frames timed per measurement')
+    main(parser.parse_args())
@@ -0,0 +1,78 @@
+from rest_framework.pagination import Cursor, CursorPagination, PageNumberPagination
+from rest_framework.settings import api_settings
+
+
+class KeysetPagination(CursorPagination):
+    """Cursor pagination over (created_at, id), newest first.
+
+    Each page is fetched with a WHERE on the previous page's last key instead
+    of an OFFSET, so deep pages cost the same as the first one. Requests that
+    pass ``?page=`` (the admin UI) get regular page-number pagination, as do
+    searches, whose relevance order has no stable key.
+    """
+    ordering = ('-created_at', '-id')
+    page_number_class = PageNumberPagination
+
+    def use_page_numbers(self, request, view):
+        if self.page_number_class.page_query_param in request.query_params:
+            return True
+        return bool(getattr(view, 'search_fields', None) and request.query_params.get(api_settings.SEARCH_PARAM))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_number_paginator = None
+        if self.use_page_numbers(request, view):
+            self.page_number_paginator = self.page_number_class()
+            return self.page_number_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        ordering = (ordering,) if isinstance(ordering, str) else tuple(ordering)
+        # A unique tie-breaker keeps the order stable for ?ordering= on non-unique fields
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering += ('-id' if ordering[0].startswith('-') else 'id',)
+        return ordering
+
+    def get_paginated_response(self, data):
+        if self.page_number_paginator is not None:
+            return self.page_number_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_html_context(self):
+        if self.page_number_paginator is not None:
+            return self.page_number_paginator.get_html_context()
+        return super().get_html_context()
+
+    def get_schema_operation_parameters(self, view):
+        return (
+            super().get_schema_operation_parameters(view)
+            + self.page_number_class().get_schema_operation_parameters(view)
+        )
+
+
+class EnrollmentKeysetPagination(KeysetPagination):
+    ordering = ('-enrolled_at', '-id')
+
+
+class ScheduleKeysetPagination(KeysetPagination):
+    """Live sessions by (scheduled_at, id); newest first, or soonest first for upcoming windows"""
+    ordering = ('-scheduled_at', '-id')
+    upcoming_ordering = ('scheduled_at', 'id')
+
+    def get_ordering(self, request, queryset, view):
+        if getattr(view, 'is_upcoming', lambda: False)():
+            return self.upcoming_ordering
+        return super().get_ordering(request, queryset, view)
+
+
+class ChatKeysetPagination(KeysetPagination):
+    """Chat history backfill by (timestamp, id), newest first"""
+    ordering = ('-timestamp', '-id')
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = 'page_size'
+
+    def cursor_before(self, request, timestamp):
+        """URL of the page of messages older than timestamp"""
+        self.base_url = request.build_absolute_uri()
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=timestamp))
@@ -0,0 +1,17 @@
+from functools import lru_cache
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+
+@lru_cache(maxsize=None)
+def get_redis():
+    """Shared Redis client for Django code that needs more than the cache API"""
+    return redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+
+@lru_cache(maxsize=None)
+def get_async_redis():
+    """Shared asyncio Redis client for Channels consumers, bound to the server's event loop"""
+    return redis.asyncio.Redis.from_url(settings.REDIS_URL, decode_responses=True)
@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     # Third party apps
     'rest_framework',
@@ -179,17 +180,59 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:3000",
 ]
 
+REDIS_URL = env('REDIS_URL', default='redis://localhost:6379')
+
 # Channels Configuration
 ASGI_APPLICATION = 'tutoring_platform.asgi.application'
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
-            "hosts": [env('REDIS_URL', default='redis://localhost:6379')],
+            "hosts": [REDIS_URL],
         },
     },
 }
 
+# Cache Configuration
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    }
+}
+
+# Rendered public catalog responses; invalidated by version bumps, this bounds counters like enrollment_count
+CATALOG_CACHE_TIMEOUT = env.int('CATALOG_CACHE_TIMEOUT', default=300)
+
+# Per-user live session schedules; version bumps invalidate, the timeout bounds the moving window
+SCHEDULE_CACHE_TIMEOUT = env.int('SCHEDULE_CACHE_TIMEOUT', default=60)
+
+# Attendance follows live session presence in Redis and is written in bulk by Celery.
+# Clients heartbeat every ATTENDANCE_HEARTBEAT_SECONDS; attendees silent for
+# ATTENDANCE_IDLE_SECONDS are treated as having left when last seen.
+ATTENDANCE_HEARTBEAT_SECONDS = env.int('ATTENDANCE_HEARTBEAT_SECONDS', default=20)
+ATTENDANCE_IDLE_SECONDS = env.int('ATTENDANCE_IDLE_SECONDS', default=60)
+ATTENDANCE_FLUSH_BATCH = env.int('ATTENDANCE_FLUSH_BATCH', default=100)
+
+# Live chat is broadcast immediately and saved in bulk by each ASGI process
+CHAT_FLUSH_MS = env.int('CHAT_FLUSH_MS', default=250)
+CHAT_FLUSH_MAX_MESSAGES = env.int('CHAT_FLUSH_MAX_MESSAGES', default=200)
+# Unsaved messages held per process while the database is unavailable, and saves
+# tried before a message the database keeps rejecting is dropped
+CHAT_BUFFER_MAX_MESSAGES = env.int('CHAT_BUFFER_MAX_MESSAGES', default=20000)
+CHAT_SAVE_MAX_ATTEMPTS = env.int('CHAT_SAVE_MAX_ATTEMPTS', default=3)
+# Recent messages per session kept in Redis for instant history on join
+CHAT_HISTORY_RING_SIZE = env.int('CHAT_HISTORY_RING_SIZE', default=200)
+CHAT_HISTORY_TTL_SECONDS = env.int('CHAT_HISTORY_TTL_SECONDS', default=86400)
+
+# Recent live session events kept in Redis so reconnecting clients can catch up
+LIVE_SESSION_REPLAY_SIZE = env.int('LIVE_SESSION_REPLAY_SIZE', default=500)
+LIVE_SESSION_REPLAY_TTL_SECONDS = env.int('LIVE_SESSION_REPLAY_TTL_SECONDS', default=3600)
+
+# Live whiteboard batching
+WHITEBOARD_TICK_MS = env.int('WHITEBOARD_TICK_MS', default=33)
+WHITEBOARD_SNAPSHOT_SECONDS = env.float('WHITEBOARD_SNAPSHOT_SECONDS', default=10.0)
+
 # Celery Configuration
 CELERY_BROKER_URL = env('CELERY_BROKER_URL', default='redis://localhost:6379')
 CELERY_RESULT_BACKEND = env('CELERY_RESULT_BACKEND', default='redis://localhost:6379')
@@ -197,6 +240,23 @@ CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
+CELERY_BEAT_SCHEDULE = {
+    'flush-lesson-heartbeats': {
+        'task': 'courses.tasks.flush_lesson_heartbeats',
+        'schedule': env.float('LESSON_HEARTBEAT_FLUSH_SECONDS', default=30.0),
+    },
+    'flush-session-attendance': {
+        'task': 'classroom.tasks.flush_session_attendance',
+        'schedule': env.float('ATTENDANCE_FLUSH_SECONDS', default=15.0),
+    },
+}
+
+# Player heartbeats are buffered in a Redis stream and merged into LessonProgress by Celery
+LESSON_HEARTBEAT_STREAM = 'lesson_heartbeats'
+LESSON_HEARTBEAT_STREAM_MAXLEN = env.int('LESSON_HEARTBEAT_STREAM_MAXLEN', default=1000000)
+LESSON_HEARTBEAT_MAX_SPAN_SECONDS = env.int('LESSON_HEARTBEAT_MAX_SPAN_SECONDS', default=120)
+LESSON_HEARTBEAT_BUCKET_SECONDS = env.int('LESSON_HEARTBEAT_BUCKET_SECONDS', default=30)
+LESSON_HEARTBEAT_FLUSH_BATCH = env.int('LESSON_HEARTBEAT_FLUSH_BATCH', default=5000)
 
 # File Storage Configuration
 USE_S3 = env.bool('USE_S3', default=False)
@@ -223,6 +283,14 @@ else:
     MEDIA_URL = '/media/'
     MEDIA_ROOT = BASE_DIR / 'media'
 
+# Chunked video uploads; parts live next to MEDIA_ROOT so completion is a rename
+VIDEO_UPLOAD_TEMP_DIR = env('VIDEO_UPLOAD_TEMP_DIR', default=str(BASE_DIR / 'media' / 'upload_parts'))
+VIDEO_UPLOAD_MAX_BYTES = env.int('VIDEO_UPLOAD_MAX_BYTES', default=5 * 1024 ** 3)
+VIDEO_UPLOAD_MAX_CHUNK_BYTES = env.int('VIDEO_UPLOAD_MAX_CHUNK_BYTES', default=16 * 1024 ** 2)
+
+# Internal nginx location that serves MEDIA_ROOT for X-Accel-Redirect; empty serves ranges from Django
+VIDEO_ACCEL_REDIRECT_PREFIX = env('VIDEO_ACCEL_REDIRECT_PREFIX', default='')
+
 STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
@@ -59,7 +59,9 @@ class TutorProfile(models.Model):
     hourly_rate = models.DecimalField(max_digits=8, decimal_places=2, default=0.00)
     languages_spoken = models.JSONField(default=list)
     is_available = models.BooleanField(default=True)
+    # Rolled up from reviews of the tutor's courses by courses.signals
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)
+    rating_sum = models.PositiveIntegerField(default=0)
     total_reviews = models.PositiveIntegerField(default=0)
     
     class Meta: